@@ -0,0 +1,184 @@
+# Copyright Sierra
+
+"""Load-test `run()` end to end against the local mock LLM server.
+
+For every `--max-concurrency` level, a fresh worker process runs a full
+tool-calling run on the retail env against `mock_llm_server.py` (started here
+with a constant latency) and reports:
+
+  - episodes/sec over the whole run;
+  - p50/p99 step overhead: the wall time of an episode minus the mock model
+    latency of its LLM calls (from the episode's timing spans), per agent step;
+    this is the time spent in the framework (tools, grading, scheduling, client
+    overhead);
+  - the peak RSS of the worker.
+
+    python benchmark_runner.py --max-concurrency 100 500 1000 2000 --use-async
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+MOCK_MODEL = "gpt-4o"
+
+
+def percentile(values: List[float], q: float) -> float:
+    if len(values) == 0:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(math.ceil(q * len(values))) - 1)]
+
+
+def run_worker(args: argparse.Namespace) -> Dict[str, Any]:
+    from tau_bench.envs import get_env
+    from tau_bench.run import run
+    from tau_bench.types import RunConfig
+
+    num_tasks = len(
+        get_env(
+            "retail",
+            user_strategy="human",
+            user_model="",
+            task_split="test",
+            task_index=0,
+        ).tasks
+    )
+    num_episodes = args.episodes or 2 * args.worker_concurrency
+    config = RunConfig(
+        model_provider="openai",
+        user_model_provider="openai",
+        model=MOCK_MODEL,
+        user_model=MOCK_MODEL,
+        env="retail",
+        task_split="test",
+        num_trials=max(1, math.ceil(num_episodes / num_tasks)),
+        end_index=min(num_tasks, num_episodes),
+        max_concurrency=args.worker_concurrency,
+        log_dir=args.log_dir,
+        use_async=args.use_async,
+        check_outputs=False,
+    )
+    started_at = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = run(config)
+    wall_time = time.perf_counter() - started_at
+    overheads = []
+    for result in results:
+        if result.timing is None:
+            continue
+        llm_spans = [
+            span
+            for span in result.timing.spans
+            if span.component in ("agent_llm", "user_llm")
+        ]
+        num_steps = sum(1 for span in llm_spans if span.component == "agent_llm")
+        if num_steps > 0:
+            overheads.append(
+                (result.timing.total - len(llm_spans) * args.latency) / num_steps
+            )
+    return {
+        "max_concurrency": args.worker_concurrency,
+        "episodes": len(results),
+        "errors": sum(1 for result in results if "error" in result.info),
+        "wall_time": wall_time,
+        "episodes_per_sec": len(results) / wall_time,
+        "p50_step_overhead_ms": 1000 * percentile(overheads, 0.5),
+        "p99_step_overhead_ms": 1000 * percentile(overheads, 0.99),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark run() against the local mock LLM server"
+    )
+    parser.add_argument("--max-concurrency", type=int, nargs="+", default=[100, 500, 1000, 2000])
+    parser.add_argument(
+        "--episodes",
+        type=int,
+        default=None,
+        help="Episodes per concurrency level (defaults to twice the concurrency)",
+    )
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock model latency in seconds")
+    parser.add_argument("--use-async", action="store_true", help="Benchmark the asyncio runner")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output-path", type=str, default=None, help="Also write the results as JSON")
+    parser.add_argument("--worker-concurrency", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--log-dir", type=str, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_concurrency is not None:
+        print(json.dumps(run_worker(args)))
+        return
+
+    env = {
+        **os.environ,
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.port}/v1",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.port}/v1",
+        "OPENAI_API_KEY": "mock",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "mock_llm_server.py",
+            "--port",
+            str(args.port),
+            "--latency",
+            str(args.latency),
+        ],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE,
+        env=env,
+    )
+    rows = []
+    try:
+        # wait until the server is listening
+        server.stdout.readline()
+        print(
+            f"{'concurrency':>11} {'episodes':>8} {'errors':>6} {'wall s':>7} {'eps/s':>7} {'p50 ms':>7} {'p99 ms':>7} {'RSS MB':>7}"
+        )
+        for max_concurrency in args.max_concurrency:
+            with tempfile.TemporaryDirectory() as log_dir:
+                command = [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "--worker-concurrency",
+                    str(max_concurrency),
+                    "--latency",
+                    str(args.latency),
+                    "--log-dir",
+                    log_dir,
+                ]
+                if args.episodes is not None:
+                    command += ["--episodes", str(args.episodes)]
+                if args.use_async:
+                    command.append("--use-async")
+                output = subprocess.run(
+                    command, env=env, check=True, capture_output=True, text=True
+                ).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            rows.append(row)
+            print(
+                f"{row['max_concurrency']:>11} {row['episodes']:>8} {row['errors']:>6} {row['wall_time']:>7.1f} {row['episodes_per_sec']:>7.1f} {row['p50_step_overhead_ms']:>7.1f} {row['p99_step_overhead_ms']:>7.1f} {row['peak_rss_mb']:>7.0f}"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+    if args.output_path is not None:
+        with open(args.output_path, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
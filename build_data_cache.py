@@ -0,0 +1,27 @@
+# Copyright Sierra
+
+import argparse
+import importlib
+from tau_bench.envs.data_cache import compile_json_files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile the JSON data files of environments into pre-parsed artifacts"
+    )
+    parser.add_argument(
+        "--env",
+        type=str,
+        nargs="+",
+        choices=["retail", "airline"],
+        default=["retail", "airline"],
+    )
+    args = parser.parse_args()
+    for env_name in args.env:
+        data_module = importlib.import_module(f"tau_bench.envs.{env_name}.data")
+        path = compile_json_files(data_module.FOLDER_PATH, data_module.DATA_FILES)
+        print(f"Compiled {env_name} data to {path}")
+
+
+if __name__ == "__main__":
+    main()
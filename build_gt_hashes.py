@@ -0,0 +1,37 @@
+# Copyright Sierra
+
+import argparse
+from tau_bench.envs.gt_hashes import build_gt_hash_index, save_gt_hash_index
+
+# the splits each env's constructor knows how to load
+TASK_SPLITS = {
+    "retail": ["test", "train", "dev"],
+    "airline": ["test", "synthetic"],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute ground-truth data hashes for every task of a split"
+    )
+    parser.add_argument(
+        "--env", type=str, choices=list(TASK_SPLITS), default="retail"
+    )
+    parser.add_argument(
+        "--task-split",
+        type=str,
+        default="test",
+        choices=sorted({split for splits in TASK_SPLITS.values() for split in splits}),
+    )
+    args = parser.parse_args()
+    if args.task_split not in TASK_SPLITS[args.env]:
+        parser.error(
+            f"the {args.env} env has no {args.task_split} split (choose from {', '.join(TASK_SPLITS[args.env])})"
+        )
+    index = build_gt_hash_index(args.env, args.task_split)
+    path = save_gt_hash_index(index)
+    print(f"Saved {len(index.entries)} ground-truth hashes to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# Copyright Sierra
+
+import argparse
+import os
+from tau_bench.checkpoint import convert_checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a JSONL run checkpoint into the final JSON results file"
+    )
+    parser.add_argument("checkpoint_path", type=str)
+    parser.add_argument(
+        "--output-path",
+        type=str,
+        default=None,
+        help="Defaults to the checkpoint path with a .json extension",
+    )
+    args = parser.parse_args()
+    output_path = args.output_path or f"{os.path.splitext(args.checkpoint_path)[0]}.json"
+    results = convert_checkpoint(args.checkpoint_path, output_path)
+    print(f"Wrote {len(results)} results to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
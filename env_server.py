@@ -0,0 +1,37 @@
+# Copyright Sierra
+
+import argparse
+from tau_bench.env_server import EnvServer
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve tau-bench environments over HTTP to agents in other processes"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=600.0,
+        help="Seconds without requests after which a session is evicted",
+    )
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    args = parser.parse_args()
+    server = EnvServer(
+        host=args.host,
+        port=args.port,
+        idle_timeout=args.idle_timeout,
+        max_sessions=args.max_sessions,
+    )
+    print(f"Env server listening on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Copyright Sierra
+
+import argparse
+import asyncio
+from tau_bench.mock_llm_server import LATENCY_DISTRIBUTIONS, MockLLMConfig, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve scripted OpenAI-compatible chat completions for load tests"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean latency in seconds")
+    parser.add_argument(
+        "--latency-distribution",
+        type=str,
+        default="constant",
+        choices=LATENCY_DISTRIBUTIONS,
+    )
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=0.0,
+        help="Generation speed; adds completion-tokens / tokens-per-second to the latency (0 to disable)",
+    )
+    parser.add_argument("--completion-tokens", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument(
+        "--tool-calls-per-turn",
+        type=int,
+        default=2,
+        help="Tool calls the agent makes after every user message before responding",
+    )
+    parser.add_argument(
+        "--user-turns",
+        type=int,
+        default=2,
+        help="Messages the user sends before ###STOP###",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    config = MockLLMConfig(
+        latency=args.latency,
+        latency_distribution=args.latency_distribution,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        tool_calls_per_turn=args.tool_calls_per_turn,
+        user_turns=args.user_turns,
+        seed=args.seed,
+    )
+    try:
+        asyncio.run(serve(config, host=args.host, port=args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@
 import argparse
 from tau_bench.types import RunConfig
 from tau_bench.run import run
+from tau_bench.schedule import SCHEDULE_ORDERS
+from tau_bench.cassette import CASSETTE_MODES
 from litellm import provider_list
 from tau_bench.envs.user import UserStrategy
 
@@ -75,6 +77,21 @@ def parse_args() -> RunConfig:
     parser.add_argument("--check-outputs", action="store_true", help="Check if expected outputs appear in agent responses (default: False, only check actions)")
     parser.add_argument("--no-check-outputs", dest="check_outputs", action="store_false", help="Disable output checking (only check actions)")
     parser.set_defaults(check_outputs=False)
+    parser.add_argument("--resume", type=str, default=None, help="Path to the .jsonl checkpoint of an interrupted run; only the missing (task, trial) pairs and the episodes that crashed or were stopped are run, with the same arguments as the original run")
+    parser.add_argument("--use-async", action="store_true", help="Run episodes as coroutines on one event loop instead of one thread per episode; --max-concurrency bounds the number of concurrent episodes")
+    parser.add_argument("--schedule", type=str, default="trial", choices=SCHEDULE_ORDERS, help="Order in which the (task, trial) episodes of all trials are fed to one shared queue: trial by trial, all trials of a task together, or random, or longest-first (the tasks with the longest past episodes first)")
+    parser.add_argument("--schedule-history", type=str, nargs="+", default=None, help="Result files or directories of past runs used to estimate task lengths for --schedule longest-first (defaults to --log-dir)")
+    parser.add_argument("--llm-max-retries", type=int, default=3, help="Retries of an LLM call that failed with a rate limit, timeout, connection or server error, before the episode fails")
+    parser.add_argument("--adaptive-concurrency", action="store_true", help="Limit the LLM calls in flight per provider, starting at --llm-initial-concurrency and adapting (AIMD) to rate limits and latency, up to --max-concurrency")
+    parser.add_argument("--llm-initial-concurrency", type=int, default=8, help="Initial per-provider limit of LLM calls in flight with --adaptive-concurrency")
+    parser.add_argument("--rate-limit", dest="rate_limits", type=str, nargs="+", default=None, help="Requests and tokens per minute budgets shared by the agent and the user simulator, as <provider>/<model>:<rpm>:<tpm> (e.g. openai/gpt-4o:500:30000; leave a budget empty for no limit, use * as the model for every model of a provider)")
+    parser.add_argument("--cassette", type=str, default=None, help="Path to a cassette (.jsonl or .jsonl.gz) of LLM calls to record to or replay from")
+    parser.add_argument("--cassette-mode", type=str, default="replay", choices=CASSETTE_MODES, help="record: call the providers and append every call to the cassette; replay: serve calls from the cassette without network access")
+    parser.add_argument("--parallel-tool-calls", action="store_true", help="With the tool-calling agent, execute every tool call the model makes in a message instead of only the first")
+    parser.add_argument("--vec-env-size", type=int, default=1, help="With --use-async, run episodes in lockstep groups of this size whose LLM calls are sent together in rounds (for batching model servers such as vLLM)")
+    parser.add_argument("--vec-max-wait", type=float, default=2.0, help="With --vec-env-size, seconds a lockstep round waits for the calls of every episode of its group before it is sent without the missing ones")
+    parser.add_argument("--max-run-cost", type=float, default=None, help="Stop starting new episodes once the run has spent this many dollars on LLM calls")
+    parser.add_argument("--max-episode-cost", type=float, default=None, help="Stop an episode once it has spent this many dollars on LLM calls; stopped episodes are left out of the metrics and run again on --resume")
     args = parser.parse_args()
     print(args)
 
@@ -109,6 +126,21 @@ def parse_args() -> RunConfig:
         memory_top_k=args.memory_top_k,
         memory_db_path=args.memory_db_path,
         check_outputs=args.check_outputs,
+        resume=args.resume,
+        use_async=args.use_async,
+        schedule=args.schedule,
+        schedule_history=args.schedule_history,
+        llm_max_retries=args.llm_max_retries,
+        adaptive_concurrency=args.adaptive_concurrency,
+        llm_initial_concurrency=args.llm_initial_concurrency,
+        rate_limits=args.rate_limits,
+        cassette=args.cassette,
+        cassette_mode=args.cassette_mode,
+        max_run_cost=args.max_run_cost,
+        max_episode_cost=args.max_episode_cost,
+        parallel_tool_calls=args.parallel_tool_calls,
+        vec_env_size=args.vec_env_size,
+        vec_max_wait=args.vec_max_wait,
     )
 
 
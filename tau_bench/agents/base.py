@@ -1,10 +1,21 @@
 # Copyright Sierra
 
 import abc
-from typing import Optional
+import asyncio
+from typing import Any, Generator, Optional, Tuple
 from tau_bench.envs.base import Env
+from tau_bench.llm import acompletion, completion
+from tau_bench.timing import span
 from tau_bench.types import SolveResult
 
+# An episode loop written once, as a generator of the model calls and env
+# operations it needs: it yields ("completion", kwargs), ("reset", task_index)
+# or ("step", action) and is sent back the result. `run_turns` carries these out
+# with blocking calls and `arun_turns` with their async counterparts, so `solve`
+# and `asolve` share every line of the loop. A call that raises is thrown back
+# into the generator at the yield.
+Turns = Generator[Tuple[str, Any], Any, SolveResult]
+
 
 class Agent(abc.ABC):
     @abc.abstractmethod
@@ -12,3 +23,58 @@ class Agent(abc.ABC):
         self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 90
     ) -> SolveResult:
         raise NotImplementedError
+
+    async def asolve(
+        self,
+        env: Env,
+        task_index: Optional[int] = None,
+        max_num_steps: Optional[int] = None,
+    ) -> SolveResult:
+        # Agents without a native async implementation run `solve` in a worker thread;
+        # `max_num_steps` is only passed on when given so each agent keeps its default.
+        kwargs = {} if max_num_steps is None else {"max_num_steps": max_num_steps}
+        return await asyncio.to_thread(
+            self.solve, env=env, task_index=task_index, **kwargs
+        )
+
+
+def run_turns(turns: Turns, env: Env) -> SolveResult:
+    result: Any = None
+    error: Optional[BaseException] = None
+    while True:
+        try:
+            op, arg = turns.send(result) if error is None else turns.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            if op == "completion":
+                with span("agent_llm"):
+                    result = completion(**arg)
+            elif op == "reset":
+                result = env.reset(task_index=arg)
+            else:
+                result = env.step(arg)
+        except Exception as e:
+            error = e
+
+
+async def arun_turns(turns: Turns, env: Env) -> SolveResult:
+    result: Any = None
+    error: Optional[BaseException] = None
+    while True:
+        try:
+            op, arg = turns.send(result) if error is None else turns.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        result, error = None, None
+        try:
+            if op == "completion":
+                with span("agent_llm"):
+                    result = await acompletion(**arg)
+            elif op == "reset":
+                result = await env.areset(task_index=arg)
+            else:
+                result = await env.astep(arg)
+        except Exception as e:
+            error = e
@@ -1,9 +1,9 @@
 # Copyright Sierra
 
 import json
-from litellm import completion
 
-from tau_bench.agents.base import Agent
+from tau_bench.agents.base import Agent, Turns, arun_turns, run_turns
+from tau_bench.costs import track_messages
 from tau_bench.envs.base import Env
 from tau_bench.types import (
     Action,
@@ -34,15 +34,15 @@ class ChatReActAgent(Agent):
         self.use_reasoning = use_reasoning
         self.tools_info = tools_info
 
-    def generate_next_step(
-        self, messages: List[Dict[str, Any]]
-    ) -> Tuple[Dict[str, Any], Action, float]:
-        res = completion(
+    def completion_kwargs(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return dict(
             model=self.model,
             custom_llm_provider=self.provider,
             messages=messages,
             temperature=self.temperature,
         )
+
+    def parse_next_step(self, res: Any) -> Tuple[Dict[str, Any], Action, float]:
         message = res.choices[0].message
         action_str = message.content.split("Action:")[-1].strip()
         try:
@@ -61,17 +61,27 @@ class ChatReActAgent(Agent):
     def solve(
         self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 90
     ) -> SolveResult:
-        response = env.reset(task_index=task_index)
+        return run_turns(self.turns(task_index, max_num_steps), env)
+
+    async def asolve(
+        self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 90
+    ) -> SolveResult:
+        return await arun_turns(self.turns(task_index, max_num_steps), env)
+
+    def turns(self, task_index: Optional[int], max_num_steps: int) -> Turns:
+        response = yield "reset", task_index
         reward = 0.0
         messages: List[Dict[str, Any]] = [
             {"role": "system", "content": self.prompt},
             {"role": "user", "content": response.observation},
         ]
+        track_messages(messages)
         total_cost = 0.0
         info = {}
         for _ in range(max_num_steps):
-            message, action, cost = self.generate_next_step(messages)
-            response = env.step(action)
+            res = yield "completion", self.completion_kwargs(messages)
+            message, action, cost = self.parse_next_step(res)
+            response = yield "step", action
             obs = response.observation
             reward = response.reward
             info = {**info, **response.info.model_dump()}
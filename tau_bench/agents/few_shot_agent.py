@@ -2,11 +2,13 @@
 
 import json
 import random
-from litellm import completion
+from tau_bench.llm import completion
 from typing import List, Optional, Dict, Any
 
 from tau_bench.agents.base import Agent
+from tau_bench.costs import track_messages
 from tau_bench.envs.base import Env
+from tau_bench.timing import span
 from tau_bench.types import SolveResult, Action, RESPOND_ACTION_NAME
 
 
@@ -46,14 +48,16 @@ class FewShotToolCallingAgent(Agent):
             {"role": "system", "content": f"{self.wiki}\n\n{few_shots}"},
             {"role": "user", "content": obs},
         ]
+        track_messages(messages)
         for _ in range(max_num_steps):
-            res = completion(
-                messages=messages,
-                model=self.model,
-                custom_llm_provider=self.provider,
-                tools=self.tools_info,
-                temperature=self.temperature,
-            )
+            with span("agent_llm"):
+                res = completion(
+                    messages=messages,
+                    model=self.model,
+                    custom_llm_provider=self.provider,
+                    tools=self.tools_info,
+                    temperature=self.temperature,
+                )
             next_message = res.choices[0].message.model_dump()
             total_cost += res._hidden_params["response_cost"]
             action = message_to_action(next_message)
@@ -1,12 +1,12 @@
 # Copyright Sierra
 
 import json
-from litellm import completion
 from typing import List, Optional, Dict, Any
 
-from tau_bench.agents.base import Agent
+from tau_bench.agents.base import Agent, Turns, arun_turns, run_turns
+from tau_bench.costs import track_messages
 from tau_bench.envs.base import Env
-from tau_bench.types import SolveResult, Action, RESPOND_ACTION_NAME
+from tau_bench.types import SolveResult, Action, EnvResponse, RESPOND_ACTION_NAME
 
 
 class ToolCallingAgent(Agent):
@@ -17,59 +17,52 @@ class ToolCallingAgent(Agent):
         model: str,
         provider: str,
         temperature: float = 0.0,
+        parallel_tool_calls: bool = False,
     ):
         self.tools_info = tools_info
         self.wiki = wiki
         self.model = model
         self.provider = provider
         self.temperature = temperature
+        # execute every tool call of a message instead of only the first
+        self.parallel_tool_calls = parallel_tool_calls
 
     def solve(
         self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 90
     ) -> SolveResult:
+        return run_turns(self.turns(env, task_index, max_num_steps), env)
+
+    async def asolve(
+        self, env: Env, task_index: Optional[int] = None, max_num_steps: int = 90
+    ) -> SolveResult:
+        return await arun_turns(self.turns(env, task_index, max_num_steps), env)
+
+    def turns(self, env: Env, task_index: Optional[int], max_num_steps: int) -> Turns:
         total_cost = 0.0
-        env_reset_res = env.reset(task_index=task_index)
+        env_reset_res = yield "reset", task_index
         obs = env_reset_res.observation
         info = env_reset_res.info.model_dump()
         reward = 0.0
-        messages: List[Dict[str, Any]] = [
-            {"role": "system", "content": self.wiki},
-            {"role": "user", "content": obs},
-        ]
+        messages = self.initial_messages(obs)
+        track_messages(messages)
         for _ in range(max_num_steps):
-            res = completion(
-                messages=messages,
-                model=self.model,
-                custom_llm_provider=self.provider,
-                tools=self.tools_info,
-                temperature=self.temperature,
-            )
+            res = yield "completion", self.completion_kwargs(messages)
             next_message = res.choices[0].message.model_dump()
             total_cost += res._hidden_params["response_cost"] or 0
-            action = message_to_action(next_message)
-            env_response = env.step(action)
-            reward = env_response.reward
-            info = {**info, **env_response.info.model_dump()}
-            if action.name != RESPOND_ACTION_NAME:
-                next_message["tool_calls"] = next_message["tool_calls"][:1]
-                messages.extend(
-                    [
-                        next_message,
-                        {
-                            "role": "tool",
-                            "tool_call_id": next_message["tool_calls"][0]["id"],
-                            "name": next_message["tool_calls"][0]["function"]["name"],
-                            "content": env_response.observation,
-                        },
-                    ]
-                )
+            if self.executes_all_tool_calls(next_message):
+                # tool calls never reach the user, so they run inline
+                env_responses = env.step_tool_calls(message_to_actions(next_message))
+                messages.extend(build_tool_calls_messages(next_message, env_responses))
             else:
+                action = message_to_action(next_message)
+                env_responses = [(yield "step", action)]
                 messages.extend(
-                    [
-                        next_message,
-                        {"role": "user", "content": env_response.observation},
-                    ]
+                    build_turn_messages(next_message, action, env_responses[0])
                 )
+            for env_response in env_responses:
+                info = {**info, **env_response.info.model_dump()}
+            env_response = env_responses[-1]
+            reward = env_response.reward
             if env_response.done:
                 break
         return SolveResult(
@@ -79,6 +72,72 @@ class ToolCallingAgent(Agent):
             total_cost=total_cost,
         )
 
+    def initial_messages(self, obs: str) -> List[Dict[str, Any]]:
+        return [
+            {"role": "system", "content": self.wiki},
+            {"role": "user", "content": obs},
+        ]
+
+    def executes_all_tool_calls(self, message: Dict[str, Any]) -> bool:
+        return self.parallel_tool_calls and len(message.get("tool_calls") or []) > 1
+
+    def completion_kwargs(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return dict(
+            messages=messages,
+            model=self.model,
+            custom_llm_provider=self.provider,
+            tools=self.tools_info,
+            temperature=self.temperature,
+        )
+
+
+def build_turn_messages(
+    next_message: Dict[str, Any], action: Action, env_response: EnvResponse
+) -> List[Dict[str, Any]]:
+    """The agent message and the observation it got back, to append to the history."""
+    if action.name != RESPOND_ACTION_NAME:
+        next_message["tool_calls"] = next_message["tool_calls"][:1]
+        return [
+            next_message,
+            {
+                "role": "tool",
+                "tool_call_id": next_message["tool_calls"][0]["id"],
+                "name": next_message["tool_calls"][0]["function"]["name"],
+                "content": env_response.observation,
+            },
+        ]
+    return [
+        next_message,
+        {"role": "user", "content": env_response.observation},
+    ]
+
+
+def build_tool_calls_messages(
+    next_message: Dict[str, Any], env_responses: List[EnvResponse]
+) -> List[Dict[str, Any]]:
+    """The agent message and a tool message per executed call, to append to the history."""
+    # calls after one that ended the episode were not executed
+    next_message["tool_calls"] = next_message["tool_calls"][: len(env_responses)]
+    return [next_message] + [
+        {
+            "role": "tool",
+            "tool_call_id": tool_call["id"],
+            "name": tool_call["function"]["name"],
+            "content": env_response.observation,
+        }
+        for tool_call, env_response in zip(next_message["tool_calls"], env_responses)
+    ]
+
+
+def message_to_actions(message: Dict[str, Any]) -> List[Action]:
+    return [
+        Action(
+            name=tool_call["function"]["name"],
+            kwargs=json.loads(tool_call["function"]["arguments"]),
+        )
+        for tool_call in message["tool_calls"]
+    ]
+
 
 def message_to_action(
     message: Dict[str, Any],
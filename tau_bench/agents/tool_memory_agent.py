@@ -1,13 +1,15 @@
 # Copyright Sierra
 
 import json
-from litellm import completion
+from tau_bench.llm import completion
 from typing import List, Optional, Dict, Any
 from pathlib import Path
 import chromadb
 
 from tau_bench.agents.base import Agent
+from tau_bench.costs import track_messages
 from tau_bench.envs.base import Env
+from tau_bench.timing import span
 from tau_bench.types import SolveResult, Action, RESPOND_ACTION_NAME
 
 
@@ -156,9 +158,11 @@ class ToolMemoryAgent(Agent):
         messages: List[Dict[str, Any]] = [
             {"role": "system", "content": self.wiki},
         ]
+        track_messages(messages)
 
         # Retrieve similar scenarios for initial user message
-        memory_context = self.retrieve_similar_scenarios(obs)
+        with span("memory_retrieval"):
+            memory_context = self.retrieve_similar_scenarios(obs)
 
         # Add user message with memory context if available
         if memory_context:
@@ -181,13 +185,14 @@ class ToolMemoryAgent(Agent):
         messages.append({"role": "user", "content": user_content})
 
         for _ in range(max_num_steps):
-            res = completion(
-                messages=messages,
-                model=self.model,
-                custom_llm_provider=self.provider,
-                tools=self.tools_info,
-                temperature=self.temperature,
-            )
+            with span("agent_llm"):
+                res = completion(
+                    messages=messages,
+                    model=self.model,
+                    custom_llm_provider=self.provider,
+                    tools=self.tools_info,
+                    temperature=self.temperature,
+                )
             next_message = res.choices[0].message.model_dump()
             total_cost += res._hidden_params["response_cost"] or 0
             action = message_to_action(next_message)
@@ -214,7 +219,8 @@ class ToolMemoryAgent(Agent):
                 messages.append(next_message)
 
                 # Retrieve similar scenarios for the new user message
-                memory_context = self.retrieve_similar_scenarios(env_response.observation)
+                with span("memory_retrieval"):
+                    memory_context = self.retrieve_similar_scenarios(env_response.observation)
 
                 # Track retrieval
                 turn_number = len([m for m in messages if m.get("role") == "user"])
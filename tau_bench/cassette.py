@@ -0,0 +1,168 @@
+# Copyright Sierra
+
+"""Record and replay of LLM calls.
+
+A cassette is a JSONL file (gzipped if its name ends in `.gz`) with one line
+per LLM call: a fingerprint of the request and the response. In `record` mode
+every call goes to the provider and is appended to the cassette; in `replay`
+mode calls are served from the cassette without any network access, and a
+request that was never recorded raises `CassetteMissError`.
+
+Calls are recorded under the scope of the episode that made them (see
+`cassette_scope`; `run()` scopes each episode by task and trial), and the
+n-th identical request of an episode is served the n-th response recorded
+for it in that episode. Within an episode calls are sequential, so a replay
+is deterministic however many episodes run concurrently. A request made more
+often than it was recorded is a miss. Recording into an existing cassette
+appends to it, and an episode recorded again (e.g. when a run is redone, or an
+episode that crashed is rerun on resume) replaces its earlier recording.
+
+A recording session keeps the cassette open and flushes every call as it is
+recorded. A `.gz` cassette therefore gains one gzip member per session (not
+per call), and a session killed before `close` leaves a member without its
+trailer; the calls flushed before that are still read back.
+"""
+
+import gzip
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import sha256
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+import litellm
+
+CASSETTE_MODES = ["record", "replay"]
+
+
+class CassetteMissError(Exception):
+    pass
+
+
+_scope: ContextVar[Optional[str]] = ContextVar("cassette_scope", default=None)
+
+
+@contextmanager
+def cassette_scope(scope: str) -> Iterator[None]:
+    """Record and replay the LLM calls made in this block under `scope`."""
+    token = _scope.set(scope)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def request_fingerprint(kwargs: Dict[str, Any]) -> str:
+    return sha256(
+        json.dumps(kwargs, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _to_response(item: Dict[str, Any]) -> Any:
+    res = litellm.ModelResponse(**item["response"])
+    res._hidden_params["response_cost"] = item.get("response_cost")
+    return res
+
+
+class Cassette(object):
+    def __init__(self, path: str, mode: str = "replay") -> None:
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        # keyed by (scope, request fingerprint)
+        self.recordings: Dict[Tuple[Optional[str], str], List[Dict[str, Any]]] = {}
+        self.num_served: Dict[Tuple[Optional[str], str], int] = {}
+        self._file: Optional[IO[str]] = None
+        self._lock = threading.Lock()
+        # tells the calls recorded by this session apart from earlier ones
+        self.session = uuid.uuid4().hex
+        if os.path.exists(path):
+            for item in _latest_recordings(_read_items(path)):
+                self.recordings.setdefault(_key(item), []).append(item)
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {path}")
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def replay(self, kwargs: Dict[str, Any]) -> Any:
+        key = (_scope.get(), request_fingerprint(kwargs))
+        with self._lock:
+            recordings = self.recordings.get(key, [])
+            position = self.num_served.get(key, 0)
+            if position >= len(recordings):
+                raise CassetteMissError(
+                    f"No recording of this {kwargs.get('model')} request in {self.path} "
+                    f"(scope {key[0]}, {len(recordings)} recorded, request {position + 1})"
+                )
+            self.num_served[key] = position + 1
+        return _to_response(recordings[position])
+
+    def record(self, kwargs: Dict[str, Any], res: Any) -> Any:
+        """Append `res` to the cassette and return it as it will be replayed."""
+        item = {
+            "session": self.session,
+            "scope": _scope.get(),
+            "request": request_fingerprint(kwargs),
+            "model": kwargs.get("model"),
+            "response": res.model_dump(),
+            "response_cost": res._hidden_params.get("response_cost"),
+        }
+        line = json.dumps(item, default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = _open(self.path, "a")
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recordings.setdefault(_key(item), []).append(item)
+        # Callers get the round-tripped response so that what they put in their
+        # next requests is identical when recording and when replaying.
+        return _to_response(json.loads(line))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _key(item: Dict[str, Any]) -> Tuple[Optional[str], str]:
+    return item.get("scope"), item["request"]
+
+
+def _latest_recordings(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The items of the session that recorded each scope last."""
+    # sessions append to the file one after another, so the last item of a
+    # scope belongs to its latest session
+    latest = {item.get("scope"): item.get("session") for item in items}
+    return [item for item in items if item.get("session") == latest[item.get("scope")]]
+
+
+def _read_items(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with _open(path, "r") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # the last line may be partial if recording was interrupted
+                    continue
+        except EOFError:
+            # a gzip member cut off by an interrupted recording
+            pass
+    return items
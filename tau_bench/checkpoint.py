@@ -0,0 +1,227 @@
+# Copyright Sierra
+
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from tau_bench.types import EnvRunResult, RunConfig
+
+_STOP = object()
+
+# Config fields that only affect how a run is executed, not its results; they may
+# differ when resuming from a checkpoint.
+RESUME_IGNORED_CONFIG_FIELDS = {
+    "log_dir",
+    "max_concurrency",
+    "resume",
+    "use_async",
+    "schedule",
+    "schedule_history",
+    "llm_max_retries",
+    "adaptive_concurrency",
+    "llm_initial_concurrency",
+    "rate_limits",
+    "cassette",
+    "cassette_mode",
+    "max_run_cost",
+    # finished episodes stayed under the cap; a higher one only lets the
+    # episodes it stopped finish when they are run again
+    "max_episode_cost",
+    "vec_env_size",
+    "vec_max_wait",
+}
+
+
+class CheckpointWriter(object):
+    """Appends results to a JSONL checkpoint from a dedicated writer thread.
+
+    `write` only enqueues, so episode workers never wait on disk I/O or on each
+    other. Lines are flushed as they are written and fsynced at most every
+    `fsync_interval` seconds, and once more on `close`. A new checkpoint starts
+    with a `{"config": ...}` header line when `config` is given.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        config: Optional[RunConfig] = None,
+        fsync_interval: float = 5.0,
+    ) -> None:
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        _drop_partial_last_line(path)
+        self._file = open(path, "a")
+        if config is not None and self._file.tell() == 0:
+            self._file.write(json.dumps({"config": config.model_dump()}) + "\n")
+            self._sync()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._write_loop, name="checkpoint-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, result: EnvRunResult) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"Checkpoint writer failed: {self._error}")
+        self._queue.put(result.model_dump())
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise RuntimeError(f"Checkpoint writer failed: {self._error}")
+
+    def __enter__(self) -> "CheckpointWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _write_loop(self) -> None:
+        last_fsync = time.monotonic()
+        dirty = False
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                item = None
+            try:
+                if item is _STOP:
+                    self._sync()
+                    return
+                if item is not None:
+                    self._file.write(json.dumps(item) + "\n")
+                    self._file.flush()
+                    dirty = True
+                if dirty and time.monotonic() - last_fsync >= self.fsync_interval:
+                    self._sync()
+                    last_fsync = time.monotonic()
+                    dirty = False
+            except Exception as e:
+                self._error = e
+                if item is _STOP:
+                    return
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+def _drop_partial_last_line(path: str) -> None:
+    # A run killed mid-write leaves an unterminated line; appending to it would
+    # corrupt the next result.
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 65536)
+            f.seek(start)
+            chunk = f.read(position - start)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                if start + newline + 1 < end:
+                    f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def _read_lines(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                # the last line may be partial if the run was killed mid-write
+                continue
+    return items
+
+
+def read_checkpoint(path: str) -> List[EnvRunResult]:
+    """Read results from a JSONL checkpoint, or from a final JSON results file."""
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            return [EnvRunResult.model_validate(item) for item in json.load(f)]
+    results: Dict[Tuple[int, int], EnvRunResult] = {}
+    for item in _read_lines(path):
+        if "config" in item:
+            continue
+        result = EnvRunResult.model_validate(item)
+        # an episode run again on resume supersedes its earlier line
+        results.pop((result.task_id, result.trial), None)
+        results[(result.task_id, result.trial)] = result
+    return list(results.values())
+
+
+def read_checkpoint_config(path: str) -> Optional[RunConfig]:
+    """The config recorded in the header of a JSONL checkpoint, if any."""
+    if path.endswith(".json"):
+        return None
+    with open(path, "r") as f:
+        first_line = f.readline()
+    try:
+        item = json.loads(first_line)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(item, dict) or "config" not in item:
+        return None
+    return RunConfig.model_validate(item["config"])
+
+
+def get_config_mismatches(saved: RunConfig, config: RunConfig) -> List[str]:
+    """Names of the config fields that differ in a way that would change results."""
+    saved_dump, dump = saved.model_dump(), config.model_dump()
+    return [
+        name
+        for name in dump
+        if name not in RESUME_IGNORED_CONFIG_FIELDS
+        and saved_dump.get(name) != dump[name]
+    ]
+
+
+def load_resumable_results(path: str, config: RunConfig) -> List[EnvRunResult]:
+    """Results already in the checkpoint `path`, after checking it was written for `config`.
+
+    Episodes stopped by their budget (`info["stopped"]`) did not finish, and
+    episodes that crashed (`info["error"]`) may have failed for a transient
+    reason such as a provider outage, so like the episodes that were never
+    started they are left out and run again.
+    """
+    saved = read_checkpoint_config(path)
+    if saved is None:
+        raise ValueError(
+            f"Cannot resume from {path}: it has no config header (only .jsonl checkpoints written by run() can be resumed)"
+        )
+    mismatches = get_config_mismatches(saved, config)
+    if len(mismatches) > 0:
+        raise ValueError(
+            f"Cannot resume from {path}: config differs in {', '.join(mismatches)}"
+        )
+    return [
+        result
+        for result in read_checkpoint(path)
+        if "stopped" not in result.info and "error" not in result.info
+    ]
+
+
+def write_results(path: str, results: List[EnvRunResult]) -> None:
+    with open(path, "w") as f:
+        json.dump([result.model_dump() for result in results], f, indent=2)
+
+
+def convert_checkpoint(checkpoint_path: str, output_path: str) -> List[EnvRunResult]:
+    """Write the results of a JSONL checkpoint as the final JSON results file."""
+    results = read_checkpoint(checkpoint_path)
+    write_results(output_path, results)
+    return results
@@ -0,0 +1,135 @@
+# Copyright Sierra
+
+"""Token and dollar accounting of LLM calls, with budget caps.
+
+`tau_bench.llm` charges every successful call (replayed ones included) to the
+`CostLedger` of the current `record_costs()` block, under the component of the
+outermost open timing span (`agent_llm`, `user_llm`, ...; `other` outside any
+span). The ledger is scoped to an episode the same way as the span recorder of
+`tau_bench.timing`.
+
+`run()` opens a ledger per episode whose parent is a run-wide ledger, so the
+spend of every episode in flight is known at any time:
+
+  - a ledger with a `max_cost` is exhausted once it has spent that much; the
+    next LLM call charged to an exhausted episode ledger raises
+    `BudgetExceededError`. `run()` records such an episode as stopped rather
+    than failed, with the messages the agent registered (`track_messages`)
+    as its partial trajectory; it is left out of the metrics and run again on
+    resume;
+  - `run()` stops starting new episodes once the run-wide ledger is exhausted.
+    Episodes already in flight still finish (bounded by their own cap), so a
+    run may overshoot its budget by up to `max_concurrency` episodes.
+
+Costs come from litellm's `response_cost`; calls to models litellm has no
+price for are counted as free.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from tau_bench.timing import current_component
+from tau_bench.types import EpisodeCost, Usage
+
+
+class BudgetExceededError(Exception):
+    pass
+
+
+def get_usage(res: Any) -> Usage:
+    usage = getattr(res, "usage", None)
+    prompt_tokens_details = getattr(usage, "prompt_tokens_details", None)
+    return Usage(
+        calls=1,
+        input_tokens=getattr(usage, "prompt_tokens", None) or 0,
+        output_tokens=getattr(usage, "completion_tokens", None) or 0,
+        # OpenAI reports cache hits in the prompt token details, Anthropic separately
+        cached_tokens=getattr(prompt_tokens_details, "cached_tokens", None)
+        or getattr(usage, "cache_read_input_tokens", None)
+        or 0,
+        cost=res._hidden_params.get("response_cost") or 0.0,
+    )
+
+
+def add_usage(total: Usage, usage: Usage) -> None:
+    total.calls += usage.calls
+    total.input_tokens += usage.input_tokens
+    total.output_tokens += usage.output_tokens
+    total.cached_tokens += usage.cached_tokens
+    total.cost += usage.cost
+
+
+class CostLedger(object):
+    def __init__(
+        self, max_cost: Optional[float] = None, parent: Optional["CostLedger"] = None
+    ) -> None:
+        self.max_cost = max_cost
+        self.parent = parent
+        self.total = Usage()
+        self.by_component: Dict[str, Usage] = {}
+        # the agent's message history, kept up to date by the agent in place
+        self.messages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def charge(self, component: str, usage: Usage) -> None:
+        with self._lock:
+            add_usage(self.total, usage)
+            add_usage(self.by_component.setdefault(component, Usage()), usage)
+        if self.parent is not None:
+            self.parent.charge(component, usage)
+
+    def exhausted(self) -> bool:
+        return self.max_cost is not None and self.total.cost >= self.max_cost
+
+    def episode_cost(self) -> EpisodeCost:
+        with self._lock:
+            return EpisodeCost(
+                total=self.total.model_copy(),
+                by_component={
+                    component: usage.model_copy()
+                    for component, usage in self.by_component.items()
+                },
+            )
+
+
+_ledger: ContextVar[Optional[CostLedger]] = ContextVar("cost_ledger", default=None)
+
+
+@contextmanager
+def record_costs(
+    max_cost: Optional[float] = None, parent: Optional[CostLedger] = None
+) -> Iterator[CostLedger]:
+    ledger = CostLedger(max_cost=max_cost, parent=parent)
+    token = _ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _ledger.reset(token)
+
+
+def check_budget() -> None:
+    """Raise `BudgetExceededError` if the current ledger has spent its budget."""
+    ledger = _ledger.get()
+    if ledger is not None and ledger.exhausted():
+        raise BudgetExceededError(
+            f"Episode budget of ${ledger.max_cost:.4f} exceeded (spent ${ledger.total.cost:.4f} in {ledger.total.calls} LLM calls)"
+        )
+
+
+def track_messages(messages: List[Dict[str, Any]]) -> None:
+    """Register the agent's message history with the current ledger.
+
+    The list is kept by reference, so an episode stopped by its budget still
+    reports the messages exchanged up to that point.
+    """
+    ledger = _ledger.get()
+    if ledger is not None:
+        ledger.messages = messages
+
+
+def charge(res: Any) -> None:
+    ledger = _ledger.get()
+    if ledger is not None:
+        ledger.charge(current_component() or "other", get_usage(res))
@@ -0,0 +1,285 @@
+# Copyright Sierra
+
+"""Environments as a local HTTP service.
+
+One process hosts many concurrent sessions. Each session is an `Env` whose
+state is a copy-on-write view of the dataset, which is loaded once per
+process. Agents written in any language can drive the envs over JSON:
+
+    POST   /sessions                 {"env": "retail", "task_split": "test",
+                                      "user_strategy": "llm", "user_model": "gpt-4o",
+                                      "user_provider": "openai"}
+                                     -> {"session_id", "tools_info", "wiki"}
+    POST   /sessions/<id>/reset      {"task_index": 3} -> EnvResetResponse
+    POST   /sessions/<id>/step       {"name": "get_user_details", "kwargs": {...}}
+                                     -> EnvResponse
+    POST   /sessions/<id>/grade      -> RewardResult of the current state
+    DELETE /sessions/<id>
+    GET    /health                   -> session counts
+
+Requests are served on a thread each, and a lock per session serializes the
+requests of one session. Sessions idle for longer than `idle_timeout` seconds
+are evicted, and their envs are reused for new sessions with the same
+settings. Grading leaves the env's state alone, so a session can be graded
+mid-episode and then keep going. Start it with:
+
+    python env_server.py --port 8100
+"""
+
+import json
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from tau_bench.envs import get_env
+from tau_bench.envs.base import Env
+from tau_bench.envs.pool import EnvPool
+from tau_bench.envs.user import UserStrategy
+from tau_bench.types import Action
+
+EnvKey = Tuple[str, str, str, str, Optional[str], bool]
+
+
+class SessionNotFoundError(KeyError):
+    pass
+
+
+class Session(object):
+    def __init__(self, session_id: str, key: EnvKey, env: Env) -> None:
+        self.session_id = session_id
+        self.key = key
+        self.env = env
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # pooled envs keep the state of their previous session until reset
+        self.started = False
+        # set under `lock` once the env went back to the pool
+        self.closed = False
+
+
+class SessionManager(object):
+    def __init__(self, idle_timeout: float = 600.0, max_sessions: int = 1000) -> None:
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions: Dict[str, Session] = {}
+        self.pools: Dict[EnvKey, EnvPool] = {}
+        self.num_created = 0
+        self.num_evicted = 0
+        # sessions counted against `max_sessions` while their env is acquired
+        self._num_reserved = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self, key: EnvKey) -> EnvPool:
+        with self._lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                env_name, task_split, user_strategy, user_model, user_provider, check_outputs = key
+                pool = EnvPool(
+                    lambda: get_env(
+                        env_name,
+                        user_strategy=user_strategy,
+                        user_model=user_model,
+                        task_split=task_split,
+                        user_provider=user_provider,
+                        task_index=0,
+                        check_outputs=check_outputs,
+                    )
+                )
+                self.pools[key] = pool
+            return pool
+
+    def create(self, params: Dict[str, Any]) -> Session:
+        user_strategy = UserStrategy(params.get("user_strategy", "llm"))
+        if user_strategy == UserStrategy.HUMAN:
+            raise ValueError("The human user strategy reads from the server's stdin")
+        key: EnvKey = (
+            params.get("env", "retail"),
+            params.get("task_split", "test"),
+            user_strategy.value,
+            params.get("user_model", "gpt-4o"),
+            params.get("user_provider"),
+            bool(params.get("check_outputs", True)),
+        )
+        with self._lock:
+            if len(self.sessions) + self._num_reserved >= self.max_sessions:
+                raise OverflowError(f"Too many sessions (max {self.max_sessions})")
+            self._num_reserved += 1
+        try:
+            env = self._get_pool(key).acquire()
+        except BaseException:
+            with self._lock:
+                self._num_reserved -= 1
+            raise
+        session = Session(uuid.uuid4().hex, key, env)
+        with self._lock:
+            self._num_reserved -= 1
+            self.sessions[session.session_id] = session
+            self.num_created += 1
+        return session
+
+    def get(self, session_id: str) -> Session:
+        with self._lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def close(self, session_id: str) -> None:
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        self._release(session)
+
+    def _release(self, session: Session) -> None:
+        # wait for a request still running on the session before reusing its env
+        with session.lock:
+            session.closed = True
+            self._get_pool(session.key).release(session.env)
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                session
+                for session in self.sessions.values()
+                if now - session.last_used > self.idle_timeout
+                and not session.lock.locked()
+            ]
+            for session in idle:
+                del self.sessions[session.session_id]
+            self.num_evicted += len(idle)
+        for session in idle:
+            self._release(session)
+        return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self.sessions),
+                "created": self.num_created,
+                "evicted": self.num_evicted,
+                "pooled_envs": {
+                    "/".join(str(part) for part in key): pool.num_created
+                    for key, pool in self.pools.items()
+                },
+            }
+
+
+def _dispatch(
+    manager: SessionManager, method: str, path: str, body: Dict[str, Any]
+) -> Tuple[int, Any]:
+    parts = [part for part in path.split("?")[0].split("/") if part]
+    if method == "GET" and parts == ["health"]:
+        return HTTPStatus.OK, manager.stats()
+    if len(parts) == 0 or parts[0] != "sessions":
+        return HTTPStatus.NOT_FOUND, {"error": f"Not found: {path}"}
+    if method == "POST" and len(parts) == 1:
+        session = manager.create(body)
+        return HTTPStatus.OK, {
+            "session_id": session.session_id,
+            "tools_info": session.env.tools_info,
+            "wiki": session.env.wiki,
+        }
+    if method == "DELETE" and len(parts) == 2:
+        manager.close(parts[1])
+        return HTTPStatus.OK, {}
+    if method != "POST" or len(parts) != 3:
+        return HTTPStatus.NOT_FOUND, {"error": f"Not found: {method} {path}"}
+    session = manager.get(parts[1])
+    with session.lock:
+        if session.closed:
+            # closed or evicted while this request waited for the lock; its env
+            # may already belong to another session
+            raise SessionNotFoundError(session.session_id)
+        env = session.env
+        if parts[2] == "reset":
+            task_index = body.get("task_index")
+            # bools are ints too
+            if (
+                not isinstance(task_index, int)
+                or isinstance(task_index, bool)
+                or not 0 <= task_index < len(env.tasks)
+            ):
+                raise ValueError(
+                    f"task_index must be an integer from 0 to {len(env.tasks) - 1}, got {task_index!r}"
+                )
+            response = env.reset(task_index=task_index)
+            session.started = True
+            return HTTPStatus.OK, response.model_dump()
+        elif not session.started:
+            raise ValueError("Reset the session before stepping or grading it")
+        elif parts[2] == "step":
+            action = Action(name=body["name"], kwargs=body.get("kwargs", {}))
+            return HTTPStatus.OK, env.step(action).model_dump()
+        elif parts[2] == "grade":
+            # the ground truth is replayed on a scratch copy of the data
+            return HTTPStatus.OK, env.calculate_reward().model_dump()
+    return HTTPStatus.NOT_FOUND, {"error": f"Not found: {method} {path}"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "EnvServer"
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self, method: str) -> None:
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            status, payload = _dispatch(self.server.manager, method, self.path, body)
+        except SessionNotFoundError as e:
+            status, payload = HTTPStatus.NOT_FOUND, {"error": f"Unknown session: {e.args[0]}"}
+        except OverflowError as e:
+            status, payload = HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(e)}
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": f"Bad request: {e!r}"}
+        except Exception as e:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(e)}
+        data = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_DELETE(self) -> None:
+        self._handle("DELETE")
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class EnvServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8100,
+        idle_timeout: float = 600.0,
+        max_sessions: int = 1000,
+    ) -> None:
+        super().__init__((host, port), _Handler)
+        self.manager = SessionManager(idle_timeout=idle_timeout, max_sessions=max_sessions)
+        self._stop = threading.Event()
+        self._evictor = threading.Thread(target=self._evict_loop, daemon=True)
+        self._evictor.start()
+
+    def _evict_loop(self) -> None:
+        interval = max(1.0, min(60.0, self.manager.idle_timeout / 4))
+        while not self._stop.wait(interval):
+            self.manager.evict_idle()
+
+    def server_close(self) -> None:
+        self._stop.set()
+        super().server_close()
@@ -1,21 +1,18 @@
 # Copyright Sierra
 
-import json
 import os
 from typing import Any
 
+from tau_bench.envs.data_cache import load_json_files
+
 FOLDER_PATH = os.path.dirname(__file__)
 
+DATA_FILES = {
+    "flights": "flights.json",
+    "reservations": "reservations.json",
+    "users": "users.json",
+}
+
 
 def load_data() -> dict[str, Any]:
-    with open(os.path.join(FOLDER_PATH, "flights.json")) as f:
-        flight_data = json.load(f)
-    with open(os.path.join(FOLDER_PATH, "reservations.json")) as f:
-        reservation_data = json.load(f)
-    with open(os.path.join(FOLDER_PATH, "users.json")) as f:
-        user_data = json.load(f)
-    return {
-        "flights": flight_data,
-        "reservations": reservation_data,
-        "users": user_data,
-    }
+    return load_json_files(FOLDER_PATH, DATA_FILES)
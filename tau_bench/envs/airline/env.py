@@ -37,5 +37,16 @@ class MockAirlineDomainEnv(Env):
             user_provider=user_provider,
             task_index=task_index,
             check_outputs=check_outputs,
+            env_name="airline",
+            task_split=task_split,
         )
         self.terminate_tools = ["transfer_to_human_agents"]
+        self.read_only_tools = [
+            "calculate",
+            "get_reservation_details",
+            "get_user_details",
+            "list_all_airports",
+            "search_direct_flight",
+            "search_onestop_flight",
+            "think",
+        ]
@@ -1,24 +1,26 @@
 # Copyright Sierra
 
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
+from tau_bench.envs.dataset import get_table_index
 from tau_bench.envs.tool import Tool
 
 
+def flight_route(flight: Dict[str, Any]) -> Tuple[str, str]:
+    return flight["origin"], flight["destination"]
+
+
 class SearchDirectFlight(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], origin: str, destination: str, date: str) -> str:
         flights = data["flights"]
+        routes = get_table_index(data, "flights", flight_route)
         results = []
-        for flight in flights.values():
-            if flight["origin"] == origin and flight["destination"] == destination:
-                if (
-                    date in flight["dates"]
-                    and flight["dates"][date]["status"] == "available"
-                ):
-                    # results add flight except dates, but add flight["datas"][date]
-                    results.append({k: v for k, v in flight.items() if k != "dates"})
-                    results[-1].update(flight["dates"][date])
+        for flight in routes.records(flights, (origin, destination)):
+            if date in flight["dates"] and flight["dates"][date]["status"] == "available":
+                # results add flight except dates, but add flight["datas"][date]
+                results.append({k: v for k, v in flight.items() if k != "dates"})
+                results[-1].update(flight["dates"][date])
         return json.dumps(results)
 
     @staticmethod
@@ -2,47 +2,48 @@
 
 import json
 from typing import Any, Dict
+from tau_bench.envs.airline.tools.search_direct_flight import flight_route
+from tau_bench.envs.dataset import get_table_index
 from tau_bench.envs.tool import Tool
 
 
+def flight_origin(flight: Dict[str, Any]) -> str:
+    return flight["origin"]
+
+
 class SearchOnestopFlight(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], origin: str, destination: str, date: str) -> str:
         flights = data["flights"]
+        origins = get_table_index(data, "flights", flight_origin)
+        routes = get_table_index(data, "flights", flight_route)
         results = []
-        for flight1 in flights.values():
-            if flight1["origin"] == origin:
-                for flight2 in flights.values():
+        for flight1 in origins.records(flights, origin):
+            # only second legs from where flight1 lands to the destination
+            second_legs = routes.records(flights, (flight1["destination"], destination))
+            for flight2 in second_legs:
+                date2 = (
+                    f"2024-05-{int(date[-2:])+1}"
+                    if "+1" in flight1["scheduled_arrival_time_est"]
+                    else date
+                )
+                if (
+                    flight1["scheduled_arrival_time_est"]
+                    > flight2["scheduled_departure_time_est"]
+                ):
+                    continue
+                if date in flight1["dates"] and date2 in flight2["dates"]:
                     if (
-                        flight2["destination"] == destination
-                        and flight1["destination"] == flight2["origin"]
+                        flight1["dates"][date]["status"] == "available"
+                        and flight2["dates"][date2]["status"] == "available"
                     ):
-                        date2 = (
-                            f"2024-05-{int(date[-2:])+1}"
-                            if "+1" in flight1["scheduled_arrival_time_est"]
-                            else date
-                        )
-                        if (
-                            flight1["scheduled_arrival_time_est"]
-                            > flight2["scheduled_departure_time_est"]
-                        ):
-                            continue
-                        if date in flight1["dates"] and date2 in flight2["dates"]:
-                            if (
-                                flight1["dates"][date]["status"] == "available"
-                                and flight2["dates"][date2]["status"] == "available"
-                            ):
-                                result1 = {
-                                    k: v for k, v in flight1.items() if k != "dates"
-                                }
-                                result1.update(flight1["dates"][date])
-                                result1["date"] = date
-                                result2 = {
-                                    k: v for k, v in flight2.items() if k != "dates"
-                                }
-                                result2.update(flight2["dates"][date])
-                                result2["date"] = date2
-                                results.append([result1, result2])
+                        result1 = {k: v for k, v in flight1.items() if k != "dates"}
+                        result1.update(flight1["dates"][date])
+                        result1["date"] = date
+                        result2 = {k: v for k, v in flight2.items() if k != "dates"}
+                        result2.update(flight2["dates"][date])
+                        result2["date"] = date2
+                        results.append([result1, result2])
         return json.dumps(results)
 
     @staticmethod
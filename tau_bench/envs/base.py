@@ -1,9 +1,27 @@
 # Copyright Sierra
 
+import copy
+import json
 import random
-from hashlib import sha256
+from tau_bench.envs.data_hash import (
+    Hashable as Hashable,
+    ToHashable as ToHashable,
+    consistent_hash as consistent_hash,
+    diff_data,
+    hash_data,
+    to_hashable as to_hashable,
+)
+from tau_bench.envs.dataset import (
+    CowDataset,
+    DataSnapshot,
+    DataWrites,
+    get_derived,
+    load_base_data,
+)
+from tau_bench.envs.gt_hashes import GroundTruthHashEntry, load_gt_hash_index
 from tau_bench.envs.tool import Tool
-from typing import Any, Callable, Dict, List, Type, Optional, Set, Union, Tuple
+from tau_bench.timing import span
+from typing import Any, Callable, Dict, List, Type, Optional, Union
 
 from tau_bench.envs.user import load_user, UserStrategy
 from tau_bench.types import (
@@ -18,27 +36,34 @@ from tau_bench.types import (
     RESPOND_ACTION_NAME,
 )
 
-ToHashable = Union[
-    str, int, float, Dict[str, "ToHashable"], List["ToHashable"], Set["ToHashable"]
-]
-Hashable = Union[str, int, float, Tuple["Hashable"], Tuple[Tuple[str, "Hashable"]]]
+# Bump whenever `get_data_hash` changes so stale ground-truth hash indexes are ignored.
+DATA_HASH_VERSION = 2
 
 
-def to_hashable(item: ToHashable) -> Hashable:
-    if isinstance(item, dict):
-        return tuple((key, to_hashable(value)) for key, value in sorted(item.items()))
-    elif isinstance(item, list):
-        return tuple(to_hashable(element) for element in item)
-    elif isinstance(item, set):
-        return tuple(sorted(to_hashable(element) for element in item))
-    else:
-        return item
+class ToolCommit(object):
+    """The records a successful tool call wrote; see `Env.commit_log`."""
 
+    def __init__(self, action: Action, writes: DataWrites) -> None:
+        self.action = action
+        self.writes = writes
 
-def consistent_hash(
-    value: Hashable,
-) -> str:
-    return sha256(str(value).encode("utf-8")).hexdigest()
+
+class EnvSnapshot(object):
+    """The state of an env at one point of an episode; see `Env.snapshot`."""
+
+    def __init__(
+        self,
+        task_index: int,
+        data: DataSnapshot,
+        actions: List[Action],
+        commit_log: List[ToolCommit],
+        user: Any,
+    ) -> None:
+        self.task_index = task_index
+        self.data = data
+        self.actions = actions
+        self.commit_log = commit_log
+        self.user = user
 
 
 class Env(object):
@@ -54,15 +79,20 @@ class Env(object):
         user_provider: Optional[str] = None,
         task_index: Optional[int] = None,
         check_outputs: bool = True,
+        env_name: Optional[str] = None,
+        task_split: Optional[str] = None,
     ) -> None:
         super().__init__()
         self.data_load_func = data_load_func
-        self.data = data_load_func()
+        self.base_data = load_base_data(data_load_func)
+        self.data = CowDataset(self.base_data)
         self.tools_map: Dict[str, Type[Tool]] = {
             tool.get_info()["function"]["name"]: tool for tool in tools
         }
         self.tools_info = [tool.get_info() for tool in tools]
         self.terminate_tools = []
+        # tools that never modify the data; see `step_tool_calls`
+        self.read_only_tools: List[str] = []
         self.tasks = tasks
         if task_index is not None:
             self.task_index = task_index
@@ -75,37 +105,157 @@ class Env(object):
             user_strategy=user_strategy, model=user_model, provider=user_provider
         )
         self.actions: List[Action] = []
+        # the writes of every tool call that changed the data, in order
+        self.commit_log: List[ToolCommit] = []
         self.check_outputs = check_outputs
+        self.env_name = env_name
+        self.task_split = task_split
 
-    def reset(self, task_index: Optional[int] = None) -> EnvResetResponse:
-        if task_index is None:
-            task_index = random.randint(0, len(self.tasks))
+    def reset_state(self, task_index: int) -> None:
         self.task_index = task_index
-        self.data = self.data_load_func()
+        self.data = CowDataset(self.base_data)
         self.task = self.tasks[task_index]
         self.actions = []
-        initial_observation = self.user.reset(instruction=self.task.instruction)
+        self.commit_log = []
+
+    def snapshot(self) -> EnvSnapshot:
+        """Capture the data, the action log and the user simulator's history."""
+        return EnvSnapshot(
+            task_index=self.task_index,
+            data=self.data.snapshot(),
+            actions=list(self.actions),
+            commit_log=list(self.commit_log),
+            user=self.user.snapshot(),
+        )
+
+    def restore(self, snapshot: EnvSnapshot) -> None:
+        self.task_index = snapshot.task_index
+        self.task = self.tasks[snapshot.task_index]
+        self.data = CowDataset(self.base_data, snapshot.data)
+        self.actions = list(snapshot.actions)
+        self.commit_log = list(snapshot.commit_log)
+        self.user.restore(snapshot.user)
+
+    def fork(self) -> "Env":
+        """An independent copy of this env in its current state, sharing its unchanged data."""
+        env = copy.copy(self)
+        env.user = copy.copy(self.user)
+        env.restore(self.snapshot())
+        return env
+
+    def reset(self, task_index: Optional[int] = None) -> EnvResetResponse:
+        if task_index is None:
+            task_index = random.randint(0, len(self.tasks))
+        self.reset_state(task_index)
+        with span("user_llm"):
+            initial_observation = self.user.reset(instruction=self.task.instruction)
+        return EnvResetResponse(
+            observation=initial_observation, info=EnvInfo(task=self.task, source="user")
+        )
+
+    async def areset(self, task_index: Optional[int] = None) -> EnvResetResponse:
+        if task_index is None:
+            task_index = random.randint(0, len(self.tasks))
+        self.reset_state(task_index)
+        with span("user_llm"):
+            initial_observation = await self.user.areset(
+                instruction=self.task.instruction
+            )
         return EnvResetResponse(
             observation=initial_observation, info=EnvInfo(task=self.task, source="user")
         )
 
     def step(self, action: Action) -> EnvResponse:
+        user_observation = None
+        if action.name == RESPOND_ACTION_NAME:
+            with span("user_llm"):
+                user_observation = self.user.step(action.kwargs["content"])
+        return self._step(action, user_observation)
+
+    async def astep(self, action: Action) -> EnvResponse:
+        """Like `step`, but awaits the user simulator's reply; tools run inline."""
+        user_observation = None
+        if action.name == RESPOND_ACTION_NAME:
+            with span("user_llm"):
+                user_observation = await self.user.astep(action.kwargs["content"])
+        return self._step(action, user_observation)
+
+    def step_tool_calls(self, actions: List[Action]) -> List[EnvResponse]:
+        """Execute the tool calls of one agent turn in order, up to one that ends the episode."""
+        responses: List[EnvResponse] = []
+        # identical read-only calls with no write in between are executed once
+        batch: Dict[str, EnvResponse] = {}
+        for action in actions:
+            if action.name == RESPOND_ACTION_NAME:
+                # sent back to the model like an unknown tool; never shown to the
+                # user, so it is not recorded as an action either
+                responses.append(
+                    EnvResponse(
+                        observation=f"Error: {RESPOND_ACTION_NAME} cannot be called together with other tools",
+                        reward=0,
+                        done=False,
+                        info=EnvInfo(task=self.task, source=action.name),
+                    )
+                )
+                continue
+            if action.name not in self.read_only_tools:
+                batch = {}
+                response = self.step(action)
+            else:
+                key = json.dumps([action.name, action.kwargs], sort_keys=True, default=str)
+                if key in batch:
+                    self.actions.append(action)
+                    response = batch[key].model_copy(deep=True)
+                else:
+                    response = self.step(action)
+                    batch[key] = response
+            responses.append(response)
+            if response.done:
+                break
+        return responses
+
+    def invoke_tool(self, action: Action, component: str = "tool") -> str:
+        """Run a tool call as a transaction, appending its writes to `commit_log`."""
+        # read-only tools cannot write, so they skip the journal
+        transactional = action.name not in self.read_only_tools
+        if transactional:
+            self.data.begin()
+        try:
+            with span(component, action.name):
+                observation = self.tools_map[action.name].invoke(
+                    data=self.data, **action.kwargs
+                )
+        except Exception as e:
+            observation = f"Error: {e}"
+        if transactional:
+            # tools report failures as "Error: ..." observations, possibly after a
+            # partial update, so those are rolled back like exceptions
+            if isinstance(observation, str) and observation.startswith("Error"):
+                self.data.rollback()
+            else:
+                writes = self.data.commit()
+                if len(writes) > 0:
+                    self.commit_log.append(ToolCommit(action=action, writes=writes))
+        return observation
+
+    def replay_commits(self, commit_log: List[ToolCommit]) -> None:
+        """Apply the writes of a commit log without running the tools again."""
+        for commit in commit_log:
+            self.data.apply(commit.writes)
+            self.commit_log.append(commit)
+
+    def _step(self, action: Action, user_observation: Optional[str]) -> EnvResponse:
         self.actions.append(action)
 
         info = EnvInfo(task=self.task)
         reward = 0
         done = False
         if action.name == RESPOND_ACTION_NAME:
-            observation = self.user.step(action.kwargs["content"])
+            observation = user_observation
             info.source = "user"
             done = "###STOP###" in observation
         elif action.name in self.tools_map:
-            try:
-                observation = self.tools_map[action.name].invoke(
-                    data=self.data, **action.kwargs
-                )
-            except Exception as e:
-                observation = f"Error: {e}"
+            observation = self.invoke_tool(action)
             info.source = action.name
             if action.name in self.terminate_tools:
                 done = True
@@ -114,14 +264,66 @@ class Env(object):
             info.source = action.name
 
         if done:
-            reward_res = self.calculate_reward()
+            with span("reward"):
+                reward_res = self.calculate_reward()
             reward = reward_res.reward
             info.reward_info = reward_res
             info.user_cost = self.user.get_total_cost()
         return EnvResponse(observation=observation, reward=reward, done=done, info=info)
 
     def get_data_hash(self) -> str:
-        return consistent_hash(to_hashable(self.data))
+        return hash_data(self.data)
+
+    def get_data_fingerprint(self) -> str:
+        return get_derived(
+            self.base_data, "data_fingerprint", lambda base: hash_data(CowDataset(base))
+        )
+
+    def get_task_fingerprint(self) -> str:
+        return consistent_hash(
+            to_hashable([action.model_dump() for action in self.task.actions])
+        )
+
+    def replay_gt_actions(self) -> CowDataset:
+        """The data after the ground-truth actions, replayed on a scratch copy of the env."""
+        scratch = copy.copy(self)
+        scratch.data = CowDataset(self.base_data)
+        scratch.actions = []
+        scratch.commit_log = []
+        for action in self.task.actions:
+            # only tool calls change the data; the user is never involved
+            if action.name in self.tools_map and action.name not in self.terminate_tools:
+                # timed apart from the tools the agent called
+                scratch.invoke_tool(action, component="gt_replay")
+        return scratch.data
+
+    def get_gt_data_diff(self) -> List[str]:
+        """The records (`table/key`) whose state differs from the replayed ground truth."""
+        return diff_data(self.data, self.replay_gt_actions())
+
+    def build_gt_hash_entry(self) -> GroundTruthHashEntry:
+        return GroundTruthHashEntry(
+            hash_version=DATA_HASH_VERSION,
+            data_fingerprint=self.get_data_fingerprint(),
+            task_fingerprint=self.get_task_fingerprint(),
+            gt_data_hash=hash_data(self.replay_gt_actions()),
+        )
+
+    def get_cached_gt_data_hash(self) -> Optional[str]:
+        if self.env_name is None or self.task_split is None:
+            return None
+        index = load_gt_hash_index(self.env_name, self.task_split)
+        if index is None:
+            return None
+        entry = index.entries.get(self.task_index)
+        if (
+            entry is None
+            or entry.hash_version != DATA_HASH_VERSION
+            or entry.task_fingerprint != self.get_task_fingerprint()
+            or entry.data_fingerprint != self.get_data_fingerprint()
+        ):
+            return None
+        return entry.gt_data_hash
 
     def calculate_reward(self) -> RewardResult:
         data_hash = self.get_data_hash()
@@ -131,14 +333,18 @@ class Env(object):
         ]
 
         # Check if the database changes are correct. If they are not correct, then we set the reward to 0.
-        # TODO: cache gt_data_hash in tasks.py (low priority)
-        self.data = self.data_load_func()
-        for action in self.task.actions:
-            if action.name not in self.terminate_tools:
-                self.step(action)
-        gt_data_hash = self.get_data_hash()
+        # A matching precomputed ground-truth hash settles it; otherwise the ground-truth actions are
+        # replayed and only the records written by either side are compared.
+        gt_data_hash = self.get_cached_gt_data_hash()
+        data_diff: List[str] = []
+        if gt_data_hash != data_hash:
+            gt_data = self.replay_gt_actions()
+            data_diff = diff_data(self.data, gt_data)
+            gt_data_hash = hash_data(gt_data)
         info = RewardActionInfo(
-            r_actions=data_hash == gt_data_hash, gt_data_hash=gt_data_hash
+            r_actions=len(data_diff) == 0,
+            gt_data_hash=gt_data_hash,
+            data_diff=data_diff,
         )
         if not info.r_actions:
             reward = 0.0
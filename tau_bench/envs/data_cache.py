@@ -0,0 +1,102 @@
+# Copyright Sierra
+
+"""Compiled (pre-parsed) copies of the JSON data files of an environment.
+
+`compile_json_files` parses the JSON files once and stores the result as a
+pickle (protocol 5) next to them, together with the checksums of the source
+files and of the payload. `load_json_files` uses that artifact when it is
+present, intact and built from the current sources, and parses the JSON
+otherwise. Build the artifacts with:
+
+    python build_data_cache.py --env retail airline
+"""
+
+import gc
+import json
+import os
+import pickle
+from contextlib import contextmanager
+from hashlib import sha256
+from typing import Any, Dict, Iterator, Optional
+
+COMPILED_FILE_NAME = "compiled_data.pkl"
+_MAGIC = b"TAUDATA1"
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # Parsing allocates millions of small containers and would otherwise trigger
+    # repeated full collections; none of them can be garbage yet.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _read_sources(folder: str, files: Dict[str, str]) -> Dict[str, bytes]:
+    sources = {}
+    for name, file_name in files.items():
+        with open(os.path.join(folder, file_name), "rb") as f:
+            sources[name] = f.read()
+    return sources
+
+
+def _source_checksums(sources: Dict[str, bytes]) -> Dict[str, str]:
+    return {name: sha256(raw).hexdigest() for name, raw in sources.items()}
+
+
+def _load_compiled(path: str, checksums: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        raw = f.read()
+    if not raw.startswith(_MAGIC):
+        return None
+    header_end = raw.find(b"\n", len(_MAGIC))
+    if header_end == -1:
+        return None
+    try:
+        header = json.loads(raw[len(_MAGIC) : header_end])
+    except ValueError:
+        return None
+    if not isinstance(header, dict):
+        return None
+    payload = memoryview(raw)[header_end + 1 :]
+    if header.get("sources") != checksums:
+        return None
+    if header.get("payload_sha256") != sha256(payload).hexdigest():
+        return None
+    with _gc_paused():
+        return pickle.loads(payload)
+
+
+def load_json_files(folder: str, files: Dict[str, str]) -> Dict[str, Any]:
+    """Load `{name: file_name}` JSON files from `folder` as `{name: parsed}`."""
+    sources = _read_sources(folder, files)
+    data = _load_compiled(
+        os.path.join(folder, COMPILED_FILE_NAME), _source_checksums(sources)
+    )
+    if data is not None:
+        return data
+    with _gc_paused():
+        return {name: json.loads(raw) for name, raw in sources.items()}
+
+
+def compile_json_files(folder: str, files: Dict[str, str]) -> str:
+    sources = _read_sources(folder, files)
+    data = {name: json.loads(raw) for name, raw in sources.items()}
+    payload = pickle.dumps(data, protocol=5)
+    header = {
+        "sources": _source_checksums(sources),
+        "payload_sha256": sha256(payload).hexdigest(),
+    }
+    path = os.path.join(folder, COMPILED_FILE_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_MAGIC + json.dumps(header).encode("utf-8") + b"\n")
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,135 @@
+# Copyright Sierra
+
+"""Hashing of environment data.
+
+`hash_data` combines a digest per record (the same `consistent_hash` of
+`to_hashable(record)` used for the whole database before) into a digest per
+table, and the table digests into a root. Table digests are additive over
+records, so for a `CowDataset` only the records in the episode's overlay are
+re-hashed; digests of the shared base records are computed once per process.
+"""
+
+from collections.abc import Mapping
+from hashlib import sha256
+from typing import Any, Dict, List, Set, Tuple, Union
+
+from tau_bench.envs.dataset import BaseData, CowDataset, CowTable, get_derived
+
+ToHashable = Union[
+    str, int, float, Dict[str, "ToHashable"], List["ToHashable"], Set["ToHashable"]
+]
+Hashable = Union[str, int, float, Tuple["Hashable"], Tuple[Tuple[str, "Hashable"]]]
+
+_DIGEST_MODULUS = 2**256
+
+
+def to_hashable(item: ToHashable) -> Hashable:
+    if isinstance(item, Mapping):
+        return tuple((key, to_hashable(value)) for key, value in sorted(item.items()))
+    elif isinstance(item, list):
+        return tuple(to_hashable(element) for element in item)
+    elif isinstance(item, set):
+        return tuple(sorted(to_hashable(element) for element in item))
+    else:
+        return item
+
+
+def consistent_hash(
+    value: Hashable,
+) -> str:
+    return sha256(str(value).encode("utf-8")).hexdigest()
+
+
+def record_digest(record: Any) -> str:
+    return consistent_hash(to_hashable(record))
+
+
+def _entry_digest(key: str, digest: str) -> int:
+    return int(sha256(f"{key!r}:{digest}".encode("utf-8")).hexdigest(), 16)
+
+
+def _build_record_digests(base: BaseData) -> Dict[str, Dict[str, str]]:
+    return {
+        name: {key: record_digest(record) for key, record in table.items()}
+        for name, table in base.items()
+        if isinstance(table, dict)
+    }
+
+
+def _build_table_digests(base: BaseData) -> Dict[str, int]:
+    record_digests = get_derived(base, "record_digests", _build_record_digests)
+    return {
+        name: sum(_entry_digest(key, digest) for key, digest in digests.items())
+        % _DIGEST_MODULUS
+        for name, digests in record_digests.items()
+    }
+
+
+def _table_digest(data: Mapping, name: str) -> int:
+    table = data[name]
+    if isinstance(data, CowDataset) and isinstance(table, CowTable):
+        base_digests = get_derived(data.base, "record_digests", _build_record_digests)[
+            name
+        ]
+        digest = get_derived(data.base, "table_digests", _build_table_digests)[name]
+        for key in table.overlay_keys():
+            if key in base_digests:
+                digest -= _entry_digest(key, base_digests[key])
+            if key in table:
+                digest += _entry_digest(key, record_digest(table.peek(key)))
+        return digest % _DIGEST_MODULUS
+    if isinstance(table, Mapping):
+        return (
+            sum(_entry_digest(key, record_digest(record)) for key, record in table.items())
+            % _DIGEST_MODULUS
+        )
+    return int(record_digest(table), 16)
+
+
+def hash_data(data: Mapping) -> str:
+    """Hash a whole database; equal data always gives equal hashes."""
+    return consistent_hash(
+        tuple((name, format(_table_digest(data, name), "064x")) for name in sorted(data))
+    )
+
+
+def _changed_keys(table: Any, other_table: Any) -> Set[str]:
+    if (
+        isinstance(table, CowTable)
+        and isinstance(other_table, CowTable)
+        and table.base_table is other_table.base_table
+    ):
+        return set(table.overlay_keys()) | set(other_table.overlay_keys())
+    return set(table) | set(other_table)
+
+
+def diff_data(data: Mapping, other: Mapping) -> List[str]:
+    """Return the paths (`table/key`) of the records that differ between two databases.
+
+    When both are overlays of the same base dataset, only records touched by
+    either overlay are compared.
+    """
+    paths = []
+    for name in sorted(set(data) | set(other)):
+        if name not in data or name not in other:
+            paths.append(name)
+            continue
+        table, other_table = data[name], other[name]
+        if not isinstance(table, Mapping) or not isinstance(other_table, Mapping):
+            if record_digest(table) != record_digest(other_table):
+                paths.append(name)
+            continue
+        for key in sorted(_changed_keys(table, other_table)):
+            if key not in table or key not in other_table:
+                if key in table or key in other_table:
+                    paths.append(f"{name}/{key}")
+                continue
+            record = table.peek(key) if isinstance(table, CowTable) else table[key]
+            other_record = (
+                other_table.peek(key)
+                if isinstance(other_table, CowTable)
+                else other_table[key]
+            )
+            if record_digest(record) != record_digest(other_record):
+                paths.append(f"{name}/{key}")
+    return paths
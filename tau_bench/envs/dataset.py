@@ -0,0 +1,377 @@
+# Copyright Sierra
+
+import threading
+from collections.abc import ItemsView, Mapping, MutableMapping, ValuesView
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+DataLoadFunc = Callable[[], Dict[str, Any]]
+
+_DELETED = object()
+_ABSENT = object()
+
+
+class BaseData(dict):
+    """A parsed dataset shared by every env in the process; never mutated.
+
+    `derived` caches values computed from the data (fingerprints, indexes) so
+    they are built once per process as well; see `get_derived`.
+    """
+
+    def __init__(self, data: Dict[str, Any]) -> None:
+        super().__init__(data)
+        self.derived: Dict[str, Any] = {}
+        self.lock = threading.RLock()
+
+
+_base_data_cache: Dict[DataLoadFunc, BaseData] = {}
+_base_data_lock = threading.Lock()
+
+
+def load_base_data(data_load_func: DataLoadFunc) -> BaseData:
+    """Return the parsed dataset for `data_load_func`, loading it once per process.
+
+    The returned dict is shared by every env in the process and must be treated
+    as read-only; episodes mutate a `CowDataset` layered on top of it instead.
+    """
+    base = _base_data_cache.get(data_load_func)
+    if base is not None:
+        return base
+    with _base_data_lock:
+        base = _base_data_cache.get(data_load_func)
+        if base is None:
+            base = BaseData(data_load_func())
+            _base_data_cache[data_load_func] = base
+    return base
+
+
+def get_derived(base: BaseData, name: str, build: Callable[[BaseData], Any]) -> Any:
+    """Return `build(base)`, computing it at most once per base dataset."""
+    if name in base.derived:
+        return base.derived[name]
+    with base.lock:
+        if name not in base.derived:
+            base.derived[name] = build(base)
+    return base.derived[name]
+
+
+def copy_record(item: Any) -> Any:
+    # Records are plain JSON values, so this is much cheaper than `deepcopy`.
+    if isinstance(item, dict):
+        return {key: copy_record(value) for key, value in item.items()}
+    elif isinstance(item, list):
+        return [copy_record(element) for element in item]
+    return item
+
+
+def same_record(a: Any, b: Any) -> bool:
+    """Like `a == b`, but also tells apart values that hash differently, e.g. 50 and 50.0."""
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same_record(a[key], b[key]) for key in a)
+    elif isinstance(a, list):
+        return len(a) == len(b) and all(same_record(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+class _PeekValuesView(ValuesView):
+    def __iter__(self) -> Iterator[Any]:
+        for key in self._mapping:
+            yield self._mapping.peek(key)
+
+
+class _PeekItemsView(ItemsView):
+    def __iter__(self) -> Iterator[Any]:
+        for key in self._mapping:
+            yield key, self._mapping.peek(key)
+
+
+class CowTable(MutableMapping):
+    """A copy-on-write view of one table (e.g. `users`) of a shared base dataset.
+
+    Indexing (`table[key]`, `table.get(key)`) copies the record into a private
+    overlay on first access, so tools can mutate what they look up in place.
+    Iterating with `values()`/`items()` does not copy: the records yielded may be
+    shared with other episodes and must not be mutated.
+
+    `freeze` moves the overlay into a frozen layer of changes that is never
+    mutated again, so it can be shared by snapshots and forks of the table;
+    records in it are copied into the overlay on access, like base records.
+
+    Between `begin` and `commit`/`rollback`, the overlay entry of every record
+    accessed is journaled before its first access, so `rollback` can undo
+    in-place mutations of the records handed out.
+    """
+
+    def __init__(self, base: Dict[str, Any], frozen: Optional[Dict[str, Any]] = None) -> None:
+        self._base = base
+        self._frozen: Dict[str, Any] = frozen if frozen is not None else {}
+        self._overlay: Dict[str, Any] = {}
+        self._journal: Optional[Dict[str, Any]] = None
+
+    def _log(self, key: str) -> None:
+        journal = self._journal
+        if journal is None or key in journal:
+            return
+        prior = self._overlay.get(key, _ABSENT)
+        if prior is not _ABSENT and prior is not _DELETED:
+            # the caller may mutate the record in place
+            prior = copy_record(prior)
+        journal[key] = prior
+
+    def _current(self, key: str) -> Any:
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._frozen:
+            return self._frozen[key]
+        return self._base.get(key, _DELETED)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._overlay:
+            record = self._overlay[key]
+            if record is _DELETED:
+                raise KeyError(key)
+            self._log(key)
+            return record
+        record = self._frozen[key] if key in self._frozen else self._base[key]
+        if record is _DELETED:
+            raise KeyError(key)
+        self._log(key)
+        record = copy_record(record)
+        self._overlay[key] = record
+        return record
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._log(key)
+        self._overlay[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._log(key)
+        self._overlay[key] = _DELETED
+
+    def __contains__(self, key: object) -> bool:
+        return self._current(key) is not _DELETED
+
+    def __iter__(self) -> Iterator[str]:
+        changed_keys = self.overlay_keys()
+        deleted = {key for key in changed_keys if self._current(key) is _DELETED}
+        for key in self._base:
+            if key not in deleted:
+                yield key
+        for key in changed_keys:
+            if key not in self._base and key not in deleted:
+                yield key
+
+    def __len__(self) -> int:
+        size = len(self._base)
+        for key in self.overlay_keys():
+            record = self._current(key)
+            if key in self._base:
+                size -= record is _DELETED
+            else:
+                size += record is not _DELETED
+        return size
+
+    @property
+    def base_table(self) -> Dict[str, Any]:
+        return self._base
+
+    def peek(self, key: str) -> Any:
+        """Return the current record for `key` without claiming it for writing."""
+        record = self._current(key)
+        if record is _DELETED:
+            raise KeyError(key)
+        return record
+
+    def values(self) -> ValuesView:
+        return _PeekValuesView(self)
+
+    def items(self) -> ItemsView:
+        return _PeekItemsView(self)
+
+    def overlay_keys(self) -> List[str]:
+        """Keys copied, written or deleted since the base table."""
+        if len(self._frozen) == 0:
+            return list(self._overlay)
+        keys = list(self._frozen)
+        keys.extend(key for key in self._overlay if key not in self._frozen)
+        return keys
+
+    def freeze(self) -> Dict[str, Any]:
+        """Return the changes since the base table as a layer that is never mutated."""
+        # the overlay's records move into the layer as they are, so records looked
+        # up before the call must not be mutated after it
+        if len(self._overlay) > 0:
+            self._frozen = {**self._frozen, **self._overlay}
+            self._overlay = {}
+        return self._frozen
+
+    def begin(self) -> None:
+        self._journal = {}
+
+    def commit(self) -> Dict[str, Any]:
+        """End the transaction and return copies of the records it changed (None if deleted)."""
+        journal, self._journal = self._journal or {}, None
+        writes: Dict[str, Any] = {}
+        for key, prior in journal.items():
+            if prior is _ABSENT:
+                prior = self._frozen.get(key, self._base.get(key, _DELETED))
+            record = self._current(key)
+            if record is not prior and not same_record(record, prior):
+                writes[key] = None if record is _DELETED else copy_record(record)
+        return writes
+
+    def rollback(self) -> None:
+        """Undo every change since `begin`."""
+        journal, self._journal = self._journal or {}, None
+        for key, prior in journal.items():
+            if prior is _ABSENT:
+                self._overlay.pop(key, None)
+            else:
+                self._overlay[key] = prior
+
+
+# Table name to a frozen layer of changes (or a copy, for tables that are not dicts)
+DataSnapshot = Dict[str, Any]
+# Table name to the records written by a transaction, keyed by record key; None if deleted
+DataWrites = Dict[str, Dict[str, Any]]
+
+
+class CowDataset(Mapping):
+    """Per-episode copy-on-write state over a shared, read-only base dataset.
+
+    Creating one is O(number of tables); records are only copied when a tool
+    looks them up, so resetting an episode does not re-read or re-copy the data.
+    `snapshot` and `fork` share the changes made so far instead of copying the
+    dataset, so they cost O(changed records).
+    """
+
+    def __init__(self, base: BaseData, snapshot: Optional[DataSnapshot] = None) -> None:
+        self.base = base
+        self.tables: Dict[str, Any] = {}
+        for name, table in base.items():
+            if isinstance(table, dict):
+                self.tables[name] = CowTable(
+                    table, frozen=snapshot[name] if snapshot is not None else None
+                )
+            else:
+                self.tables[name] = copy_record(
+                    snapshot[name] if snapshot is not None else table
+                )
+
+    def __getitem__(self, name: str) -> Any:
+        return self.tables[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tables)
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def snapshot(self) -> DataSnapshot:
+        """The current state, to restore with `CowDataset(base, snapshot)`."""
+        return {
+            name: table.freeze() if isinstance(table, CowTable) else copy_record(table)
+            for name, table in self.tables.items()
+        }
+
+    def fork(self) -> "CowDataset":
+        """An independent copy of the current state."""
+        return CowDataset(self.base, self.snapshot())
+
+    def _cow_tables(self) -> Iterator[Tuple[str, CowTable]]:
+        for name, table in self.tables.items():
+            if isinstance(table, CowTable):
+                yield name, table
+
+    def begin(self) -> None:
+        """Start journaling the tables (only dict tables; the others are never written by tools)."""
+        for _, table in self._cow_tables():
+            table.begin()
+
+    def commit(self) -> DataWrites:
+        writes: DataWrites = {}
+        for name, table in self._cow_tables():
+            table_writes = table.commit()
+            if len(table_writes) > 0:
+                writes[name] = table_writes
+        return writes
+
+    def rollback(self) -> None:
+        for _, table in self._cow_tables():
+            table.rollback()
+
+    def apply(self, writes: DataWrites) -> None:
+        """Redo the writes returned by `commit`, e.g. to replay a commit log."""
+        for name, records in writes.items():
+            table = self.tables[name]
+            for key, record in records.items():
+                if record is None:
+                    if key in table:
+                        del table[key]
+                else:
+                    table[key] = copy_record(record)
+
+
+class TableIndex(object):
+    """Maps `key_func(record)` to the keys of the matching records of a base table.
+
+    Lookups also re-check the records in an episode's overlay, so they reflect
+    writes (including to indexed fields) without rebuilding the shared index.
+    """
+
+    def __init__(self, table: Dict[str, Any], key_func: Callable[[Any], Hashable]) -> None:
+        self.key_func = key_func
+        self.keys: Dict[Hashable, List[str]] = {}
+        self.positions: Dict[str, int] = {}
+        for position, (key, record) in enumerate(table.items()):
+            self.keys.setdefault(key_func(record), []).append(key)
+            self.positions[key] = position
+
+    def lookup(self, table: Mapping, index_key: Hashable) -> List[str]:
+        """Keys of the current records of `table` whose index key is `index_key`, in table order."""
+        try:
+            keys = self.keys.get(index_key, [])
+        except TypeError:
+            keys = []
+        if not isinstance(table, CowTable):
+            return keys
+        overlay_keys = table.overlay_keys()
+        if len(overlay_keys) == 0:
+            return keys
+        changed = set(overlay_keys)
+        matches = [key for key in keys if key not in changed]
+        matches.extend(
+            key
+            for key in overlay_keys
+            if key in table and self.key_func(table.peek(key)) == index_key
+        )
+        new_positions = {key: len(self.positions) + i for i, key in enumerate(overlay_keys)}
+        matches.sort(key=lambda key: self.positions.get(key, new_positions.get(key)))
+        return matches
+
+    def records(self, table: Mapping, index_key: Hashable) -> List[Any]:
+        """Like `lookup`, but returns the records; they are not copied and must not be mutated."""
+        keys = self.lookup(table, index_key)
+        if isinstance(table, CowTable):
+            return [table.peek(key) for key in keys]
+        return [table[key] for key in keys]
+
+
+def get_table_index(
+    data: Mapping, table_name: str, key_func: Callable[[Any], Hashable]
+) -> TableIndex:
+    """Return an index of `data[table_name]` by `key_func`.
+
+    For a `CowDataset` the index is built over the shared base table once per
+    process; for plain dicts it is built on every call.
+    """
+    if isinstance(data, CowDataset):
+        return get_derived(
+            data.base,
+            f"index:{table_name}:{key_func.__module__}.{key_func.__qualname__}",
+            lambda base: TableIndex(base[table_name], key_func),
+        )
+    return TableIndex(data[table_name], key_func)
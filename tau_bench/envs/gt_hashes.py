@@ -0,0 +1,88 @@
+# Copyright Sierra
+
+"""On-disk index of ground-truth data hashes per task.
+
+`Env.calculate_reward` normally replays every ground-truth action on a fresh
+copy of the data and hashes the result. This index stores that hash, keyed by
+the task index and fingerprints of both the data and the task's actions, so
+grading only has to hash the agent's final state. Build it with:
+
+    python build_gt_hashes.py --env airline --task-split test
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+FOLDER_PATH = os.path.dirname(__file__)
+
+
+class GroundTruthHashEntry(BaseModel):
+    hash_version: int
+    data_fingerprint: str
+    task_fingerprint: str
+    gt_data_hash: str
+
+
+class GroundTruthHashIndex(BaseModel):
+    env: str
+    task_split: str
+    entries: Dict[int, GroundTruthHashEntry] = {}
+
+
+_index_cache: Dict[Tuple[str, str], Optional[GroundTruthHashIndex]] = {}
+_index_lock = threading.Lock()
+
+
+def get_index_path(env_name: str, task_split: str) -> str:
+    return os.path.join(FOLDER_PATH, env_name, f"gt_data_hashes_{task_split}.json")
+
+
+def load_gt_hash_index(env_name: str, task_split: str) -> Optional[GroundTruthHashIndex]:
+    """Load the index for an env and split once per process; None if it was never built or is corrupt."""
+    key = (env_name, task_split)
+    if key in _index_cache:
+        return _index_cache[key]
+    with _index_lock:
+        if key not in _index_cache:
+            path = get_index_path(env_name, task_split)
+            index = None
+            if os.path.exists(path):
+                try:
+                    with open(path, "r") as f:
+                        index = GroundTruthHashIndex.model_validate(json.load(f))
+                except (OSError, ValueError):
+                    # an unreadable index only costs the replays it would have saved
+                    index = None
+            _index_cache[key] = index
+    return _index_cache[key]
+
+
+def build_gt_hash_index(env_name: str, task_split: str) -> GroundTruthHashIndex:
+    from tau_bench.envs import get_env
+
+    env = get_env(
+        env_name,
+        user_strategy="human",
+        user_model="",
+        task_split=task_split,
+        task_index=0,
+    )
+    index = GroundTruthHashIndex(env=env_name, task_split=task_split)
+    for task_index in range(len(env.tasks)):
+        env.reset_state(task_index=task_index)
+        index.entries[task_index] = env.build_gt_hash_entry()
+    return index
+
+
+def save_gt_hash_index(index: GroundTruthHashIndex) -> str:
+    path = get_index_path(index.env, index.task_split)
+    with open(path, "w") as f:
+        json.dump(index.model_dump(mode="json"), f, indent=2)
+    with _index_lock:
+        _index_cache[(index.env, index.task_split)] = index
+    return path
+
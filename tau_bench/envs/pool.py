@@ -0,0 +1,64 @@
+# Copyright Sierra
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+
+from tau_bench.envs.base import Env
+
+
+class EnvPool(object):
+    """Envs reused across the episodes of a run.
+
+    `Env.reset` puts an env back in its initial state for any task: a fresh
+    copy-on-write view of the shared data, no actions, and a reset user
+    simulator. So an env freed by one episode can serve the next one instead
+    of being rebuilt. `lease` hands out an idle env, or builds one with
+    `make_env` when all of them are in use. The pool therefore grows to the
+    number of episodes run at the same time. `alease` is the same for code on
+    an event loop; it builds envs in a worker thread, so building one never
+    blocks the other episodes on the loop.
+    """
+
+    def __init__(self, make_env: Callable[[], Env]) -> None:
+        self.make_env = make_env
+        self.num_created = 0
+        self._idle: List[Env] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Env:
+        env = self._pop_idle()
+        return env if env is not None else self.make_env()
+
+    async def aacquire(self) -> Env:
+        env = self._pop_idle()
+        return env if env is not None else await asyncio.to_thread(self.make_env)
+
+    def _pop_idle(self) -> Optional[Env]:
+        # None means the caller builds a new env, which is counted here
+        with self._lock:
+            if len(self._idle) > 0:
+                return self._idle.pop()
+            self.num_created += 1
+            return None
+
+    def release(self, env: Env) -> None:
+        with self._lock:
+            self._idle.append(env)
+
+    @contextmanager
+    def lease(self) -> Iterator[Env]:
+        env = self.acquire()
+        try:
+            yield env
+        finally:
+            self.release(env)
+
+    @asynccontextmanager
+    async def alease(self) -> AsyncIterator[Env]:
+        env = await self.aacquire()
+        try:
+            yield env
+        finally:
+            self.release(env)
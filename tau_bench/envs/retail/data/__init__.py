@@ -1,21 +1,18 @@
 # Copyright Sierra
 
-import json
 import os
 from typing import Any
 
+from tau_bench.envs.data_cache import load_json_files
+
 FOLDER_PATH = os.path.dirname(__file__)
 
+DATA_FILES = {
+    "orders": "orders.json",
+    "products": "products.json",
+    "users": "users.json",
+}
+
 
 def load_data() -> dict[str, Any]:
-    with open(os.path.join(FOLDER_PATH, "orders.json")) as f:
-        order_data = json.load(f)
-    with open(os.path.join(FOLDER_PATH, "products.json")) as f:
-        product_data = json.load(f)
-    with open(os.path.join(FOLDER_PATH, "users.json")) as f:
-        user_data = json.load(f)
-    return {
-        "orders": order_data,
-        "products": product_data,
-        "users": user_data,
-    }
+    return load_json_files(FOLDER_PATH, DATA_FILES)
@@ -39,5 +39,17 @@ class MockRetailDomainEnv(Env):
             user_provider=user_provider,
             task_index=task_index,
             check_outputs=check_outputs,
+            env_name="retail",
+            task_split=task_split,
         )
         self.terminate_tools = ["transfer_to_human_agents"]
+        self.read_only_tools = [
+            "calculate",
+            "find_user_id_by_email",
+            "find_user_id_by_name_zip",
+            "get_order_details",
+            "get_product_details",
+            "get_user_details",
+            "list_all_product_types",
+            "think",
+        ]
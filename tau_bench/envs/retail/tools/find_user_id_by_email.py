@@ -1,16 +1,22 @@
 # Copyright Sierra
 
 from typing import Any, Dict
+from tau_bench.envs.dataset import get_table_index
 from tau_bench.envs.tool import Tool
 
 
+def user_email(profile: Dict[str, Any]) -> str:
+    return profile["email"].lower()
+
+
 class FindUserIdByEmail(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], email: str) -> str:
         users = data["users"]
-        for user_id, profile in users.items():
-            if profile["email"].lower() == email.lower():
-                return user_id
+        index = get_table_index(data, "users", user_email)
+        user_ids = index.lookup(users, email.lower())
+        if len(user_ids) > 0:
+            return user_ids[0]
         return "Error: user not found"
 
     @staticmethod
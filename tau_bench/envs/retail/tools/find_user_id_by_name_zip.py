@@ -1,20 +1,26 @@
 # Copyright Sierra
 
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
+from tau_bench.envs.dataset import get_table_index
 from tau_bench.envs.tool import Tool
 
 
+def user_name_zip(profile: Dict[str, Any]) -> Tuple[str, str, str]:
+    return (
+        profile["name"]["first_name"].lower(),
+        profile["name"]["last_name"].lower(),
+        profile["address"]["zip"],
+    )
+
+
 class FindUserIdByNameZip(Tool):
     @staticmethod
     def invoke(data: Dict[str, Any], first_name: str, last_name: str, zip: str) -> str:
         users = data["users"]
-        for user_id, profile in users.items():
-            if (
-                profile["name"]["first_name"].lower() == first_name.lower()
-                and profile["name"]["last_name"].lower() == last_name.lower()
-                and profile["address"]["zip"] == zip
-            ):
-                return user_id
+        index = get_table_index(data, "users", user_name_zip)
+        user_ids = index.lookup(users, (first_name.lower(), last_name.lower(), zip))
+        if len(user_ids) > 0:
+            return user_ids[0]
         return "Error: user not found"
 
     @staticmethod
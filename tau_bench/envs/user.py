@@ -1,8 +1,9 @@
 # Copyright Sierra
 
 import abc
+import asyncio
 import enum
-from litellm import completion
+from tau_bench.llm import acompletion, completion
 
 from typing import Optional, List, Dict, Any, Union
 
@@ -22,6 +23,20 @@ class BaseUserSimulationEnv(abc.ABC):
     def get_total_cost(self) -> float:
         raise NotImplementedError
 
+    def snapshot(self) -> Any:
+        """State to give back to `restore`; None for simulators without state."""
+        return None
+
+    def restore(self, snapshot: Any) -> None:
+        pass
+
+    async def areset(self, instruction: Optional[str] = None) -> str:
+        # Simulators without a native async implementation run in a worker thread.
+        return await asyncio.to_thread(self.reset, instruction)
+
+    async def astep(self, content: str) -> str:
+        return await asyncio.to_thread(self.step, content)
+
 
 class HumanUserSimulationEnv(BaseUserSimulationEnv):
     def reset(self, instruction: str) -> str:
@@ -41,15 +56,23 @@ class LLMUserSimulationEnv(BaseUserSimulationEnv):
         self.model = model
         self.provider = provider
         self.total_cost = 0.0
-        self.reset()
 
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
         res = completion(
             model=self.model, custom_llm_provider=self.provider, messages=messages
         )
+        return self.record_response(res)
+
+    async def agenerate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        res = await acompletion(
+            model=self.model, custom_llm_provider=self.provider, messages=messages
+        )
+        return self.record_response(res)
+
+    def record_response(self, res: Any) -> str:
         message = res.choices[0].message
         self.messages.append(message.model_dump())
-        self.total_cost = res._hidden_params["response_cost"]
+        self.total_cost += res._hidden_params["response_cost"] or 0
         return message.content
 
     def build_system_prompt(self, instruction: Optional[str]) -> str:
@@ -67,7 +90,8 @@ Rules:
 - Do not repeat the exact instruction in the conversation. Instead, use your own words to convey the same information.
 - Try to make the conversation as natural as possible, and stick to the personalities in the instruction."""
 
-    def reset(self, instruction: Optional[str] = None) -> str:
+    def reset_messages(self, instruction: Optional[str]) -> None:
+        self.total_cost = 0.0
         self.messages = [
             {
                 "role": "system",
@@ -75,21 +99,35 @@ Rules:
             },
             {"role": "user", "content": "Hi! How can I help you today?"},
         ]
+
+    def reset(self, instruction: Optional[str] = None) -> str:
+        self.reset_messages(instruction)
         return self.generate_next_message(self.messages)
 
     def step(self, content: str) -> str:
         self.messages.append({"role": "user", "content": content})
         return self.generate_next_message(self.messages)
 
+    async def areset(self, instruction: Optional[str] = None) -> str:
+        self.reset_messages(instruction)
+        return await self.agenerate_next_message(self.messages)
+
+    async def astep(self, content: str) -> str:
+        self.messages.append({"role": "user", "content": content})
+        return await self.agenerate_next_message(self.messages)
+
     def get_total_cost(self) -> float:
         return self.total_cost
 
+    def snapshot(self) -> Any:
+        return list(self.messages), self.total_cost
+
+    def restore(self, snapshot: Any) -> None:
+        messages, self.total_cost = snapshot
+        self.messages = list(messages)
 
-class ReactUserSimulationEnv(LLMUserSimulationEnv):
-    def __init__(self, model: str, provider: str) -> None:
-        super().__init__(model=model, provider=provider)
-        self.reset()
 
+class ReactUserSimulationEnv(LLMUserSimulationEnv):
     def build_system_prompt(self, instruction: Optional[str]) -> str:
         instruction_display = (
             ("\n\nInstruction: " + instruction + "\n")
@@ -114,24 +152,8 @@ Thought:
 User Response:
 <the user response (this will be parsed and sent to the agent)>"""
 
-    def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
-        res = completion(
-            model=self.model, custom_llm_provider=self.provider, messages=messages
-        )
-        message = res.choices[0].message
-        self.messages.append(message.model_dump())
-        self.total_cost = res._hidden_params["response_cost"]
-        return self.parse_response(message.content)
-
-    def reset(self, instruction: Optional[str] = None) -> str:
-        self.messages = [
-            {
-                "role": "system",
-                "content": self.build_system_prompt(instruction=instruction),
-            },
-            {"role": "user", "content": "Hi! How can I help you today?"},
-        ]
-        return self.generate_next_message(self.messages)
+    def record_response(self, res: Any) -> str:
+        return self.parse_response(super().record_response(res))
 
     def parse_response(self, response: str) -> str:
         if "###STOP###" in response:
@@ -145,20 +167,14 @@ User Response:
         else:
             raise ValueError(f"Invalid response format: {response}")
 
-    def step(self, content: str) -> str:
-        self.messages.append({"role": "user", "content": content})
-        return self.generate_next_message(self.messages)
-
-    def get_total_cost(self) -> float:
-        return self.total_cost
-
 
 class VerifyUserSimulationEnv(LLMUserSimulationEnv):
     def __init__(self, model: str, provider: str, max_attempts: int = 3) -> None:
+        self.messages: List[Dict[str, Any]] = []
         self.model = model
         self.provider = provider
         self.max_attempts = max_attempts
-        self.reset()
+        self.total_cost = 0.0
 
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
         attempts = 0
@@ -168,7 +184,7 @@ class VerifyUserSimulationEnv(LLMUserSimulationEnv):
                 model=self.model, custom_llm_provider=self.provider, messages=messages
             )
             cur_message = res.choices[0].message
-            self.total_cost = res._hidden_params["response_cost"]
+            self.total_cost += res._hidden_params["response_cost"] or 0
             if verify(self.model, self.provider, cur_message, messages):
                 self.messages.append(cur_message.model_dump())
                 return cur_message.content
@@ -176,22 +192,8 @@ class VerifyUserSimulationEnv(LLMUserSimulationEnv):
         assert cur_message is not None
         return cur_message.content
 
-    def reset(self, instruction: Optional[str] = None) -> str:
-        self.messages = [
-            {
-                "role": "system",
-                "content": self.build_system_prompt(instruction=instruction),
-            },
-            {"role": "user", "content": "Hi! How can I help you today?"},
-        ]
-        return self.generate_next_message(self.messages)
-
-    def step(self, content: str) -> str:
-        self.messages.append({"role": "user", "content": content})
-        return self.generate_next_message(self.messages)
-
-    def get_total_cost(self) -> float:
-        return self.total_cost
+    async def agenerate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        return await asyncio.to_thread(self.generate_next_message, messages)
 
 
 def map_role_label(role: str) -> str:
@@ -269,10 +271,11 @@ Response:
 
 class ReflectionUserSimulationEnv(LLMUserSimulationEnv):
     def __init__(self, model: str, provider: str, max_attempts: int = 2) -> None:
+        self.messages: List[Dict[str, Any]] = []
         self.model = model
         self.provider = provider
         self.max_attempts = max_attempts
-        self.reset()
+        self.total_cost = 0.0
 
     def generate_next_message(self, messages: List[Dict[str, Any]]) -> str:
         cur_messages = messages.copy()
@@ -291,22 +294,8 @@ class ReflectionUserSimulationEnv(LLMUserSimulationEnv):
             attempts += 1
         return initial_response
 
-    def reset(self, instruction: Optional[str] = None) -> str:
-        self.messages = [
-            {
-                "role": "system",
-                "content": self.build_system_prompt(instruction=instruction),
-            },
-            {"role": "user", "content": "Hi! How can I help you today?"},
-        ]
-        return self.generate_next_message(self.messages)
-
-    def step(self, content: str) -> str:
-        self.messages.append({"role": "user", "content": content})
-        return self.generate_next_message(self.messages)
-
-    def get_total_cost(self) -> float:
-        return self.total_cost
+    async def agenerate_next_message(self, messages: List[Dict[str, Any]]) -> str:
+        return await asyncio.to_thread(self.generate_next_message, messages)
 
 
 class UserStrategy(enum.Enum):
@@ -0,0 +1,78 @@
+# Copyright Sierra
+
+import asyncio
+from typing import Awaitable, Callable, Iterator, List, Tuple, TypeVar
+
+from tau_bench.envs.base import Env
+from tau_bench.llm import LockstepBarrier, lockstep
+
+T = TypeVar("T")
+E = TypeVar("E")
+
+
+class VecEnv(object):
+    """A group of envs of one domain whose episodes run in lockstep.
+
+    The envs share the process-wide base dataset, so each only holds its own
+    copy-on-write changes. `run` plays one episode per env concurrently; the
+    agent and user simulator calls of the episodes (through `acompletion`) are
+    gathered into rounds by a `LockstepBarrier`, so a model server with
+    continuous batching gets one batch per round instead of N interleaved
+    streams of requests. Tools run inline between rounds.
+
+    `run_queue` instead keeps every env busy with episodes taken from a queue
+    that several VecEnvs can share: an env whose episode ends starts the next
+    one straight away and stays in the rounds, so a long episode does not hold
+    back the others of its group.
+    """
+
+    def __init__(self, envs: List[Env], max_wait: float = 2.0) -> None:
+        self.envs = envs
+        self.max_wait = max_wait
+        # number of LLM calls released together in every round of the last run
+        self.round_sizes: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.envs)
+
+    async def run(self, episode: Callable[[int, Env], Awaitable[T]]) -> List[T]:
+        """Run `episode(i, env)` for every env, and return the results in env order."""
+        barrier = LockstepBarrier(len(self.envs), max_wait=self.max_wait)
+
+        async def _member(i: int, env: Env) -> T:
+            # each member runs in its own task, so the barrier is set per episode
+            with lockstep(barrier):
+                return await episode(i, env)
+
+        try:
+            return list(
+                await asyncio.gather(
+                    *[_member(i, env) for i, env in enumerate(self.envs)]
+                )
+            )
+        finally:
+            self.round_sizes = barrier.round_sizes
+
+    async def run_queue(
+        self, queue: Iterator[E], episode: Callable[[E, Env], Awaitable[T]]
+    ) -> List[Tuple[E, T]]:
+        """Run `episode(item, env)` for items of `queue` until it is exhausted.
+
+        Returns the items this VecEnv ran, with their results, in the order the
+        episodes finished.
+        """
+        barrier = LockstepBarrier(len(self.envs), max_wait=self.max_wait)
+        results: List[Tuple[E, T]] = []
+
+        async def _member(env: Env) -> None:
+            with lockstep(barrier):
+                # the event loop runs one member at a time, so members can share
+                # a plain iterator
+                for item in queue:
+                    results.append((item, await episode(item, env)))
+
+        try:
+            await asyncio.gather(*[_member(env) for env in self.envs])
+        finally:
+            self.round_sizes = barrier.round_sizes
+        return results
@@ -0,0 +1,589 @@
+# Copyright Sierra
+
+"""Rate-limit-aware wrappers around `litellm.completion` and `litellm.acompletion`.
+
+Agents and user simulators call `completion`/`acompletion` from this module.
+Every call goes through the process-wide `LLMController`, which:
+
+  - retries transient provider errors (rate limits, timeouts, connection and
+    5xx errors) with exponential backoff, so a burst of 429s costs a retry of
+    the failing LLM step rather than the whole episode;
+  - when adaptive concurrency is enabled, bounds the calls in flight per
+    provider with an `AdaptiveLimiter` that ramps up additively while calls
+    succeed and halves on rate limits and timeouts (AIMD);
+  - paces calls to the requests-per-minute and tokens-per-minute budgets set
+    per (provider, model), counting the traffic of the agent and of the user
+    simulator against the same budget when they use the same model.
+
+With a cassette set (`set_cassette`), calls are also recorded, or replayed
+without reaching the controller at all; see `tau_bench.cassette`. Every call
+is checked against, and charged to, the current episode's cost ledger; see
+`tau_bench.costs`. Async calls made under `lockstep` are released in rounds
+with those of the other episodes of a `VecEnv`; see `LockstepBarrier`.
+
+`run()` configures the controller from the `RunConfig`, which retries calls
+up to 3 times by default but does not limit them. Outside `run()`, the default
+controller neither retries nor limits calls.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import litellm
+from pydantic import BaseModel
+
+from tau_bench.cassette import Cassette
+from tau_bench.costs import charge, check_budget
+
+# Errors worth retrying; the first group also signals that the provider is overloaded.
+CONGESTION_ERRORS = (
+    litellm.RateLimitError,
+    litellm.Timeout,
+    litellm.ServiceUnavailableError,
+)
+TRANSIENT_ERRORS = CONGESTION_ERRORS + (
+    litellm.APIConnectionError,
+    litellm.InternalServerError,
+)
+
+# Output tokens assumed for a request without `max_tokens` until the model's usage is known.
+DEFAULT_OUTPUT_TOKENS = 256
+
+
+class AdaptiveLimiter(object):
+    """An AIMD concurrency limit shared by threads and coroutines.
+
+    The limit grows by one for every `limit` successful calls and is multiplied
+    by `backoff_factor` on a congestion error. Errors of calls that started
+    before the last decrease are ignored, so a burst of 429s from one window
+    halves the limit once. The limit also stops growing while the recent
+    latency is above `latency_factor` times the best latency seen.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        max_limit: int,
+        min_limit: int = 1,
+        backoff_factor: float = 0.5,
+        latency_factor: float = 2.0,
+    ) -> None:
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_factor = backoff_factor
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.num_successes = 0
+        self.num_congestion_errors = 0
+        self.latency_ewma: Optional[float] = None
+        self.best_latency_ewma: Optional[float] = None
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = (
+            deque()
+        )
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def acquire(self) -> float:
+        """Block until a slot is free; returns the start time to pass to `release`."""
+        with self._condition:
+            while not self._has_capacity():
+                self._condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def aacquire(self) -> float:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._has_capacity() and len(self._async_waiters) == 0:
+                self.in_flight += 1
+                return time.monotonic()
+            future = loop.create_future()
+            self._async_waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._async_waiters.remove((loop, future))
+                    granted = False
+                except ValueError:
+                    granted = True
+            if granted and future.done() and not future.cancelled():
+                self.release()
+            raise
+        return time.monotonic()
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Hand free slots to waiting coroutines first (they cannot poll), then wake threads.
+        while self._has_capacity() and len(self._async_waiters) > 0:
+            loop, future = self._async_waiters.popleft()
+            self.in_flight += 1
+            loop.call_soon_threadsafe(self._grant, future)
+        if self._has_capacity():
+            self._condition.notify(int(self.limit) - self.in_flight)
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.done():
+            # the waiter was cancelled after the slot was handed to it
+            self.release()
+        else:
+            future.set_result(None)
+
+    def on_success(self, started_at: float) -> None:
+        latency = time.monotonic() - started_at
+        with self._lock:
+            self.num_successes += 1
+            self.latency_ewma = (
+                latency
+                if self.latency_ewma is None
+                else 0.9 * self.latency_ewma + 0.1 * latency
+            )
+            if self.best_latency_ewma is None or self.latency_ewma < self.best_latency_ewma:
+                self.best_latency_ewma = self.latency_ewma
+            if self.latency_ewma <= self.latency_factor * self.best_latency_ewma:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._dispatch()
+
+    def on_congestion(self, started_at: float) -> None:
+        with self._lock:
+            self.num_congestion_errors += 1
+            if started_at < self._last_decrease:
+                return
+            self._last_decrease = time.monotonic()
+            self.limit = max(float(self.min_limit), self.limit * self.backoff_factor)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "successes": self.num_successes,
+            "congestion_errors": self.num_congestion_errors,
+        }
+
+
+class RateLimit(BaseModel):
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+
+class RatePacer(object):
+    """Spreads `per_minute` units evenly over time (GCRA).
+
+    `reserve(cost)` books `cost` units and returns how long the caller must wait
+    before using them. At most `burst_seconds` worth of units go out back to
+    back, so traffic is paced instead of bursting until the provider throttles.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0) -> None:
+        self.rate = per_minute / 60.0
+        self.burst_seconds = burst_seconds
+        self._theoretical_arrival = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            arrival = max(self._theoretical_arrival, now)
+            self._theoretical_arrival = arrival + cost / self.rate
+            return max(0.0, arrival - self.burst_seconds - now)
+
+    def adjust(self, cost_delta: float) -> None:
+        """Correct an earlier reservation once the actual cost is known."""
+        with self._lock:
+            self._theoretical_arrival += cost_delta / self.rate
+
+
+class ModelRateLimiter(object):
+    """Request and token pacing for one (provider, model).
+
+    Token costs are booked when a request starts: its estimated prompt tokens
+    plus `max_tokens`, or else the average output size seen so far for this
+    model. The booking is corrected with the actual usage when the call returns.
+    """
+
+    def __init__(self, rate_limit: RateLimit) -> None:
+        self.requests = (
+            RatePacer(rate_limit.requests_per_minute)
+            if rate_limit.requests_per_minute
+            else None
+        )
+        self.tokens = (
+            RatePacer(rate_limit.tokens_per_minute)
+            if rate_limit.tokens_per_minute
+            else None
+        )
+        self.output_tokens = float(DEFAULT_OUTPUT_TOKENS)
+
+    def estimate_tokens(self, prompt_tokens: int, max_tokens: Optional[int]) -> int:
+        return prompt_tokens + (max_tokens or int(self.output_tokens))
+
+    def reserve(self, estimated_tokens: int) -> float:
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(estimated_tokens))
+        return delay
+
+    def settle(
+        self, estimated_tokens: int, actual_tokens: int, prompt_tokens: Optional[int] = None
+    ) -> None:
+        if self.tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+        if prompt_tokens is not None:
+            self.output_tokens = 0.9 * self.output_tokens + 0.1 * max(
+                0, actual_tokens - prompt_tokens
+            )
+
+
+class _Call(object):
+    # Per-call state shared by the sync and async paths of `LLMController`.
+
+    def __init__(self, controller: "LLMController", kwargs: Dict[str, Any]) -> None:
+        provider = get_provider(kwargs)
+        self.kwargs = kwargs
+        self.limiter = controller.get_limiter(provider)
+        self.rate_limiter = controller.get_rate_limiter(provider, kwargs.get("model"))
+        self.prompt_tokens = (
+            estimate_prompt_tokens(kwargs) if self.rate_limiter is not None else 0
+        )
+        self.estimated_tokens = 0
+        self.started_at = 0.0
+
+    def pacing_delay(self) -> float:
+        if self.rate_limiter is None:
+            return 0.0
+        self.estimated_tokens = self.rate_limiter.estimate_tokens(
+            self.prompt_tokens, self.kwargs.get("max_tokens")
+        )
+        return self.rate_limiter.reserve(self.estimated_tokens)
+
+    def on_error(self, error: BaseException) -> None:
+        if self.rate_limiter is not None:
+            # a failed request consumed its request slot but no tokens
+            self.rate_limiter.settle(self.estimated_tokens, 0)
+        if self.limiter is not None:
+            if isinstance(error, CONGESTION_ERRORS):
+                self.limiter.on_congestion(self.started_at)
+            self.limiter.release()
+
+    def on_success(self, res: Any) -> None:
+        if self.rate_limiter is not None:
+            actual_tokens = get_total_tokens(res)
+            if actual_tokens is None:
+                self.rate_limiter.settle(self.estimated_tokens, self.estimated_tokens)
+            else:
+                self.rate_limiter.settle(
+                    self.estimated_tokens, actual_tokens, self.prompt_tokens
+                )
+        if self.limiter is not None:
+            self.limiter.on_success(self.started_at)
+            self.limiter.release()
+
+
+class LLMController(object):
+    """Retries, (optionally) adaptive per-provider concurrency and per-model rate
+    limits for LLM calls.
+
+    `rate_limits` maps `(provider, model)` to its budget; a model of `"*"` sets
+    the budget of every other model of that provider (each model gets its own).
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 0,
+        adaptive: bool = False,
+        initial_concurrency: int = 8,
+        max_concurrency: int = 1024,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        rate_limits: Optional[Dict[Tuple[str, str], RateLimit]] = None,
+    ) -> None:
+        self.max_retries = max_retries
+        self.adaptive = adaptive
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.num_retries = 0
+        self.limiters: Dict[str, AdaptiveLimiter] = {}
+        self.rate_limits = rate_limits or {}
+        self.rate_limiters: Dict[Tuple[str, str], ModelRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get_limiter(self, provider: str) -> Optional[AdaptiveLimiter]:
+        if not self.adaptive:
+            return None
+        with self._lock:
+            if provider not in self.limiters:
+                self.limiters[provider] = AdaptiveLimiter(
+                    initial_limit=self.initial_concurrency,
+                    max_limit=self.max_concurrency,
+                )
+            return self.limiters[provider]
+
+    def get_rate_limiter(
+        self, provider: str, model: Optional[str]
+    ) -> Optional[ModelRateLimiter]:
+        model = model or ""
+        rate_limit = self.rate_limits.get(
+            (provider, model), self.rate_limits.get((provider, "*"))
+        )
+        if rate_limit is None:
+            return None
+        with self._lock:
+            if (provider, model) not in self.rate_limiters:
+                self.rate_limiters[(provider, model)] = ModelRateLimiter(rate_limit)
+            return self.rate_limiters[(provider, model)]
+
+    def retry_delay(self, attempt: int, error: Exception) -> float:
+        retry_after = _get_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        return delay * (0.5 + random.random() / 2)
+
+    def _should_retry(self, attempt: int, error: BaseException) -> bool:
+        if attempt >= self.max_retries or not isinstance(error, TRANSIENT_ERRORS):
+            return False
+        with self._lock:
+            self.num_retries += 1
+        return True
+
+    def completion(self, **kwargs: Any) -> Any:
+        call = _Call(self, kwargs)
+        attempt = 0
+        while True:
+            time.sleep(call.pacing_delay())
+            call.started_at = (
+                call.limiter.acquire() if call.limiter is not None else time.monotonic()
+            )
+            try:
+                res = litellm.completion(**kwargs)
+            except BaseException as e:
+                call.on_error(e)
+                if not self._should_retry(attempt, e):
+                    raise
+                time.sleep(self.retry_delay(attempt, e))
+                attempt += 1
+                continue
+            call.on_success(res)
+            return res
+
+    async def acompletion(self, **kwargs: Any) -> Any:
+        call = _Call(self, kwargs)
+        attempt = 0
+        while True:
+            await asyncio.sleep(call.pacing_delay())
+            call.started_at = (
+                await call.limiter.aacquire()
+                if call.limiter is not None
+                else time.monotonic()
+            )
+            try:
+                res = await litellm.acompletion(**kwargs)
+            except BaseException as e:
+                call.on_error(e)
+                if not self._should_retry(attempt, e):
+                    raise
+                await asyncio.sleep(self.retry_delay(attempt, e))
+                attempt += 1
+                continue
+            call.on_success(res)
+            return res
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.num_retries,
+            "providers": {
+                provider: limiter.stats() for provider, limiter in self.limiters.items()
+            },
+        }
+
+
+def get_provider(kwargs: Dict[str, Any]) -> str:
+    provider = kwargs.get("custom_llm_provider")
+    if provider:
+        return provider
+    model = kwargs.get("model") or ""
+    return model.split("/")[0] if "/" in model else "default"
+
+
+def estimate_prompt_tokens(kwargs: Dict[str, Any]) -> int:
+    """Rough token count of a request's prompt (about 4 characters per token)."""
+    chars = len(json.dumps(kwargs.get("messages", []), default=str))
+    if kwargs.get("tools"):
+        chars += len(json.dumps(kwargs["tools"], default=str))
+    return chars // 4
+
+
+def get_total_tokens(res: Any) -> Optional[int]:
+    usage = getattr(res, "usage", None)
+    total_tokens = getattr(usage, "total_tokens", None)
+    return total_tokens if isinstance(total_tokens, int) else None
+
+
+def parse_rate_limit(spec: str) -> Tuple[Tuple[str, str], RateLimit]:
+    """Parse `<provider>/<model>:<requests per minute>:<tokens per minute>`.
+
+    Either budget may be left empty (or 0) for no limit, and the model may be
+    `*`, e.g. `openai/gpt-4o:500:30000` or `anthropic/*:50:`.
+    """
+    try:
+        name, rpm, tpm = spec.rsplit(":", 2)
+        provider, model = name.split("/", 1)
+        rate_limit = RateLimit(
+            requests_per_minute=float(rpm) if rpm else None,
+            tokens_per_minute=float(tpm) if tpm else None,
+        )
+    except ValueError:
+        raise ValueError(
+            f"Invalid rate limit {spec!r}, expected <provider>/<model>:<rpm>:<tpm>"
+        )
+    return (provider, model), rate_limit
+
+
+def _get_retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is None:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LockstepBarrier(object):
+    """Holds the async LLM calls of a group of episodes to release them in rounds.
+
+    Every member episode waits in `acompletion` until each active member has
+    a call pending, and then all of them go out together. A server with
+    continuous batching (e.g. vLLM) sees the calls of a round as one batch,
+    instead of a trickle of requests at different stages. A member that has
+    not made its call after `max_wait` seconds (e.g. a slow tool, or a
+    synchronous call that bypasses the barrier) lets the round go without it.
+    Members must `leave` when their episode ends.
+    """
+
+    def __init__(self, num_members: int, max_wait: float = 2.0) -> None:
+        self.num_active = num_members
+        self.max_wait = max_wait
+        self.round_sizes: List[int] = []
+        self._pending: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def wait(self) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(future)
+        if len(self._pending) >= self.num_active:
+            self._release()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._release)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # a cancelled call no longer counts towards the round
+            if future in self._pending:
+                self._pending.remove(future)
+                if len(self._pending) == 0 and self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            raise
+
+    def leave(self) -> None:
+        self.num_active -= 1
+        if len(self._pending) > 0 and len(self._pending) >= self.num_active:
+            self._release()
+
+    def _release(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        self.round_sizes.append(len(pending))
+        for future in pending:
+            if not future.done():
+                future.set_result(None)
+
+
+_controller = LLMController()
+_cassette: Optional[Cassette] = None
+_lockstep: ContextVar[Optional[LockstepBarrier]] = ContextVar(
+    "lockstep_barrier", default=None
+)
+
+
+def get_controller() -> LLMController:
+    return _controller
+
+
+def configure_controller(**kwargs: Any) -> LLMController:
+    """Replace the process-wide controller; see `LLMController` for the arguments."""
+    global _controller
+    _controller = LLMController(**kwargs)
+    return _controller
+
+
+def set_cassette(cassette: Optional[Cassette]) -> None:
+    """Record LLM calls to, or replay them from, `cassette` (None to call providers directly)."""
+    global _cassette
+    _cassette = cassette
+
+
+@contextmanager
+def lockstep(barrier: LockstepBarrier) -> Iterator[None]:
+    """Make the async LLM calls of the current episode wait at `barrier`."""
+    token = _lockstep.set(barrier)
+    try:
+        yield
+    finally:
+        _lockstep.reset(token)
+        barrier.leave()
+
+
+def completion(**kwargs: Any) -> Any:
+    check_budget()
+    cassette = _cassette
+    if cassette is not None and cassette.replaying:
+        res = cassette.replay(kwargs)
+    else:
+        res = _controller.completion(**kwargs)
+        if cassette is not None:
+            res = cassette.record(kwargs, res)
+    charge(res)
+    return res
+
+
+async def acompletion(**kwargs: Any) -> Any:
+    barrier = _lockstep.get()
+    if barrier is not None:
+        await barrier.wait()
+    check_budget()
+    cassette = _cassette
+    if cassette is not None and cassette.replaying:
+        res = cassette.replay(kwargs)
+    else:
+        res = await _controller.acompletion(**kwargs)
+        if cassette is not None:
+            res = cassette.record(kwargs, res)
+    charge(res)
+    return res
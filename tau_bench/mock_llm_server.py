@@ -0,0 +1,225 @@
+# Copyright Sierra
+
+"""A local stand-in for an OpenAI-compatible chat completions endpoint.
+
+It answers `POST /v1/chat/completions` with scripted messages, so `run()` can be
+load-tested end to end without a model provider:
+
+  - requests with `tools` come from a tool-calling agent, which makes
+    `tool_calls_per_turn` calls to a tool (one without required arguments when
+    there is one) after every user message and then responds;
+  - requests without `tools` come from the user simulator, which answers until
+    it has sent `user_turns` messages and then sends `###STOP###`.
+
+Latency is drawn from a configurable distribution, plus the time to generate
+`completion_tokens` at `tokens_per_second`, and a fraction of the requests can
+be failed with an error status. The server runs on a single asyncio event loop
+with keep-alive connections, so it can hold thousands of concurrent requests.
+Start it with:
+
+    python mock_llm_server.py --port 8000 --latency 0.5
+
+and point the runner at it with `OPENAI_API_BASE=http://127.0.0.1:8000/v1`,
+`OPENAI_API_KEY=mock` and `--model-provider openai --user-model-provider openai`.
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+LATENCY_DISTRIBUTIONS = ["constant", "uniform", "exponential", "lognormal"]
+
+
+class MockLLMConfig(BaseModel):
+    # mean latency in seconds, before token generation
+    latency: float = 0.5
+    latency_distribution: str = "constant"
+    # 0 for no generation time
+    tokens_per_second: float = 0.0
+    completion_tokens: int = 50
+    error_rate: float = 0.0
+    error_status: int = 429
+    tool_calls_per_turn: int = 2
+    user_turns: int = 2
+    seed: Optional[int] = None
+
+
+class MockLLM(object):
+    def __init__(self, config: MockLLMConfig) -> None:
+        if config.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown latency distribution: {config.latency_distribution}"
+            )
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.ids = itertools.count()
+        self.num_requests = 0
+        self.num_errors = 0
+
+    def sample_latency(self) -> float:
+        mean = self.config.latency
+        distribution = self.config.latency_distribution
+        if distribution == "uniform":
+            latency = self.rng.uniform(0, 2 * mean)
+        elif distribution == "exponential":
+            latency = self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+        elif distribution == "lognormal":
+            # sigma 1 gives a long tail; mu is chosen so the mean is `mean`
+            latency = self.rng.lognormvariate(0, 1) * mean / 1.6487 if mean > 0 else 0.0
+        else:
+            latency = mean
+        if self.config.tokens_per_second > 0:
+            latency += self.config.completion_tokens / self.config.tokens_per_second
+        return latency
+
+    def respond(self, request: Dict[str, Any]) -> Tuple[int, Dict[str, Any], float]:
+        """Return the status, body and delay of the response to a chat completion request."""
+        self.num_requests += 1
+        latency = self.sample_latency()
+        if self.rng.random() < self.config.error_rate:
+            self.num_errors += 1
+            status = HTTPStatus(self.config.error_status)
+            return (
+                status.value,
+                {
+                    "error": {
+                        "message": f"Mock error: {status.phrase}",
+                        "type": "rate_limit_error" if status == 429 else "server_error",
+                        "code": status.value,
+                    }
+                },
+                latency,
+            )
+        messages = request.get("messages", [])
+        if request.get("tools"):
+            message = self._agent_message(messages, request["tools"])
+        else:
+            message = self._user_message(messages)
+        prompt_tokens = len(json.dumps(messages)) // 4
+        return (
+            200,
+            {
+                "id": f"chatcmpl-mock-{next(self.ids)}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": self.config.completion_tokens,
+                    "total_tokens": prompt_tokens + self.config.completion_tokens,
+                },
+            },
+            latency,
+        )
+
+    def _agent_message(
+        self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        num_tool_calls = 0
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                break
+            num_tool_calls += message.get("role") == "tool"
+        if num_tool_calls >= self.config.tool_calls_per_turn:
+            return {"role": "assistant", "content": "Is there anything else I can help with?"}
+        tool = _pick_tool(tools, num_tool_calls)
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_mock_{next(self.ids)}",
+                    "type": "function",
+                    "function": {"name": tool["function"]["name"], "arguments": "{}"},
+                }
+            ],
+        }
+
+    def _user_message(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # the user simulator's own messages have the assistant role in its history
+        num_turns = sum(1 for message in messages if message.get("role") == "assistant")
+        if num_turns + 1 >= self.config.user_turns:
+            return {"role": "assistant", "content": "Thanks, that's all. ###STOP###"}
+        return {"role": "assistant", "content": "Hi, I need some help with my account."}
+
+
+def _pick_tool(tools: List[Dict[str, Any]], position: int) -> Dict[str, Any]:
+    callable_tools = [
+        tool
+        for tool in tools
+        if len(tool.get("function", {}).get("parameters", {}).get("required", [])) == 0
+    ]
+    candidates = callable_tools or tools
+    return candidates[position % len(candidates)]
+
+
+async def _handle_connection(
+    llm: MockLLM, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    try:
+        while True:
+            request_line = await reader.readline()
+            if len(request_line) == 0:
+                break
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers: Dict[str, str] = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", "0")))
+            if method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+                try:
+                    status, payload, delay = llm.respond(json.loads(body or b"{}"))
+                except (ValueError, TypeError) as e:
+                    status, payload, delay = 400, {"error": {"message": str(e)}}, 0.0
+            else:
+                status, payload, delay = 404, {"error": {"message": f"Not found: {path}"}}, 0.0
+            if delay > 0:
+                await asyncio.sleep(delay)
+            data = json.dumps(payload).encode("utf-8")
+            writer.write(
+                (
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    + ("Retry-After: 0\r\n" if status == 429 else "")
+                    + "\r\n"
+                ).encode("latin-1")
+                + data
+            )
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(config: MockLLMConfig, host: str = "127.0.0.1", port: int = 8000) -> None:
+    llm = MockLLM(config)
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle_connection(llm, reader, writer),
+        host,
+        port,
+        backlog=4096,
+    )
+    print(f"Mock LLM server listening on http://{host}:{port}/v1", flush=True)
+    async with server:
+        await server.serve_forever()
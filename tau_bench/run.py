@@ -3,19 +3,57 @@
 import os
 import json
 import random
+import asyncio
 import traceback
 from math import comb
-import multiprocessing
-from typing import List, Dict, Any
+from contextlib import AsyncExitStack, contextmanager, nullcontext
+from typing import Awaitable, Callable, Iterator, List, Dict, Any, Optional, Tuple, TypeVar
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
 
+from tau_bench.checkpoint import (
+    CheckpointWriter,
+    load_resumable_results,
+    write_results,
+)
 from tau_bench.envs import get_env
+from tau_bench.envs.base import Env
+from tau_bench.envs.pool import EnvPool
+from tau_bench.envs.vec_env import VecEnv
+from tau_bench.cassette import CASSETTE_MODES, Cassette, cassette_scope
+from tau_bench.costs import BudgetExceededError, CostLedger, add_usage, record_costs
+from tau_bench.llm import configure_controller, parse_rate_limit, set_cassette
 from tau_bench.agents.base import Agent
-from tau_bench.types import EnvRunResult, RunConfig
+from tau_bench.schedule import (
+    SCHEDULE_ORDERS,
+    Episode,
+    load_task_durations,
+    order_episodes,
+)
+from tau_bench.timing import record_spans
+from tau_bench.types import EnvRunResult, RunConfig, SolveResult, Usage
 from litellm import provider_list
 from tau_bench.envs.user import UserStrategy
 
+T = TypeVar("T")
+R = TypeVar("R")
+
+# agents and user simulators whose LLM calls go through `acompletion`; the others
+# run in worker threads and never reach a lockstep barrier, so each round would
+# wait out --vec-max-wait for them
+LOCKSTEP_AGENT_STRATEGIES = ["tool-calling", "act", "react"]
+LOCKSTEP_USER_STRATEGIES = [UserStrategy.LLM.value, UserStrategy.REACT.value]
+
+
+class EpisodeRun(object):
+    """One episode of a run; the caller solving it sets `solve_result`."""
+
+    def __init__(self, task_id: int, trial: int) -> None:
+        self.task_id = task_id
+        self.trial = trial
+        self.solve_result: Optional[SolveResult] = None
+        self.result: Optional[EnvRunResult] = None
+
 
 def run(config: RunConfig) -> List[EnvRunResult]:
     assert config.env in ["retail", "airline"], "Only retail and airline envs are supported"
@@ -24,13 +62,48 @@ def run(config: RunConfig) -> List[EnvRunResult]:
     assert config.agent_strategy in ["tool-calling", "act", "react", "few-shot", "memory", "tool-memory"], "Invalid agent strategy"
     assert config.task_split in ["train", "test", "dev", "synthetic"], "Invalid task split"
     assert config.user_strategy in [item.value for item in UserStrategy], "Invalid user strategy"
+    assert config.schedule in SCHEDULE_ORDERS, "Invalid schedule order"
+    assert config.cassette_mode in CASSETTE_MODES, "Invalid cassette mode"
+    assert config.vec_env_size <= 1 or config.use_async, "--vec-env-size requires --use-async"
+    assert config.vec_env_size <= 1 or config.agent_strategy in LOCKSTEP_AGENT_STRATEGIES, f"--vec-env-size requires an agent strategy with async LLM calls: {LOCKSTEP_AGENT_STRATEGIES}"
+    assert config.vec_env_size <= 1 or config.user_strategy in LOCKSTEP_USER_STRATEGIES, f"--vec-env-size requires a user strategy with async LLM calls: {LOCKSTEP_USER_STRATEGIES}"
 
     random.seed(config.seed)
     time_str = datetime.now().strftime("%m%d%H%M%S")
     ckpt_path = f"{config.log_dir}/{config.agent_strategy}-{config.model.split('/')[-1]}-{config.temperature}_range_{config.start_index}-{config.end_index}_user-{config.user_model}-{config.user_strategy}_{time_str}.json"
+    # results are streamed to a JSONL checkpoint while running and written to ckpt_path at the end
+    stream_path = f"{os.path.splitext(ckpt_path)[0]}.jsonl"
+    previous_results: List[EnvRunResult] = []
+    if config.resume is not None:
+        stream_path = config.resume
+        ckpt_path = f"{os.path.splitext(stream_path)[0]}.json"
+        previous_results = load_resumable_results(stream_path, config)
+        print(
+            f"Resuming from {stream_path} ({len(previous_results)} episodes already completed)"
+        )
+    completed = {(result.task_id, result.trial) for result in previous_results}
     if not os.path.exists(config.log_dir):
         os.makedirs(config.log_dir)
 
+    # LLM calls of every episode share one controller, so retries and per-provider
+    # concurrency limits apply across the whole run
+    llm_controller = configure_controller(
+        max_retries=config.llm_max_retries,
+        adaptive=config.adaptive_concurrency,
+        initial_concurrency=min(config.llm_initial_concurrency, config.max_concurrency),
+        max_concurrency=config.max_concurrency,
+        rate_limits=dict(parse_rate_limit(spec) for spec in config.rate_limits or []),
+    )
+    cassette = (
+        Cassette(config.cassette, mode=config.cassette_mode)
+        if config.cassette is not None
+        else None
+    )
+    set_cassette(cassette)
+    # every episode's ledger forwards to this one, so the run's spend is known
+    # while episodes are in flight
+    run_ledger = CostLedger(max_cost=config.max_run_cost)
+
     print(f"Loading user with strategy: {config.user_strategy}")
     env = get_env(
         config.env,
@@ -48,81 +121,259 @@ def run(config: RunConfig) -> List[EnvRunResult]:
     end_index = (
         len(env.tasks) if config.end_index == -1 else min(config.end_index, len(env.tasks))
     )
-    results: List[EnvRunResult] = []
-    lock = multiprocessing.Lock()
+    results: List[EnvRunResult] = list(previous_results)
     if config.task_ids and len(config.task_ids) > 0:
-        print(f"Running tasks {config.task_ids} (checkpoint path: {ckpt_path})")
+        print(f"Running tasks {config.task_ids} (checkpoint path: {stream_path})")
     else:
         print(
-            f"Running tasks {config.start_index} to {end_index} (checkpoint path: {ckpt_path})"
+            f"Running tasks {config.start_index} to {end_index} (checkpoint path: {stream_path})"
     )
-    for i in range(config.num_trials):
-        if config.task_ids and len(config.task_ids) > 0:
-            idxs = config.task_ids
-        else:
-            idxs = list(range(config.start_index, end_index))
+    if config.task_ids and len(config.task_ids) > 0:
+        task_ids = list(config.task_ids)
+    else:
+        task_ids = list(range(config.start_index, end_index))
+    trial_task_ids = []
+    for _ in range(config.num_trials):
+        idxs = list(task_ids)
         if config.shuffle:
             random.shuffle(idxs)
+        trial_task_ids.append(idxs)
+    # every (task, trial) pair goes through one queue, so a slow episode of one trial
+    # does not hold back the episodes of the next
+    task_durations = None
+    if config.schedule == "longest-first":
+        task_durations = load_task_durations(
+            config.schedule_history or [config.log_dir], config
+        )
+        print(
+            f"Scheduling longest tasks first ({len([idx for idx in task_ids if idx in task_durations])}/{len(task_ids)} tasks have history)"
+        )
+    episodes = [
+        episode
+        for episode in order_episodes(trial_task_ids, config.schedule, task_durations)
+        if episode not in completed
+    ]
+
+    def _make_env() -> Env:
+        # the task is set when the agent resets the env
+        return get_env(
+            config.env,
+            user_strategy=config.user_strategy,
+            user_model=config.user_model,
+            task_split=config.task_split,
+            user_provider=config.user_model_provider,
+            task_index=0,
+            check_outputs=config.check_outputs,
+        )
+
+    # envs are reset in place by the agent, so episodes reuse them instead of
+    # building a new one each
+    env_pool = EnvPool(_make_env)
+    env_pool.release(env)
+
+    @contextmanager
+    def _episode(episode: Episode) -> Iterator[EpisodeRun]:
+        # the setup and bookkeeping shared by `_run` and `_arun`, which only
+        # differ in how they call the agent
+        idx, trial = episode
+        current = EpisodeRun(task_id=idx, trial=trial)
+        # LLM calls are recorded and replayed per episode, so a replay does not
+        # depend on how concurrent episodes interleave
+        with cassette_scope(f"{idx}-{trial}"), record_costs(
+            max_cost=config.max_episode_cost, parent=run_ledger
+        ) as ledger:
+            print(f"Running task {idx} (trial {trial})")
+            with record_spans() as recorder:
+                try:
+                    yield current
+                    result = solve_result_to_run_result(
+                        current.solve_result, task_id=idx, trial=trial
+                    )
+                except BudgetExceededError as e:
+                    result = stopped_run_result(
+                        e, task_id=idx, trial=trial, messages=ledger.messages
+                    )
+                except Exception as e:
+                    result = error_run_result(e, task_id=idx, trial=trial)
+        result.timing = recorder.timing()
+        result.cost = ledger.episode_cost()
+        print_run_result(result)
+        checkpoint.write(result)
+        current.result = result
 
-        def _run(idx: int) -> EnvRunResult:
-            isolated_env = get_env(
-                config.env,
-                user_strategy=config.user_strategy,
-                user_model=config.user_model,
-                task_split=config.task_split,
-                user_provider=config.user_model_provider,
-                task_index=idx,
-                check_outputs=config.check_outputs,
+    def _run(episode: Episode) -> Optional[EnvRunResult]:
+        if run_ledger.exhausted():
+            return None
+        with _episode(episode) as current, env_pool.lease() as isolated_env:
+            current.solve_result = agent.solve(
+                env=isolated_env,
+                task_index=current.task_id,
             )
+        return current.result
 
-            print(f"Running task {idx}")
-            try:
-                res = agent.solve(
+    async def _arun(
+        episode: Episode, env: Optional[Env] = None
+    ) -> Optional[EnvRunResult]:
+        if run_ledger.exhausted():
+            return None
+        with _episode(episode) as current:
+            async with (
+                env_pool.alease() if env is None else nullcontext(env)
+            ) as isolated_env:
+                current.solve_result = await agent.asolve(
                     env=isolated_env,
-                    task_index=idx,
+                    task_index=current.task_id,
                 )
-                result = EnvRunResult(
-                    task_id=idx,
-                    reward=res.reward,
-                    info=res.info,
-                    traj=res.messages,
-                    trial=i,
+        return current.result
+
+    round_sizes: List[int] = []
+    # one queue for every lockstep group, so a member whose episode ends takes
+    # the next episode instead of idling until its whole group is done
+    episode_queue = iter(enumerate(episodes))
+
+    async def _arun_lockstep(
+        _: int,
+    ) -> List[Tuple[Tuple[int, Episode], Optional[EnvRunResult]]]:
+        async with AsyncExitStack() as stack:
+            vec_env = VecEnv(
+                [
+                    await stack.enter_async_context(env_pool.alease())
+                    for _ in range(config.vec_env_size)
+                ],
+                max_wait=config.vec_max_wait,
+            )
+            try:
+                return await vec_env.run_queue(
+                    episode_queue, lambda item, env: _arun(item[1], env)
                 )
-            except Exception as e:
-                result = EnvRunResult(
-                    task_id=idx,
-                    reward=0.0,
-                    info={"error": str(e), "traceback": traceback.format_exc()},
-                    traj=[],
-                    trial=i,
+            finally:
+                round_sizes.extend(vec_env.round_sizes)
+
+    checkpoint = CheckpointWriter(stream_path, config=config)
+    try:
+        # episodes skipped once the run budget is exhausted come back as None
+        if config.use_async and config.vec_env_size > 1:
+            num_groups = max(1, config.max_concurrency // config.vec_env_size)
+            new_results: List[Optional[EnvRunResult]] = [None] * len(episodes)
+            for group_results in asyncio.run(
+                run_async(
+                    _arun_lockstep,
+                    list(range(num_groups)),
+                    num_groups,
+                    max_workers=config.max_concurrency,
                 )
-            print(
-                "✅" if result.reward == 1 else "❌",
-                f"task_id={idx}",
-                result.info,
-            )
-            print("-----")
-            with lock:
-                data = []
-                if os.path.exists(ckpt_path):
-                    with open(ckpt_path, "r") as f:
-                        data = json.load(f)
-                with open(ckpt_path, "w") as f:
-                    json.dump(data + [result.model_dump()], f, indent=2)
-            return result
-
-        with ThreadPoolExecutor(max_workers=config.max_concurrency) as executor:
-            res = list(executor.map(_run, idxs))
-            results.extend(res)
+            ):
+                for (position, _), result in group_results:
+                    new_results[position] = result
+            if len(round_sizes) > 0:
+                print(
+                    f"Lockstep LLM rounds: {len(round_sizes)}, {sum(round_sizes) / len(round_sizes):.1f} calls per round on average"
+                )
+        elif config.use_async:
+            new_results = asyncio.run(run_async(_arun, episodes, config.max_concurrency))
+        else:
+            with ThreadPoolExecutor(max_workers=config.max_concurrency) as executor:
+                new_results = list(executor.map(_run, episodes))
+        results.extend(result for result in new_results if result is not None)
+    finally:
+        # the writer thread is a daemon, so results still queued would be lost
+        # if the run crashed or was interrupted without this
+        checkpoint.close()
+        if cassette is not None:
+            cassette.close()
+            # later LLM calls of the process must not go through a closed cassette
+            set_cassette(None)
+    print(f"LLM calls: {llm_controller.stats()}")
+    num_skipped = sum(1 for result in new_results if result is None)
+    if num_skipped > 0:
+        print(
+            f"💸 Run budget of ${config.max_run_cost} exhausted (spent ${run_ledger.total.cost:.4f}); {num_skipped} episodes were not started, resume from {stream_path} to run them"
+        )
+    num_stopped = sum(
+        1 for result in new_results if result is not None and is_stopped(result)
+    )
+    if num_stopped > 0:
+        print(
+            f"💸 {num_stopped} episodes were stopped by the episode budget of ${config.max_episode_cost}; resume from {stream_path} with a higher --max-episode-cost to run them again"
+        )
 
     display_metrics(results)
 
-    with open(ckpt_path, "w") as f:
-        json.dump([result.model_dump() for result in results], f, indent=2)
-        print(f"\n📄 Results saved to {ckpt_path}\n")
+    write_results(ckpt_path, results)
+    print(f"\n📄 Results saved to {ckpt_path}\n")
     return results
 
 
+async def run_async(
+    arun: Callable[[T], Awaitable[R]],
+    episodes: List[T],
+    max_concurrency: int,
+    max_workers: Optional[int] = None,
+) -> List[R]:
+    """Run `arun` for every episode (or group of episodes) on the current event loop, at most `max_concurrency` at a time."""
+    # agents and user simulators without a native async path run in worker
+    # threads; `max_workers` is the number of episodes that can be in flight
+    # when each call of `arun` runs several
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_workers or max_concurrency)
+    )
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _bounded(episode: T) -> R:
+        async with semaphore:
+            return await arun(episode)
+
+    return list(await asyncio.gather(*[_bounded(episode) for episode in episodes]))
+
+
+def solve_result_to_run_result(
+    res: SolveResult, task_id: int, trial: int
+) -> EnvRunResult:
+    return EnvRunResult(
+        task_id=task_id,
+        reward=res.reward,
+        info=res.info,
+        traj=res.messages,
+        trial=trial,
+    )
+
+
+def error_run_result(e: Exception, task_id: int, trial: int) -> EnvRunResult:
+    return EnvRunResult(
+        task_id=task_id,
+        reward=0.0,
+        info={"error": str(e), "traceback": traceback.format_exc()},
+        traj=[],
+        trial=trial,
+    )
+
+
+def stopped_run_result(
+    e: BudgetExceededError, task_id: int, trial: int, messages: List[Dict[str, Any]]
+) -> EnvRunResult:
+    # not a failure of the agent: left out of the metrics and run again on resume
+    return EnvRunResult(
+        task_id=task_id,
+        reward=0.0,
+        info={"stopped": "budget", "error": str(e)},
+        traj=list(messages),
+        trial=trial,
+    )
+
+
+def is_stopped(result: EnvRunResult) -> bool:
+    return "stopped" in result.info
+
+
+def print_run_result(result: EnvRunResult) -> None:
+    print(
+        "💸" if is_stopped(result) else "✅" if result.reward == 1 else "❌",
+        f"task_id={result.task_id}",
+        result.info,
+    )
+    print("-----")
+
+
 def agent_factory(
     tools_info: List[Dict[str, Any]], wiki, config: RunConfig
 ) -> Agent:
@@ -136,6 +387,7 @@ def agent_factory(
             model=config.model,
             provider=config.model_provider,
             temperature=config.temperature,
+            parallel_tool_calls=config.parallel_tool_calls,
         )
     elif config.agent_strategy == "act":
         # `act` from https://arxiv.org/abs/2210.03629
@@ -208,10 +460,20 @@ def agent_factory(
         raise ValueError(f"Unknown agent strategy: {config.agent_strategy}")
 
 
-def display_metrics(results: List[EnvRunResult]) -> None:
+def display_metrics(all_results: List[EnvRunResult]) -> None:
     def is_successful(reward: float) -> bool:
         return (1 - 1e-6) <= reward <= (1 + 1e-6)
 
+    # episodes stopped by their budget never finished, so they are not scored;
+    # what they spent still counts
+    results = [r for r in all_results if not is_stopped(r)]
+    if len(results) < len(all_results):
+        print(
+            f"⏸️  {len(all_results) - len(results)} episodes stopped by their budget are left out of the metrics"
+        )
+    if len(results) == 0:
+        display_costs(all_results)
+        return
     num_trials = len(set([r.trial for r in results]))
     rewards = [r.reward for r in results]
     avg_reward = sum(rewards) / len(rewards)
@@ -232,3 +494,57 @@ def display_metrics(results: List[EnvRunResult]) -> None:
     print("📈 Pass^k")
     for k, pass_hat_k in pass_hat_ks.items():
         print(f"  k={k}: {pass_hat_k}")
+    display_timing(results)
+    display_costs(all_results)
+
+
+def display_timing(results: List[EnvRunResult], num_slowest_tools: int = 5) -> None:
+    timings = [r.timing for r in results if r.timing is not None]
+    if len(timings) == 0:
+        return
+    total = sum(timing.total for timing in timings)
+    by_component: dict[str, float] = {}
+    tool_durations: dict[str, List[float]] = {}
+    for timing in timings:
+        for component, duration in timing.by_component.items():
+            by_component[component] = by_component.get(component, 0.0) + duration
+        for span in timing.spans:
+            if span.component == "tool" and span.name is not None:
+                tool_durations.setdefault(span.name, []).append(span.duration)
+    by_component["other"] = max(0.0, total - sum(by_component.values()))
+    print(
+        f"⏱️  Episode time: {total / len(timings):.2f}s on average over {len(timings)} episodes"
+    )
+    for component, duration in sorted(by_component.items(), key=lambda item: -item[1]):
+        share = duration / total if total > 0 else 0.0
+        print(
+            f"  {component}: {share:.1%} ({duration / len(timings):.3f}s per episode)"
+        )
+    if len(tool_durations) > 0:
+        print("🐢 Slowest tools (mean time per call)")
+        slowest = sorted(
+            tool_durations.items(), key=lambda item: -sum(item[1]) / len(item[1])
+        )[:num_slowest_tools]
+        for name, durations in slowest:
+            print(
+                f"  {name}: {1000 * sum(durations) / len(durations):.2f}ms over {len(durations)} calls, max {1000 * max(durations):.2f}ms"
+            )
+
+
+def display_costs(results: List[EnvRunResult]) -> None:
+    costs = [r.cost for r in results if r.cost is not None]
+    if len(costs) == 0:
+        return
+    total = Usage()
+    by_component: dict[str, Usage] = {}
+    for cost in costs:
+        add_usage(total, cost.total)
+        for component, usage in cost.by_component.items():
+            add_usage(by_component.setdefault(component, Usage()), usage)
+    print(
+        f"💰 Cost: ${total.cost:.4f} (${total.cost / len(costs):.4f} per episode over {len(costs)} episodes), {total.calls} LLM calls"
+    )
+    for component, usage in sorted(by_component.items(), key=lambda item: -item[1].cost):
+        print(
+            f"  {component}: ${usage.cost:.4f}, {usage.input_tokens} input tokens ({usage.cached_tokens} cached), {usage.output_tokens} output tokens"
+        )
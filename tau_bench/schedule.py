@@ -0,0 +1,160 @@
+# Copyright Sierra
+
+import glob
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+
+from tau_bench.checkpoint import read_checkpoint, read_checkpoint_config
+from tau_bench.types import EnvRunResult, RunConfig
+
+# (task index, trial)
+Episode = Tuple[int, int]
+
+SCHEDULE_ORDERS = ["trial", "task", "random", "longest-first"]
+
+
+def order_episodes(
+    trial_task_ids: List[List[int]],
+    order: str,
+    task_durations: Optional[Dict[int, float]] = None,
+) -> List[Episode]:
+    """Order every (task, trial) episode of a run for a single shared work queue.
+
+    `trial_task_ids[trial]` lists the tasks of each trial in the order they were
+    drawn (possibly shuffled). Orders:
+      - "trial": all tasks of trial 0, then all tasks of trial 1, ...
+      - "task": all trials of a task back to back, tasks in first-trial order
+      - "random": a shuffle of all episodes (seeded by the run's seed)
+      - "longest-first": the longest tasks according to `task_durations` first,
+        so long episodes do not end up at the tail of the run; tasks without a
+        duration get the mean duration, and ties keep the "trial" order
+    """
+    episodes = [
+        (task_id, trial)
+        for trial, task_ids in enumerate(trial_task_ids)
+        for task_id in task_ids
+    ]
+    if order == "trial":
+        return episodes
+    elif order == "task":
+        first_position: dict[int, int] = {}
+        for task_id, _ in episodes:
+            first_position.setdefault(task_id, len(first_position))
+        return sorted(
+            episodes, key=lambda episode: (first_position[episode[0]], episode[1])
+        )
+    elif order == "random":
+        random.shuffle(episodes)
+        return episodes
+    elif order == "longest-first":
+        task_durations = task_durations or {}
+        default_duration = (
+            sum(task_durations.values()) / len(task_durations)
+            if len(task_durations) > 0
+            else 0.0
+        )
+        return sorted(
+            episodes,
+            key=lambda episode: -task_durations.get(episode[0], default_duration),
+        )
+    raise ValueError(f"Unknown schedule order: {order}")
+
+
+def episode_length(result: EnvRunResult) -> Optional[float]:
+    """Length of an episode from its result: the number of messages exchanged.
+
+    Every episode that ran to the end counts, whatever its reward; episodes that
+    ended in an error have no length.
+    """
+    if "error" in result.info or len(result.traj) == 0:
+        return None
+    return float(len(result.traj))
+
+
+def episode_wall_time(result: EnvRunResult) -> Optional[float]:
+    if "error" in result.info or result.timing is None:
+        return None
+    return result.timing.total
+
+
+def episode_tokens(result: EnvRunResult) -> Optional[float]:
+    """Input and output tokens of the episode's LLM calls, as recorded in `result.cost`."""
+    if "error" in result.info or result.cost is None or result.cost.total.calls == 0:
+        return None
+    return float(result.cost.total.input_tokens + result.cost.total.output_tokens)
+
+
+def find_history_files(paths: List[str], config: RunConfig) -> List[str]:
+    """Result files under `paths` that can inform the schedule of `config`.
+
+    Directories are searched for `.jsonl` checkpoints whose recorded config has
+    the same env and task split. Checkpoints given as files are skipped when
+    their config differs; final `.json` results record no config, so they are
+    used as given.
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            if path.endswith(".json") or _same_tasks(path, config):
+                files.append(path)
+            else:
+                print(
+                    f"Skipping schedule history {path}: not a checkpoint of {config.env}/{config.task_split}"
+                )
+            continue
+        for file_path in sorted(glob.glob(os.path.join(path, "*.jsonl"))):
+            if _same_tasks(file_path, config):
+                files.append(file_path)
+    return files
+
+
+def _same_tasks(path: str, config: RunConfig) -> bool:
+    try:
+        saved = read_checkpoint_config(path)
+    except (OSError, ValueError):
+        return False
+    return (
+        saved is not None
+        and saved.env == config.env
+        and saved.task_split == config.task_split
+    )
+
+
+def load_task_durations(paths: List[str], config: RunConfig) -> Dict[int, float]:
+    """Mean duration per task over the past results found under `paths`.
+
+    The duration is the first of these signals that every task with history
+    has: the episode wall time, the tokens of the episode's LLM calls
+    (`episode_tokens`), and `episode_length` (trajectory length). Only one
+    signal is used, so that durations in different units are never compared.
+    """
+    lengths: Dict[int, List[float]] = {}
+    tokens: Dict[int, List[float]] = {}
+    wall_times: Dict[int, List[float]] = {}
+    for file_path in find_history_files(paths, config):
+        try:
+            results = read_checkpoint(file_path)
+        except (OSError, ValueError) as e:
+            print(f"Skipping schedule history {file_path}: {e}")
+            continue
+        for result in results:
+            for signal, value in [
+                (lengths, episode_length(result)),
+                (tokens, episode_tokens(result)),
+                (wall_times, episode_wall_time(result)),
+            ]:
+                if value is not None:
+                    signal.setdefault(result.task_id, []).append(value)
+    task_ids = set(lengths) | set(tokens) | set(wall_times)
+    durations = next(
+        (
+            signal
+            for signal in [wall_times, tokens, lengths]
+            if len(signal) > 0 and set(signal) >= task_ids
+        ),
+        lengths,
+    )
+    return {
+        task_id: sum(values) / len(values) for task_id, values in durations.items()
+    }
@@ -0,0 +1,95 @@
+# Copyright Sierra
+
+"""Timing spans of an episode.
+
+`run()` opens a `record_spans()` block around every episode; the agents, `Env`
+and the reward calculation mark their work with `span(component, name)`. The
+recorder lives in a context variable, so it follows the episode into worker
+threads (`asyncio.to_thread`) and stays separate between concurrent episodes.
+Outside a `record_spans()` block, `span` does nothing.
+
+Time spent in a nested span (e.g. the tools replayed while grading) counts
+towards the innermost component: every span is recorded with its own time,
+less the time of the spans nested in it, so the components add up to at most
+the episode's time. `current_component()` is the component of the outermost
+open span; `tau_bench.costs` uses it to attribute LLM spend.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from tau_bench.types import EpisodeTiming, Span
+
+
+class SpanRecorder(object):
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.spans: List[Span] = []
+        # the time spent in the spans nested in each open span
+        self.nested: List[float] = []
+
+    def timing(self) -> EpisodeTiming:
+        by_component: Dict[str, float] = {}
+        for item in self.spans:
+            by_component[item.component] = (
+                by_component.get(item.component, 0.0) + item.duration
+            )
+        return EpisodeTiming(
+            total=time.perf_counter() - self.started_at,
+            by_component=by_component,
+            spans=self.spans,
+        )
+
+
+_recorder: ContextVar[Optional[SpanRecorder]] = ContextVar(
+    "span_recorder", default=None
+)
+# set by spans even outside `record_spans()`, so LLM costs can be attributed
+_component: ContextVar[Optional[str]] = ContextVar("span_component", default=None)
+
+
+@contextmanager
+def record_spans() -> Iterator[SpanRecorder]:
+    recorder = SpanRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def current_component() -> Optional[str]:
+    """The component of the outermost open span, if any."""
+    return _component.get()
+
+
+@contextmanager
+def span(component: str, name: Optional[str] = None) -> Iterator[None]:
+    token = _component.set(component) if _component.get() is None else None
+    try:
+        recorder = _recorder.get()
+        if recorder is None:
+            yield
+            return
+        started_at = time.perf_counter()
+        recorder.nested.append(0.0)
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started_at
+            nested = recorder.nested.pop()
+            if len(recorder.nested) > 0:
+                recorder.nested[-1] += duration
+            recorder.spans.append(
+                Span(
+                    component=component,
+                    name=name,
+                    start=started_at - recorder.started_at,
+                    duration=duration - nested,
+                )
+            )
+    finally:
+        if token is not None:
+            _component.reset(token)
@@ -27,6 +27,8 @@ class RewardOutputInfo(BaseModel):
 class RewardActionInfo(BaseModel):
     r_actions: float
     gt_data_hash: str
+    # `table/key` paths of the records that differ from the ground-truth final state
+    data_diff: List[str] = []
 
 
 class RewardResult(BaseModel):
@@ -61,12 +63,47 @@ class EnvResetResponse(BaseModel):
     info: EnvInfo
 
 
+class Span(BaseModel):
+    # e.g. "agent_llm", "user_llm", "tool", "reward", "gt_replay" (the ground-truth
+    # tool calls replayed while grading)
+    component: str
+    # e.g. the tool name
+    name: Optional[str] = None
+    # seconds since the start of the episode
+    start: float
+    # excluding the spans nested in this one
+    duration: float
+
+
+class EpisodeTiming(BaseModel):
+    total: float
+    by_component: Dict[str, float]
+    spans: List[Span]
+
+
+class Usage(BaseModel):
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # part of input_tokens served from the provider's prompt cache
+    cached_tokens: int = 0
+    cost: float = 0.0
+
+
+class EpisodeCost(BaseModel):
+    total: Usage
+    # keyed by the timing component the calls were made in (agent_llm, user_llm, ...)
+    by_component: Dict[str, Usage]
+
+
 class EnvRunResult(BaseModel):
     task_id: int
     reward: float
     info: Dict[str, Any]
     traj: List[Dict[str, Any]]
     trial: int
+    timing: Optional[EpisodeTiming] = None
+    cost: Optional[EpisodeCost] = None
 
 
 class RunConfig(BaseModel):
@@ -92,3 +129,18 @@ class RunConfig(BaseModel):
     memory_top_k: int = 3
     memory_db_path: Optional[str] = None
     check_outputs: bool = True
+    resume: Optional[str] = None
+    use_async: bool = False
+    schedule: str = "trial"
+    schedule_history: Optional[List[str]] = None
+    llm_max_retries: int = 3
+    adaptive_concurrency: bool = False
+    llm_initial_concurrency: int = 8
+    rate_limits: Optional[List[str]] = None
+    cassette: Optional[str] = None
+    cassette_mode: str = "replay"
+    max_run_cost: Optional[float] = None
+    max_episode_cost: Optional[float] = None
+    parallel_tool_calls: bool = False
+    vec_env_size: int = 1
+    vec_max_wait: float = 2.0
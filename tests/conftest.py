@@ -0,0 +1,87 @@
+# Copyright Sierra
+
+import asyncio
+import itertools
+import os
+import threading
+from typing import Any, Dict, Iterator, Mapping, Tuple
+
+import pytest
+
+# litellm otherwise fetches its price table over the network on import
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from tau_bench.envs import get_env  # noqa: E402
+from tau_bench.envs.base import Env  # noqa: E402
+from tau_bench.envs.dataset import copy_record  # noqa: E402
+from tau_bench.mock_llm_server import MockLLM, MockLLMConfig, _handle_connection  # noqa: E402
+
+
+def materialize(data: Mapping) -> Dict[str, Any]:
+    """A plain deep copy of everything a dataset view currently holds."""
+    return {name: copy_record(dict(table.items())) for name, table in data.items()}
+
+
+def make_env(
+    env_name: str = "retail", task_index: int = 0, check_outputs: bool = True
+) -> Env:
+    # the LLM user makes no call until it is reset, and these tests never reset it
+    env = get_env(
+        env_name,
+        user_strategy="llm",
+        user_model="gpt-4o",
+        user_provider="openai",
+        task_split="test",
+        task_index=task_index,
+        check_outputs=check_outputs,
+    )
+    env.reset_state(task_index)
+    return env
+
+
+@pytest.fixture(scope="session")
+def mock_llm() -> Iterator[Tuple[MockLLM, Dict[str, Any]]]:
+    """A mock LLM server on a free port, and the `completion` kwargs that reach it."""
+    llm = MockLLM(MockLLMConfig(latency=0.0, seed=0))
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(
+            lambda reader, writer: _handle_connection(llm, reader, writer),
+            "127.0.0.1",
+            0,
+        )
+    )
+    port = server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield llm, {
+        "model": "gpt-4o",
+        "custom_llm_provider": "openai",
+        "api_base": f"http://127.0.0.1:{port}/v1",
+        "api_key": "mock",
+    }
+
+    async def shutdown() -> None:
+        server.close()
+        # the client keeps connections alive, so their handlers are still waiting
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def mock_openai(mock_llm, monkeypatch) -> Iterator[MockLLM]:
+    """Route every `openai` provider call, e.g. of `run()`, to the mock LLM server."""
+    llm, kwargs = mock_llm
+    monkeypatch.setenv("OPENAI_API_BASE", kwargs["api_base"])
+    monkeypatch.setenv("OPENAI_API_KEY", kwargs["api_key"])
+    # response ids end up in the agent's messages, so runs compare equal only
+    # when they do not depend on the order the server saw the requests in
+    monkeypatch.setattr(llm, "ids", itertools.repeat(0))
+    yield llm
@@ -0,0 +1,117 @@
+# Copyright Sierra
+
+import json
+from typing import Any, Dict
+
+from tau_bench.envs.airline.data import load_data
+from tau_bench.envs.airline.tools.search_direct_flight import SearchDirectFlight
+from tau_bench.envs.airline.tools.search_onestop_flight import SearchOnestopFlight
+from tau_bench.envs.dataset import CowDataset, load_base_data
+
+DATES = ["2024-05-01", "2024-05-16", "2024-05-30"]
+
+
+def scan_direct_flights(data: Dict[str, Any], origin: str, destination: str, date: str) -> str:
+    # search_direct_flight before the route index
+    results = []
+    for flight in data["flights"].values():
+        if flight["origin"] == origin and flight["destination"] == destination:
+            if date in flight["dates"] and flight["dates"][date]["status"] == "available":
+                results.append({k: v for k, v in flight.items() if k != "dates"})
+                results[-1].update(flight["dates"][date])
+    return json.dumps(results)
+
+
+def scan_onestop_flights(
+    data: Dict[str, Any], origin: str, destination: str, date: str
+) -> str:
+    # search_onestop_flight before the origin and route indexes
+    flights = data["flights"]
+    results = []
+    for flight1 in flights.values():
+        if flight1["origin"] != origin:
+            continue
+        for flight2 in flights.values():
+            if (
+                flight2["destination"] != destination
+                or flight1["destination"] != flight2["origin"]
+            ):
+                continue
+            date2 = (
+                f"2024-05-{int(date[-2:])+1}"
+                if "+1" in flight1["scheduled_arrival_time_est"]
+                else date
+            )
+            if flight1["scheduled_arrival_time_est"] > flight2["scheduled_departure_time_est"]:
+                continue
+            if date in flight1["dates"] and date2 in flight2["dates"]:
+                if (
+                    flight1["dates"][date]["status"] == "available"
+                    and flight2["dates"][date2]["status"] == "available"
+                ):
+                    result1 = {k: v for k, v in flight1.items() if k != "dates"}
+                    result1.update(flight1["dates"][date])
+                    result1["date"] = date
+                    result2 = {k: v for k, v in flight2.items() if k != "dates"}
+                    result2.update(flight2["dates"][date])
+                    result2["date"] = date2
+                    results.append([result1, result2])
+    return json.dumps(results)
+
+
+def airports(data: Dict[str, Any]):
+    return sorted({flight["origin"] for flight in data["flights"].values()})
+
+
+def test_direct_search_matches_the_scan():
+    data = CowDataset(load_base_data(load_data))
+    num_found = 0
+    for origin in airports(data):
+        for destination in airports(data):
+            for date in DATES:
+                expected = scan_direct_flights(data, origin, destination, date)
+                assert SearchDirectFlight.invoke(data, origin, destination, date) == expected
+                num_found += expected != "[]"
+    assert num_found > 0
+
+
+def test_direct_search_sees_writes_to_indexed_fields():
+    data = CowDataset(load_base_data(load_data))
+    flight_number = next(iter(data["flights"]))
+    flight = data["flights"][flight_number]
+    flight["origin"], flight["destination"] = flight["destination"], flight["origin"]
+    data["flights"]["NEW001"] = {**flight, "flight_number": "NEW001"}
+    for origin, destination in [
+        (flight["origin"], flight["destination"]),
+        (flight["destination"], flight["origin"]),
+    ]:
+        for date in DATES:
+            assert SearchDirectFlight.invoke(
+                data, origin, destination, date
+            ) == scan_direct_flights(data, origin, destination, date)
+
+
+def test_onestop_search_matches_the_scan():
+    data = CowDataset(load_base_data(load_data))
+    num_found = 0
+    for origin in airports(data):
+        for destination in airports(data):
+            for date in DATES:
+                expected = scan_onestop_flights(data, origin, destination, date)
+                assert SearchOnestopFlight.invoke(data, origin, destination, date) == expected
+                num_found += expected != "[]"
+    assert num_found > 0
+
+
+def test_onestop_search_sees_writes_to_indexed_fields():
+    data = CowDataset(load_base_data(load_data))
+    flight_number = next(iter(data["flights"]))
+    flight = data["flights"][flight_number]
+    origin, destination = flight["origin"], flight["destination"]
+    flight["destination"] = "XXX"
+    data["flights"]["NEW001"] = {**flight, "flight_number": "NEW001", "origin": "XXX"}
+    for date in DATES:
+        for pair in [(origin, destination), (origin, "XXX"), ("XXX", destination)]:
+            assert SearchOnestopFlight.invoke(data, *pair, date) == scan_onestop_flights(
+                data, *pair, date
+            )
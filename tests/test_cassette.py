@@ -0,0 +1,104 @@
+# Copyright Sierra
+
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from tau_bench.cassette import Cassette, CassetteMissError, cassette_scope
+from tau_bench.costs import record_costs
+from tau_bench.llm import completion, set_cassette
+
+
+@pytest.fixture
+def mock_kwargs(mock_llm):
+    yield mock_llm[1]
+    set_cassette(None)
+
+
+def ask(mock_kwargs: Dict[str, Any], content: str) -> Any:
+    return completion(messages=[{"role": "user", "content": content}], **mock_kwargs)
+
+
+def run_calls(
+    path: str, mode: str, mock_kwargs: Dict[str, Any], calls: List[Tuple[str, str]]
+) -> List[Any]:
+    """Make each (scope, content) call with the cassette at `path` in `mode`."""
+    cassette = Cassette(path, mode=mode)
+    set_cassette(cassette)
+    try:
+        responses = []
+        for scope, content in calls:
+            with cassette_scope(scope):
+                responses.append(ask(mock_kwargs, content))
+        return responses
+    finally:
+        set_cassette(None)
+        cassette.close()
+
+
+def test_replay_serves_recordings_without_network(tmp_path, mock_llm, mock_kwargs):
+    llm, _ = mock_llm
+    path = str(tmp_path / "calls.jsonl.gz")
+    calls = [("0-0", "hi"), ("0-0", "hi"), ("1-0", "hi"), ("1-0", "bye")]
+    num_requests = llm.num_requests
+    recorded = run_calls(path, "record", mock_kwargs, calls)
+    assert llm.num_requests == num_requests + len(calls)
+    replayed = run_calls(path, "replay", mock_kwargs, calls)
+    assert llm.num_requests == num_requests + len(calls)
+    # identical requests are told apart by scope and by their position in it
+    assert len({res.id for res in recorded}) == len(calls)
+    assert [res.id for res in replayed] == [res.id for res in recorded]
+
+
+def test_replayed_calls_are_charged_like_recorded_ones(tmp_path, mock_kwargs):
+    path = str(tmp_path / "calls.jsonl")
+    with record_costs() as recording:
+        run_calls(path, "record", mock_kwargs, [("0-0", "hi")])
+    with record_costs() as replaying:
+        run_calls(path, "replay", mock_kwargs, [("0-0", "hi")])
+    assert recording.total.cost > 0
+    assert replaying.total == recording.total
+
+
+def test_unrecorded_requests_miss(tmp_path, mock_kwargs):
+    path = str(tmp_path / "calls.jsonl")
+    run_calls(path, "record", mock_kwargs, [("0-0", "hi")])
+    with pytest.raises(CassetteMissError):
+        run_calls(path, "replay", mock_kwargs, [("0-0", "bye")])
+    # recorded once in that episode, and not in any other
+    with pytest.raises(CassetteMissError):
+        run_calls(path, "replay", mock_kwargs, [("0-0", "hi"), ("0-0", "hi")])
+    with pytest.raises(CassetteMissError):
+        run_calls(path, "replay", mock_kwargs, [("1-0", "hi")])
+
+
+def test_recording_again_replaces_the_episode_recording(tmp_path, mock_kwargs):
+    path = str(tmp_path / "calls.jsonl.gz")
+    first = run_calls(path, "record", mock_kwargs, [("0-0", "hi"), ("1-0", "hi")])
+    second = run_calls(path, "record", mock_kwargs, [("0-0", "hi")])
+    replayed = run_calls(path, "replay", mock_kwargs, [("0-0", "hi"), ("1-0", "hi")])
+    assert [res.id for res in replayed] == [second[0].id, first[1].id]
+    # the earlier recording of the episode is not served after the new one
+    with pytest.raises(CassetteMissError):
+        run_calls(path, "replay", mock_kwargs, [("0-0", "hi"), ("0-0", "hi")])
+
+
+def test_recording_is_read_back_before_it_is_closed(tmp_path, mock_kwargs):
+    path = str(tmp_path / "calls.jsonl.gz")
+    cassette = Cassette(path, mode="record")
+    set_cassette(cassette)
+    with cassette_scope("0-0"):
+        recorded = ask(mock_kwargs, "hi")
+    # as after a crash, the gzip member has no trailer yet
+    replaying = Cassette(path, mode="replay")
+    set_cassette(replaying)
+    with cassette_scope("0-0"):
+        assert ask(mock_kwargs, "hi").id == recorded.id
+    cassette.close()
+
+
+def test_cassette_modes(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Cassette(str(tmp_path / "missing.jsonl"), mode="replay")
+    with pytest.raises(ValueError):
+        Cassette(str(tmp_path / "calls.jsonl"), mode="rewind")
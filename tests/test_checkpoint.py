@@ -0,0 +1,99 @@
+# Copyright Sierra
+
+import json
+
+import pytest
+
+from tau_bench.checkpoint import (
+    CheckpointWriter,
+    _drop_partial_last_line,
+    convert_checkpoint,
+    get_config_mismatches,
+    load_resumable_results,
+    read_checkpoint,
+    read_checkpoint_config,
+)
+from tau_bench.types import EnvRunResult, RunConfig
+
+CONFIG = RunConfig(model_provider="openai", user_model_provider="openai", model="gpt-4o")
+
+
+def make_result(task_id: int, trial: int = 0, reward: float = 1.0, **info) -> EnvRunResult:
+    return EnvRunResult(task_id=task_id, reward=reward, info=info, traj=[], trial=trial)
+
+
+def test_writer_round_trip(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    with CheckpointWriter(path, config=CONFIG) as writer:
+        writer.write(make_result(0))
+        writer.write(make_result(1, reward=0.0))
+    # reopening appends without a second header
+    with CheckpointWriter(path, config=CONFIG) as writer:
+        writer.write(make_result(2))
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert ["config" in line for line in lines] == [True, False, False, False]
+    assert read_checkpoint_config(path) == CONFIG
+    assert [(r.task_id, r.reward) for r in read_checkpoint(path)] == [
+        (0, 1.0),
+        (1, 0.0),
+        (2, 1.0),
+    ]
+
+
+def test_partial_last_line_is_dropped(tmp_path):
+    path = tmp_path / "run.jsonl"
+    path.write_text('{"a": 1}\n{"b": 2}\n{"c": ')
+    _drop_partial_last_line(str(path))
+    assert path.read_text() == '{"a": 1}\n{"b": 2}\n'
+    _drop_partial_last_line(str(path))
+    assert path.read_text() == '{"a": 1}\n{"b": 2}\n'
+    path.write_text('{"c": ')
+    _drop_partial_last_line(str(path))
+    assert path.read_text() == ""
+    _drop_partial_last_line(str(tmp_path / "missing.jsonl"))
+
+
+def test_rerun_episode_supersedes_earlier_line(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    with CheckpointWriter(path, config=CONFIG) as writer:
+        writer.write(make_result(0, reward=0.0, error="outage"))
+        writer.write(make_result(1))
+        writer.write(make_result(0))
+    assert [(r.task_id, r.reward) for r in read_checkpoint(path)] == [(1, 1.0), (0, 1.0)]
+    output = str(tmp_path / "run.json")
+    assert len(convert_checkpoint(path, output)) == 2
+    assert len(read_checkpoint(output)) == 2
+
+
+def test_config_mismatches_ignore_execution_settings():
+    changed = CONFIG.model_copy(
+        update={"max_concurrency": 64, "use_async": True, "vec_env_size": 4, "cassette": "c.gz"}
+    )
+    assert get_config_mismatches(CONFIG, changed) == []
+    changed = changed.model_copy(update={"model": "gpt-4o-mini", "num_trials": 3})
+    assert get_config_mismatches(CONFIG, changed) == ["model", "num_trials"]
+
+
+def test_resume_reruns_stopped_and_crashed_episodes(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    with CheckpointWriter(path, config=CONFIG) as writer:
+        writer.write(make_result(0))
+        writer.write(make_result(1, reward=0.0))
+        writer.write(make_result(2, reward=0.0, error="outage"))
+        writer.write(make_result(3, reward=0.0, stopped="budget", error="over budget"))
+    results = load_resumable_results(path, CONFIG.model_copy(update={"max_concurrency": 8}))
+    assert [r.task_id for r in results] == [0, 1]
+
+
+def test_resume_refuses_other_configs(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    with CheckpointWriter(path, config=CONFIG) as writer:
+        writer.write(make_result(0))
+    with pytest.raises(ValueError, match="temperature"):
+        load_resumable_results(path, CONFIG.model_copy(update={"temperature": 1.0}))
+    headless = str(tmp_path / "headless.jsonl")
+    with CheckpointWriter(headless) as writer:
+        writer.write(make_result(0))
+    with pytest.raises(ValueError, match="no config header"):
+        load_resumable_results(headless, CONFIG)
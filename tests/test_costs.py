@@ -0,0 +1,61 @@
+# Copyright Sierra
+
+import pytest
+
+from tau_bench.costs import (
+    BudgetExceededError,
+    CostLedger,
+    check_budget,
+    record_costs,
+    track_messages,
+)
+from tau_bench.llm import completion
+from tau_bench.run import is_stopped, stopped_run_result
+from tau_bench.timing import span
+from tau_bench.types import Usage
+
+
+def test_charges_add_up_per_component_and_in_the_parent():
+    run_ledger = CostLedger(max_cost=1.0)
+    episode = CostLedger(parent=run_ledger)
+    episode.charge("agent_llm", Usage(calls=1, input_tokens=10, output_tokens=2, cost=0.25))
+    episode.charge("user_llm", Usage(calls=1, input_tokens=5, cost=0.5))
+    episode.charge("agent_llm", Usage(calls=1, cached_tokens=4, cost=0.25))
+    cost = episode.episode_cost()
+    assert cost.total == Usage(
+        calls=3, input_tokens=15, output_tokens=2, cached_tokens=4, cost=1.0
+    )
+    assert cost.by_component["agent_llm"].calls == 2
+    assert run_ledger.total == cost.total
+    assert not episode.exhausted()
+    assert run_ledger.exhausted()
+
+
+def test_calls_stop_once_the_episode_budget_is_spent(mock_llm):
+    _, mock_kwargs = mock_llm
+    messages = [{"role": "user", "content": "hi"}]
+    run_ledger = CostLedger()
+    with record_costs(max_cost=1e-9, parent=run_ledger) as ledger:
+        track_messages(messages)
+        with span("agent_llm"):
+            completion(messages=messages, **mock_kwargs)
+        with pytest.raises(BudgetExceededError):
+            completion(messages=messages, **mock_kwargs)
+    assert ledger.total.calls == 1 and ledger.total.cost > 0
+    assert ledger.total.input_tokens > 0 and ledger.total.output_tokens > 0
+    assert list(ledger.by_component) == ["agent_llm"]
+    assert run_ledger.total == ledger.total
+    # the partial trajectory of a stopped episode
+    assert ledger.messages is messages
+    result = stopped_run_result(
+        BudgetExceededError("over budget"), task_id=3, trial=1, messages=ledger.messages
+    )
+    assert is_stopped(result)
+    assert result.traj == messages and result.traj is not messages
+
+
+def test_no_budget_outside_an_episode():
+    check_budget()
+    with record_costs() as ledger:
+        ledger.charge("other", Usage(calls=1, cost=100.0))
+        check_budget()
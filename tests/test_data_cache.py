@@ -0,0 +1,130 @@
+# Copyright Sierra
+
+import json
+import os
+
+import pytest
+
+from tau_bench.envs import data_cache
+from tau_bench.envs.data_cache import (
+    COMPILED_FILE_NAME,
+    compile_json_files,
+    load_json_files,
+)
+
+FILES = {"users": "users.json", "orders": "orders.json"}
+DATA = {
+    "users": {"u1": {"name": "Ada", "balance": 50, "rate": 0.5}},
+    "orders": {"o1": {"user_id": "u1", "items": [1, 2.0, None, True]}},
+}
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name, file_name in FILES.items():
+        with open(tmp_path / file_name, "w") as f:
+            json.dump(DATA[name], f)
+    return tmp_path
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    # the payloads unpickled by `load_json_files`, to tell a cache hit from a parse
+    calls = []
+    pickle_loads = data_cache.pickle.loads
+
+    def _loads(payload):
+        calls.append(len(payload))
+        return pickle_loads(payload)
+
+    monkeypatch.setattr(data_cache.pickle, "loads", _loads)
+    return calls
+
+
+def test_compiled_data_round_trips(folder, loads):
+    path = compile_json_files(str(folder), FILES)
+    assert path == os.path.join(str(folder), COMPILED_FILE_NAME)
+    data = load_json_files(str(folder), FILES)
+    assert len(loads) == 1
+    assert data == DATA
+    # 50 and 50.0 hash differently, so the cache must keep the JSON types
+    assert type(data["users"]["u1"]["balance"]) is int
+    assert type(data["orders"]["o1"]["items"][1]) is float
+
+
+def test_changed_source_loads_the_json(folder, loads):
+    compile_json_files(str(folder), FILES)
+    compiled_mtime = os.path.getmtime(folder / COMPILED_FILE_NAME)
+    changed = {"u1": {"name": "Grace", "balance": 50, "rate": 0.5}}
+    with open(folder / "users.json", "w") as f:
+        json.dump(changed, f)
+    os.utime(folder / "users.json", (compiled_mtime + 10, compiled_mtime + 10))
+    assert load_json_files(str(folder), FILES) == {**DATA, "users": changed}
+    assert loads == []
+
+
+def test_touched_but_unchanged_source_keeps_the_cache(folder, loads):
+    # freshness is decided by the sources' checksums, not their mtimes
+    compile_json_files(str(folder), FILES)
+    compiled_mtime = os.path.getmtime(folder / COMPILED_FILE_NAME)
+    os.utime(folder / "users.json", (compiled_mtime + 10, compiled_mtime + 10))
+    assert load_json_files(str(folder), FILES) == DATA
+    assert len(loads) == 1
+
+
+def test_stale_source_checksum_loads_the_json(folder, loads):
+    compile_json_files(str(folder), FILES)
+    path = folder / COMPILED_FILE_NAME
+    raw = path.read_bytes()
+    header_end = raw.index(b"\n")
+    header = json.loads(raw[len(data_cache._MAGIC) : header_end])
+    header["sources"]["users"] = "0" * 64
+    path.write_bytes(
+        data_cache._MAGIC + json.dumps(header).encode("utf-8") + raw[header_end:]
+    )
+    assert load_json_files(str(folder), FILES) == DATA
+    assert loads == []
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda raw: raw[:-10],
+        lambda raw: raw[:-10] + b"\x00" * 10,
+        lambda raw: raw[: raw.index(b"\n") + 1],
+    ],
+    ids=["truncated", "overwritten", "no-payload"],
+)
+def test_corrupt_payload_loads_the_json(folder, loads, corrupt):
+    compile_json_files(str(folder), FILES)
+    path = folder / COMPILED_FILE_NAME
+    path.write_bytes(corrupt(path.read_bytes()))
+    assert load_json_files(str(folder), FILES) == DATA
+    assert loads == []
+
+
+@pytest.mark.parametrize(
+    "header",
+    [b"", b"{not json", b"[]", b'"sources"', b"\xff\xfe", b"{}"],
+)
+def test_malformed_header_loads_the_json(folder, loads, header):
+    compile_json_files(str(folder), FILES)
+    path = folder / COMPILED_FILE_NAME
+    raw = path.read_bytes()
+    path.write_bytes(data_cache._MAGIC + header + raw[raw.index(b"\n") :])
+    assert load_json_files(str(folder), FILES) == DATA
+    assert loads == []
+
+
+@pytest.mark.parametrize(
+    "raw", [b"", b"TAUDATA1", b"TAUDATA1{}", b"NOTMAGIC{}\n"], ids=repr
+)
+def test_bad_magic_or_missing_newline_loads_the_json(folder, loads, raw):
+    (folder / COMPILED_FILE_NAME).write_bytes(raw)
+    assert load_json_files(str(folder), FILES) == DATA
+    assert loads == []
+
+
+def test_missing_artifact_loads_the_json(folder, loads):
+    assert load_json_files(str(folder), FILES) == DATA
+    assert loads == []
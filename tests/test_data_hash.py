@@ -0,0 +1,54 @@
+# Copyright Sierra
+
+from conftest import materialize
+from tau_bench.envs.airline.data import load_data as load_airline_data
+from tau_bench.envs.data_hash import diff_data, hash_data
+from tau_bench.envs.dataset import CowDataset, load_base_data
+from tau_bench.envs.retail.data import load_data as load_retail_data
+
+
+def test_incremental_hash_matches_full_recompute_after_mutations():
+    for load_data in [load_retail_data, load_airline_data]:
+        base = load_base_data(load_data)
+        data = CowDataset(base)
+        assert hash_data(data) == hash_data(materialize(base))
+        for name, table in data.items():
+            keys = list(table.base_table)
+            table[keys[0]] = {"replaced": True}
+            del table[keys[1]]
+            table[f"new_{name}"] = {"inserted": [1, 2, 3]}
+            # read but left unchanged
+            table[keys[2]]
+            assert hash_data(data) == hash_data(materialize(data))
+        assert hash_data(data) != hash_data(materialize(base))
+
+
+def test_hash_returns_to_base_when_a_write_is_undone():
+    base = load_base_data(load_retail_data)
+    data = CowDataset(base)
+    user_id = next(iter(base["users"]))
+    email = data["users"][user_id]["email"]
+    data["users"][user_id]["email"] = "changed@example.com"
+    assert hash_data(data) != hash_data(CowDataset(base))
+    data["users"][user_id]["email"] = email
+    assert hash_data(data) == hash_data(CowDataset(base))
+    assert diff_data(data, CowDataset(base)) == []
+
+
+def test_hash_tells_ints_from_floats():
+    assert hash_data({"t": {"a": {"balance": 50}}}) != hash_data(
+        {"t": {"a": {"balance": 50.0}}}
+    )
+
+
+def test_diff_lists_the_changed_records():
+    base = load_base_data(load_retail_data)
+    data, other = CowDataset(base), CowDataset(base)
+    user_id, order_id = next(iter(base["users"])), next(iter(base["orders"]))
+    data["users"][user_id]["email"] = "changed@example.com"
+    del other["orders"][order_id]
+    assert diff_data(data, other) == [f"orders/{order_id}", f"users/{user_id}"]
+    assert diff_data(data, materialize(other)) == [
+        f"orders/{order_id}",
+        f"users/{user_id}",
+    ]
@@ -0,0 +1,109 @@
+# Copyright Sierra
+
+from conftest import materialize
+from tau_bench.envs.dataset import CowDataset, load_base_data
+from tau_bench.envs.retail.data import load_data
+
+
+def test_base_data_is_loaded_once_per_process():
+    assert load_base_data(load_data) is load_base_data(load_data)
+
+
+def test_writes_stay_in_their_own_view():
+    base = load_base_data(load_data)
+    pristine = materialize(base)
+    user_id, order_id = next(iter(base["users"])), next(iter(base["orders"]))
+    data, other = CowDataset(base), CowDataset(base)
+
+    data["users"][user_id]["email"] = "changed@example.com"
+    data["users"]["new_user"] = {"email": "new@example.com"}
+    del data["orders"][order_id]
+
+    assert data["users"][user_id]["email"] == "changed@example.com"
+    assert data["users"].peek("new_user") == {"email": "new@example.com"}
+    assert order_id not in data["orders"]
+    assert len(data["orders"]) == len(base["orders"]) - 1
+    assert len(data["users"]) == len(base["users"]) + 1
+    assert dict(data["users"].items())[user_id]["email"] == "changed@example.com"
+
+    assert other["users"][user_id] == pristine["users"][user_id]
+    assert "new_user" not in other["users"]
+    assert order_id in other["orders"]
+    assert materialize(other) == pristine
+    assert materialize(base) == pristine
+
+
+def test_iterating_does_not_copy_records():
+    data = CowDataset(load_base_data(load_data))
+    for _ in data["users"].values():
+        pass
+    assert data["users"].overlay_keys() == []
+
+
+def test_fork_is_independent_both_ways():
+    base = load_base_data(load_data)
+    user_id, other_id = list(base["users"])[:2]
+    data = CowDataset(base)
+    data["users"][user_id]["email"] = "before-fork@example.com"
+    fork = data.fork()
+    assert fork["users"][user_id]["email"] == "before-fork@example.com"
+
+    data["users"][user_id]["email"] = "after-fork@example.com"
+    fork["users"][other_id]["email"] = "in-fork@example.com"
+    del fork["users"][user_id]
+    assert data["users"][other_id]["email"] == base["users"][other_id]["email"]
+    assert user_id in data["users"]
+    assert data["users"][user_id]["email"] == "after-fork@example.com"
+    assert user_id not in fork["users"]
+
+
+def test_snapshot_ignores_later_writes():
+    base = load_base_data(load_data)
+    user_id = next(iter(base["users"]))
+    data = CowDataset(base)
+    user = data["users"][user_id]
+    user["email"] = "snapshot@example.com"
+    snapshot = data.snapshot()
+    expected = materialize(data)
+    # records looked up after the snapshot are copies, so in-place edits are safe
+    data["users"][user_id]["email"] = "later@example.com"
+    data["users"]["new_user"] = {"email": "new@example.com"}
+    restored = CowDataset(base, snapshot)
+    assert materialize(restored) == expected
+    # restoring twice from one snapshot gives independent views
+    restored["users"][user_id]["email"] = "restored@example.com"
+    assert CowDataset(base, snapshot)["users"][user_id]["email"] == "snapshot@example.com"
+
+
+def test_rollback_undoes_every_change_since_begin():
+    base = load_base_data(load_data)
+    user_id, deleted_id = list(base["users"])[:2]
+    data = CowDataset(base)
+    data["users"][user_id]["email"] = "committed@example.com"
+    expected = materialize(data)
+
+    data.begin()
+    data["users"][user_id]["email"] = "rolled-back@example.com"
+    data["users"][user_id]["payment_methods"].clear()
+    data["users"]["new_user"] = {"email": "new@example.com"}
+    del data["users"][deleted_id]
+    data.rollback()
+    assert materialize(data) == expected
+
+
+def test_commit_returns_the_writes_and_apply_redoes_them():
+    base = load_base_data(load_data)
+    user_id, deleted_id, read_id = list(base["users"])[:3]
+    data = CowDataset(base)
+    data.begin()
+    data["users"][user_id]["email"] = "written@example.com"
+    data["users"]["new_user"] = {"email": "new@example.com"}
+    del data["users"][deleted_id]
+    data["users"][read_id]
+    writes = data.commit()
+    assert sorted(writes["users"]) == sorted([user_id, "new_user", deleted_id])
+    assert writes["users"][deleted_id] is None
+
+    replayed = CowDataset(base)
+    replayed.apply(writes)
+    assert materialize(replayed) == materialize(data)
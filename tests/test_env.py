@@ -0,0 +1,275 @@
+# Copyright Sierra
+
+from typing import Any, Dict, List
+
+import pytest
+
+from conftest import make_env
+from tau_bench.envs import get_env
+from tau_bench.envs.base import Env
+from tau_bench.envs.data_hash import hash_data
+from tau_bench.envs.dataset import copy_record
+from tau_bench.envs.tool import Tool
+from tau_bench.types import RESPOND_ACTION_NAME, Action
+
+
+def run_tool_actions(env: Env) -> None:
+    for action in env.task.actions:
+        if action.name not in env.terminate_tools:
+            env.step(action)
+
+
+def first_writing_task(env: Env) -> int:
+    for task_index, task in enumerate(env.tasks):
+        if any(action.name not in env.read_only_tools for action in task.actions):
+            return task_index
+    raise AssertionError("no task writes to the data")
+
+
+def test_building_an_env_makes_no_llm_calls(mock_openai):
+    num_requests = mock_openai.num_requests
+    for user_strategy in ["llm", "react", "verify", "reflection"]:
+        get_env(
+            "retail",
+            user_strategy=user_strategy,
+            user_model="gpt-4o",
+            user_provider="openai",
+            task_split="test",
+            task_index=0,
+        )
+    assert mock_openai.num_requests == num_requests
+    # the first call is made when the env is reset
+    env = make_env()
+    env.reset(task_index=0)
+    assert mock_openai.num_requests == num_requests + 1
+
+
+def test_fork_and_restore_are_independent_of_the_original():
+    env = make_env()
+    env.reset_state(first_writing_task(env))
+    env.user.messages = [{"role": "user", "content": "hello"}]
+    actions = env.task.actions
+    env.step(actions[0])
+    snapshot = env.snapshot()
+    state = (env.get_data_hash(), list(env.actions), list(env.commit_log))
+
+    fork = env.fork()
+    assert fork.get_data_hash() == state[0] and fork.actions == state[1]
+    for action in actions[1:]:
+        fork.step(action)
+    fork.user.messages.append({"role": "assistant", "content": "fork only"})
+    assert fork.get_data_hash() != state[0]
+    assert (env.get_data_hash(), env.actions, env.commit_log) == state
+    assert env.user.messages == [{"role": "user", "content": "hello"}]
+
+    run_tool_actions(env)
+    env.restore(snapshot)
+    assert (env.get_data_hash(), env.actions, env.commit_log) == state
+    assert env.user.messages == [{"role": "user", "content": "hello"}]
+
+
+class WriteThenFail(Tool):
+    """Updates a user, then fails the way retail tools report errors."""
+
+    @staticmethod
+    def invoke(data: Dict[str, Any], user_id: str, fail: str) -> str:
+        data["users"][user_id]["email"] = "partial@example.com"
+        data["users"]["partial_user"] = {"email": "partial@example.com"}
+        if fail == "error":
+            return "Error: failed after writing"
+        elif fail == "raise":
+            raise ValueError("failed after writing")
+        return "ok"
+
+    @staticmethod
+    def get_info() -> Dict[str, Any]:
+        return {"type": "function", "function": {"name": "write_then_fail"}}
+
+
+def test_failed_tool_calls_leave_no_partial_writes():
+    env = make_env()
+    env.tools_map["write_then_fail"] = WriteThenFail
+    user_id = next(iter(env.data["users"]))
+    data_hash = env.get_data_hash()
+    for fail in ["error", "raise"]:
+        response = env.step(
+            Action(name="write_then_fail", kwargs={"user_id": user_id, "fail": fail})
+        )
+        assert response.observation.startswith("Error")
+        assert env.get_data_hash() == data_hash
+        assert "partial_user" not in env.data["users"]
+        assert env.commit_log == []
+
+    env.step(Action(name="write_then_fail", kwargs={"user_id": user_id, "fail": "no"}))
+    assert env.get_data_hash() != data_hash
+    assert len(env.commit_log) == 1
+    assert sorted(env.commit_log[0].writes["users"]) == sorted([user_id, "partial_user"])
+
+
+def test_replaying_the_commit_log_reproduces_the_data():
+    for env_name in ["retail", "airline"]:
+        env = make_env(env_name)
+        replayed = make_env(env_name)
+        for task_index in range(0, len(env.tasks), 5):
+            env.reset_state(task_index)
+            run_tool_actions(env)
+            replayed.reset_state(task_index)
+            replayed.replay_commits(env.commit_log)
+            assert replayed.get_data_hash() == env.get_data_hash(), (env_name, task_index)
+            assert replayed.commit_log == env.commit_log
+
+
+def test_ground_truth_replay_matches_a_replay_on_fresh_data():
+    for env_name in ["retail", "airline"]:
+        env = make_env(env_name)
+        for task_index, task in enumerate(env.tasks):
+            # a plain copy of the data, without the copy-on-write layer
+            data = copy_record(dict(env.base_data))
+            for action in task.actions:
+                if action.name in env.terminate_tools:
+                    continue
+                try:
+                    env.tools_map[action.name].invoke(data=data, **action.kwargs)
+                except Exception:
+                    pass
+            env.reset_state(task_index)
+            assert hash_data(env.replay_gt_actions()) == hash_data(data), (
+                env_name,
+                task_index,
+            )
+
+
+def test_grading_leaves_the_episode_state_alone():
+    env = make_env(check_outputs=False)
+    for task_index in range(0, len(env.tasks), 5):
+        env.reset_state(task_index)
+        run_tool_actions(env)
+        state = (env.get_data_hash(), list(env.actions), list(env.commit_log))
+        assert env.calculate_reward().reward == 1.0
+        assert (env.get_data_hash(), env.actions, env.commit_log) == state
+
+
+def test_wrong_writes_are_listed_in_the_data_diff():
+    env = make_env(check_outputs=False)
+    env.reset_state(first_writing_task(env))
+    run_tool_actions(env)
+    user_id = sorted(env.data["users"])[-1]
+    order_id = sorted(env.data["orders"])[-1]
+    env.data["users"][user_id]["email"] = "wrong@example.com"
+    del env.data["orders"][order_id]
+    reward = env.calculate_reward()
+    assert reward.reward == 0.0
+    assert not reward.info.r_actions
+    assert reward.info.data_diff == [f"orders/{order_id}", f"users/{user_id}"]
+
+
+def test_read_only_lookups_leave_the_data_diff_empty():
+    env = make_env(check_outputs=False)
+    env.reset_state(first_writing_task(env))
+    run_tool_actions(env)
+    user_id = sorted(env.data["users"])[-1]
+    env.step(Action(name="get_user_details", kwargs={"user_id": user_id}))
+    # a lookup copies the record into the env's own layer without changing it
+    assert user_id in env.data["users"]._overlay
+    reward = env.calculate_reward()
+    assert reward.reward == 1.0
+    assert reward.info.r_actions
+    assert reward.info.data_diff == []
+
+
+def test_stale_cached_ground_truth_hash_falls_back_to_the_replay(monkeypatch):
+    env = make_env(check_outputs=False)
+    env.reset_state(first_writing_task(env))
+    run_tool_actions(env)
+    monkeypatch.setattr(env, "get_cached_gt_data_hash", lambda: "stale")
+    replays = []
+    replay = env.replay_gt_actions
+
+    def _replay():
+        replays.append(env.task_index)
+        return replay()
+
+    monkeypatch.setattr(env, "replay_gt_actions", _replay)
+    reward = env.calculate_reward()
+    assert replays == [env.task_index]
+    assert reward.reward == 1.0
+    assert reward.info.gt_data_hash == env.get_data_hash()
+
+
+def count_invocations(env: Env, tool_name: str) -> List[Dict[str, Any]]:
+    calls: List[Dict[str, Any]] = []
+    tool = env.tools_map[tool_name]
+
+    class Counted(tool):
+        @staticmethod
+        def invoke(data: Dict[str, Any], **kwargs) -> str:
+            calls.append(kwargs)
+            return tool.invoke(data=data, **kwargs)
+
+    env.tools_map[tool_name] = Counted
+    return calls
+
+
+def test_tool_calls_of_a_turn_match_stepping_them_one_by_one():
+    env = make_env()
+    stepped = env.fork()
+    user_id = next(iter(env.data["users"]))
+    actions = [
+        Action(name="get_user_details", kwargs={"user_id": user_id}),
+        Action(name="get_user_details", kwargs={"user_id": "missing"}),
+        Action(name="list_all_product_types", kwargs={}),
+    ]
+    responses = env.step_tool_calls(actions)
+    assert responses == [stepped.step(action) for action in actions]
+    assert env.actions == stepped.actions == actions
+
+
+def test_identical_read_only_calls_run_once_until_a_write():
+    env = make_env()
+    calls = count_invocations(env, "get_user_details")
+    user_id = next(iter(env.data["users"]))
+    read = Action(name="get_user_details", kwargs={"user_id": user_id})
+    address = {
+        "address1": "1 Main St",
+        "address2": "",
+        "city": "Springfield",
+        "state": "IL",
+        "country": "USA",
+        "zip": "62701",
+    }
+    write = Action(name="modify_user_address", kwargs={"user_id": user_id, **address})
+    responses = env.step_tool_calls([read, read, write, read])
+    # the write can change what the read returns, so it is run again after it
+    assert len(calls) == 2
+    assert responses[0] == responses[1]
+    assert "1 Main St" not in responses[1].observation
+    assert "1 Main St" in responses[3].observation
+    assert env.actions == [read, read, write, read]
+
+
+def test_a_call_that_ends_the_episode_ends_the_turn():
+    env = make_env()
+    user_id = next(iter(env.data["users"]))
+    responses = env.step_tool_calls(
+        [
+            Action(name="transfer_to_human_agents", kwargs={"summary": "help"}),
+            Action(name="get_user_details", kwargs={"user_id": user_id}),
+        ]
+    )
+    assert len(responses) == 1 and responses[0].done
+    assert len(env.actions) == 1
+
+
+def test_a_respond_call_among_tool_calls_gets_an_error():
+    env = make_env()
+    user_id = next(iter(env.data["users"]))
+    lookup = Action(name="get_user_details", kwargs={"user_id": user_id})
+    responses = env.step_tool_calls(
+        [Action(name=RESPOND_ACTION_NAME, kwargs={"content": "hi"}), lookup]
+    )
+    assert len(responses) == 2
+    assert responses[0].observation.startswith("Error")
+    assert not responses[0].done and responses[0].info.source == RESPOND_ACTION_NAME
+    assert "first_name" in responses[1].observation
+    # the user never saw the response
+    assert env.actions == [lookup]
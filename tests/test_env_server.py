@@ -0,0 +1,212 @@
+# Copyright Sierra
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http import HTTPStatus
+from typing import Any, Dict, Tuple
+
+import pytest
+
+from tau_bench.env_server import EnvServer, SessionManager, SessionNotFoundError, _dispatch
+
+# the LLM user makes no call until it is reset, and these tests never reset it
+PARAMS: Dict[str, Any] = {
+    "env": "retail",
+    "task_split": "test",
+    "user_strategy": "llm",
+    "user_model": "gpt-4o",
+    "user_provider": "openai",
+}
+
+
+def start(manager: SessionManager, task_index: int = 0) -> str:
+    session = manager.create(PARAMS)
+    session.env.reset_state(task_index)
+    session.started = True
+    return session.session_id
+
+
+class SlowPool(object):
+    def acquire(self) -> object:
+        time.sleep(0.05)
+        return object()
+
+    def release(self, env: object) -> None:
+        pass
+
+
+def test_create_get_close():
+    manager = SessionManager()
+    session = manager.create(PARAMS)
+    assert manager.get(session.session_id) is session
+    manager.close(session.session_id)
+    with pytest.raises(SessionNotFoundError):
+        manager.get(session.session_id)
+    with pytest.raises(SessionNotFoundError):
+        manager.close(session.session_id)
+
+
+def test_max_sessions():
+    manager = SessionManager(max_sessions=2)
+    manager.create(PARAMS)
+    session = manager.create(PARAMS)
+    with pytest.raises(OverflowError):
+        manager.create(PARAMS)
+    manager.close(session.session_id)
+    manager.create(PARAMS)
+
+
+def test_max_sessions_under_concurrent_creates():
+    manager = SessionManager(max_sessions=3)
+    manager._get_pool = lambda key: SlowPool()
+    outcomes = []
+
+    def create() -> None:
+        try:
+            manager.create(PARAMS)
+            outcomes.append("created")
+        except OverflowError:
+            outcomes.append("full")
+
+    threads = [threading.Thread(target=create) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outcomes.count("created") == 3
+    assert len(manager.sessions) == 3
+
+
+def test_evict_idle():
+    manager = SessionManager(idle_timeout=0.05)
+    idle = manager.create(PARAMS)
+    time.sleep(0.1)
+    active = manager.create(PARAMS)
+    assert manager.evict_idle() == 1
+    assert manager.stats()["evicted"] == 1
+    with pytest.raises(SessionNotFoundError):
+        manager.get(idle.session_id)
+    assert idle.closed
+    assert manager.get(active.session_id) is active
+
+
+def test_pooled_env_is_reused_but_not_started():
+    manager = SessionManager()
+    session_id = start(manager)
+    env = manager.get(session_id).env
+    manager.close(session_id)
+    session = manager.create(PARAMS)
+    assert session.env is env
+    assert not session.started
+    with pytest.raises(ValueError):
+        _dispatch(manager, "POST", f"/sessions/{session.session_id}/grade", {})
+
+
+def test_request_on_session_closed_while_waiting():
+    manager = SessionManager()
+    session_id = start(manager)
+    get = manager.get
+
+    def get_then_close(session_id: str):
+        # the session is closed between the lookup and taking its lock
+        session = get(session_id)
+        manager.close(session_id)
+        return session
+
+    manager.get = get_then_close
+    with pytest.raises(SessionNotFoundError):
+        _dispatch(
+            manager,
+            "POST",
+            f"/sessions/{session_id}/step",
+            {"name": "think", "kwargs": {"thought": "x"}},
+        )
+
+
+def test_dispatch_routes():
+    manager = SessionManager()
+    status, created = _dispatch(manager, "POST", "/sessions", PARAMS)
+    assert status == HTTPStatus.OK
+    session_id = created["session_id"]
+    assert len(created["tools_info"]) > 0 and len(created["wiki"]) > 0
+    with pytest.raises(ValueError):
+        _dispatch(manager, "POST", f"/sessions/{session_id}/step", {"name": "think"})
+    session = manager.get(session_id)
+    session.env.reset_state(0)
+    session.started = True
+    for action in session.env.task.actions:
+        status, response = _dispatch(
+            manager,
+            "POST",
+            f"/sessions/{session_id}/step",
+            {"name": action.name, "kwargs": action.kwargs},
+        )
+        assert status == HTTPStatus.OK and "observation" in response
+    status, first = _dispatch(manager, "POST", f"/sessions/{session_id}/grade", {})
+    assert status == HTTPStatus.OK and first["reward"] == 1.0
+    # grading leaves the state alone, so it can be repeated
+    _, second = _dispatch(manager, "POST", f"/sessions/{session_id}/grade", {})
+    assert second["reward"] == 1.0
+    assert _dispatch(manager, "GET", "/health", {})[1]["sessions"] == 1
+    assert _dispatch(manager, "DELETE", f"/sessions/{session_id}", {})[0] == HTTPStatus.OK
+    assert _dispatch(manager, "GET", "/nope", {})[0] == HTTPStatus.NOT_FOUND
+    assert _dispatch(manager, "PUT", "/sessions/x/step", {})[0] == HTTPStatus.NOT_FOUND
+    with pytest.raises(ValueError):
+        _dispatch(manager, "POST", "/sessions", {"user_strategy": "human"})
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {},
+        {"task_index": None},
+        {"task_index": -1},
+        {"task_index": 115},
+        {"task_index": "3"},
+        {"task_index": 1.0},
+        {"task_index": True},
+    ],
+)
+def test_reset_rejects_missing_or_invalid_task_index(body):
+    manager = SessionManager()
+    session = manager.create(PARAMS)
+    assert len(session.env.tasks) == 115
+    with pytest.raises(ValueError, match="task_index must be an integer from 0 to 114"):
+        _dispatch(manager, "POST", f"/sessions/{session.session_id}/reset", body)
+    assert not session.started
+
+
+def test_server_round_trip():
+    server = EnvServer(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def request(method: str, path: str, body: Dict[str, Any] = {}) -> Tuple[int, Any]:
+        url = f"http://127.0.0.1:{server.server_address[1]}{path}"
+        req = urllib.request.Request(
+            url, method=method, data=json.dumps(body).encode("utf-8")
+        )
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        status, health = request("GET", "/health")
+        assert status == HTTPStatus.OK and health["sessions"] == 0
+        status, error = request("POST", "/sessions/nope/reset")
+        assert status == HTTPStatus.NOT_FOUND and "nope" in error["error"]
+        status, created = request("POST", "/sessions", PARAMS)
+        assert status == HTTPStatus.OK
+        for body in [{}, {"task_index": 115}]:
+            status, error = request(
+                "POST", f"/sessions/{created['session_id']}/reset", body
+            )
+            assert status == HTTPStatus.BAD_REQUEST
+            assert "task_index must be an integer from 0 to 114" in error["error"]
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,138 @@
+# Copyright Sierra
+
+import os
+
+import pytest
+
+from conftest import make_env
+from tau_bench.envs import gt_hashes
+from tau_bench.envs.airline.data import load_data as load_airline_data
+from tau_bench.envs.base import Env
+from tau_bench.envs.data_hash import hash_data
+from tau_bench.envs.dataset import CowDataset, copy_record, load_base_data
+from tau_bench.envs.gt_hashes import (
+    build_gt_hash_index,
+    get_index_path,
+    load_gt_hash_index,
+    save_gt_hash_index,
+)
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    # indexes are written to a scratch folder and loaded afresh by every test
+    monkeypatch.setattr(gt_hashes, "FOLDER_PATH", str(tmp_path))
+    monkeypatch.setattr(gt_hashes, "_index_cache", {})
+    os.makedirs(tmp_path / "airline")
+    return tmp_path
+
+
+@pytest.fixture(scope="module")
+def index():
+    return build_gt_hash_index("airline", "test")
+
+
+def count_replays(env: Env, monkeypatch) -> list:
+    calls = []
+    replay = env.replay_gt_actions
+
+    def _replay():
+        calls.append(env.task_index)
+        return replay()
+
+    monkeypatch.setattr(env, "replay_gt_actions", _replay)
+    return calls
+
+
+def run_gt_actions(env: Env) -> None:
+    for action in env.task.actions:
+        if action.name in env.tools_map and action.name not in env.terminate_tools:
+            env.step(action)
+
+
+def test_cached_hash_matches_replayed_ground_truth(index, monkeypatch):
+    save_gt_hash_index(index)
+    env = make_env("airline", check_outputs=False)
+    assert len(index.entries) == len(env.tasks)
+    for task_index in range(len(env.tasks)):
+        env.reset_state(task_index)
+        assert env.get_cached_gt_data_hash() == hash_data(env.replay_gt_actions())
+
+    env.reset_state(1)
+    run_gt_actions(env)
+    replays = count_replays(env, monkeypatch)
+    reward = env.calculate_reward()
+    assert reward.reward == 1.0
+    assert reward.info.gt_data_hash == env.get_data_hash()
+    # a matching cached hash settles the grade without a replay
+    assert replays == []
+
+
+def test_changed_data_invalidates_entry(index, monkeypatch):
+    save_gt_hash_index(index)
+
+    def load_changed_data():
+        data = copy_record(load_airline_data())
+        user_id = next(iter(data["users"]))
+        data["users"][user_id]["email"] = "changed@example.com"
+        return data
+
+    env = make_env("airline", task_index=1, check_outputs=False)
+    env.base_data = load_base_data(load_changed_data)
+    env.reset_state(1)
+    assert env.get_cached_gt_data_hash() is None
+
+    run_gt_actions(env)
+    replays = count_replays(env, monkeypatch)
+    reward = env.calculate_reward()
+    assert replays == [1]
+    assert reward.reward == 1.0
+    assert reward.info.gt_data_hash == hash_data(env.replay_gt_actions())
+    assert reward.info.gt_data_hash != index.entries[1].gt_data_hash
+
+
+def test_changed_task_actions_invalidate_entry(index, monkeypatch):
+    save_gt_hash_index(index)
+    env = make_env("airline", task_index=1, check_outputs=False)
+    assert env.get_cached_gt_data_hash() is not None
+    env.task = env.task.model_copy(update={"actions": env.task.actions[:-1]})
+    assert env.get_cached_gt_data_hash() is None
+
+    run_gt_actions(env)
+    replays = count_replays(env, monkeypatch)
+    reward = env.calculate_reward()
+    assert replays == [1]
+    assert reward.reward == 1.0
+
+
+def test_hash_version_mismatch_is_ignored(index):
+    stale = index.model_copy(deep=True)
+    for entry in stale.entries.values():
+        entry.hash_version += 1
+    save_gt_hash_index(stale)
+    env = make_env("airline", task_index=1)
+    assert env.get_cached_gt_data_hash() is None
+
+
+def test_missing_index_falls_back_to_replay(monkeypatch):
+    assert load_gt_hash_index("airline", "test") is None
+    env = make_env("airline", task_index=1, check_outputs=False)
+    assert env.get_cached_gt_data_hash() is None
+    run_gt_actions(env)
+    replays = count_replays(env, monkeypatch)
+    assert env.calculate_reward().reward == 1.0
+    assert replays == [1]
+
+
+@pytest.mark.parametrize(
+    "content", ['{"env": "airline", "task_split": "te', '{"entries": []}', "\x00\xff"]
+)
+def test_corrupt_index_falls_back_to_replay(content, monkeypatch):
+    with open(get_index_path("airline", "test"), "w") as f:
+        f.write(content)
+    assert load_gt_hash_index("airline", "test") is None
+    env = make_env("airline", task_index=1, check_outputs=False)
+    run_gt_actions(env)
+    replays = count_replays(env, monkeypatch)
+    assert env.calculate_reward().reward == 1.0
+    assert replays == [1]
@@ -0,0 +1,197 @@
+# Copyright Sierra
+
+import asyncio
+import threading
+import time
+
+import litellm
+import pytest
+
+from tau_bench.llm import (
+    DEFAULT_OUTPUT_TOKENS,
+    AdaptiveLimiter,
+    LLMController,
+    ModelRateLimiter,
+    RateLimit,
+    RatePacer,
+    parse_rate_limit,
+)
+
+
+def rate_limit_error() -> litellm.RateLimitError:
+    return litellm.RateLimitError("slow down", llm_provider="openai", model="gpt-4o")
+
+
+def flaky(num_failures: int, error=rate_limit_error):
+    calls = []
+
+    def call(**kwargs):
+        calls.append(kwargs)
+        if len(calls) <= num_failures:
+            raise error()
+        return "ok"
+
+    return call, calls
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    call, calls = flaky(2)
+    monkeypatch.setattr(litellm, "completion", call)
+    controller = LLMController(max_retries=2, base_delay=0.0)
+    assert controller.completion(model="gpt-4o") == "ok"
+    assert len(calls) == 3
+    assert controller.stats()["retries"] == 2
+
+
+def test_retries_give_up_after_max_retries(monkeypatch):
+    call, calls = flaky(5)
+    monkeypatch.setattr(litellm, "completion", call)
+    with pytest.raises(litellm.RateLimitError):
+        LLMController(max_retries=2, base_delay=0.0).completion(model="gpt-4o")
+    assert len(calls) == 3
+
+
+def test_other_errors_are_not_retried(monkeypatch):
+    call, calls = flaky(1, error=lambda: ValueError("bad request"))
+    monkeypatch.setattr(litellm, "completion", call)
+    with pytest.raises(ValueError):
+        LLMController(max_retries=2, base_delay=0.0).completion(model="gpt-4o")
+    assert len(calls) == 1
+
+
+def test_async_calls_are_retried(monkeypatch):
+    call, calls = flaky(1)
+
+    async def acall(**kwargs):
+        return call(**kwargs)
+
+    monkeypatch.setattr(litellm, "acompletion", acall)
+    controller = LLMController(max_retries=1, base_delay=0.0, adaptive=True)
+    assert asyncio.run(controller.acompletion(model="openai/gpt-4o")) == "ok"
+    assert len(calls) == 2
+    limiter = controller.limiters["openai"]
+    assert limiter.in_flight == 0
+    assert limiter.stats()["congestion_errors"] == 1
+
+
+def test_limit_halves_once_per_congestion_window():
+    limiter = AdaptiveLimiter(initial_limit=8, max_limit=16)
+    started_at = limiter.acquire()
+    limiter.release()
+    limiter.on_congestion(started_at)
+    assert int(limiter.limit) == 4
+    # errors of calls that started before the decrease are ignored
+    limiter.on_congestion(started_at)
+    assert int(limiter.limit) == 4
+    limiter.on_congestion(limiter.acquire())
+    limiter.release()
+    assert int(limiter.limit) == 2
+    for _ in range(10):
+        limiter.on_congestion(time.monotonic())
+    assert limiter.limit == limiter.min_limit
+
+
+def test_limit_grows_additively_on_success():
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=3)
+    # about one step per `limit` successes
+    for expected_limit in [2, 2, 3]:
+        limiter.on_success(limiter.acquire())
+        limiter.release()
+        assert int(limiter.limit) == expected_limit
+    for _ in range(10):
+        limiter.on_success(limiter.acquire())
+        limiter.release()
+    assert limiter.limit == 3
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    limiter.acquire()
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.05)
+    limiter.release()
+    assert acquired.wait(1.0)
+    thread.join()
+    assert limiter.in_flight == 1
+
+
+def test_cancelled_async_waiter_gives_back_its_slot():
+    async def main():
+        limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+        await limiter.aacquire()
+        waiter = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        await asyncio.wait_for(limiter.aacquire(), 1.0)
+        return limiter
+
+    assert asyncio.run(main()).in_flight == 1
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_pacer_allows_a_burst_then_spaces_calls(frozen_clock):
+    # one unit per second, with one second of burst
+    pacer = RatePacer(per_minute=60, burst_seconds=1.0)
+    assert [pacer.reserve(1) for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+    frozen_clock[0] += 10
+    assert pacer.reserve(1) == 0.0
+
+
+def test_pacer_adjust_corrects_a_reservation(frozen_clock):
+    pacer = RatePacer(per_minute=60, burst_seconds=0.0)
+    assert pacer.reserve(10) == 0.0
+    pacer.adjust(-8)
+    assert pacer.reserve(1) == 2.0
+
+
+def test_model_rate_limiter_books_tokens_and_learns_output_size(frozen_clock):
+    limiter = ModelRateLimiter(RateLimit(requests_per_minute=600, tokens_per_minute=6000))
+    assert limiter.estimate_tokens(100, 50) == 150
+    assert limiter.estimate_tokens(100, None) == 100 + DEFAULT_OUTPUT_TOKENS
+    assert limiter.reserve(100) == 0.0
+    limiter.settle(100, 120, prompt_tokens=100)
+    assert limiter.output_tokens == pytest.approx(0.9 * DEFAULT_OUTPUT_TOKENS + 2.0)
+    # 120 tokens booked at 100 per second, with one second of burst
+    assert limiter.reserve(100) == pytest.approx(0.2)
+
+
+def test_parse_rate_limit():
+    assert parse_rate_limit("openai/gpt-4o:500:30000") == (
+        ("openai", "gpt-4o"),
+        RateLimit(requests_per_minute=500, tokens_per_minute=30000),
+    )
+    assert parse_rate_limit("anthropic/*:50:") == (
+        ("anthropic", "*"),
+        RateLimit(requests_per_minute=50),
+    )
+    with pytest.raises(ValueError):
+        parse_rate_limit("gpt-4o:500")
+
+
+def test_wildcard_rate_limit_applies_per_model():
+    controller = LLMController(
+        rate_limits=dict(
+            parse_rate_limit(spec) for spec in ["openai/*:60:", "openai/gpt-4o:600:"]
+        )
+    )
+    exact = controller.get_rate_limiter("openai", "gpt-4o")
+    assert exact.requests.rate == 10
+    mini = controller.get_rate_limiter("openai", "gpt-4o-mini")
+    assert mini.requests.rate == 1
+    assert controller.get_rate_limiter("openai", "o1") is not mini
+    assert controller.get_rate_limiter("anthropic", "claude") is None
@@ -0,0 +1,135 @@
+# Copyright Sierra
+
+import asyncio
+import time
+
+import pytest
+
+from tau_bench.envs.vec_env import VecEnv
+from tau_bench.llm import LockstepBarrier, _lockstep
+from tau_bench.run import run
+from tau_bench.types import RunConfig
+
+
+def test_full_round_releases_together():
+    async def main():
+        barrier = LockstepBarrier(3, max_wait=10.0)
+        released = []
+
+        async def member(i):
+            await barrier.wait()
+            released.append(i)
+
+        tasks = [asyncio.create_task(member(i)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        assert released == []
+        await asyncio.gather(member(2), *tasks)
+        return barrier, released
+
+    barrier, released = asyncio.run(main())
+    assert sorted(released) == [0, 1, 2]
+    assert barrier.round_sizes == [3]
+
+
+def test_max_wait_releases_partial_round():
+    async def main():
+        barrier = LockstepBarrier(3, max_wait=0.05)
+        await asyncio.wait_for(asyncio.gather(barrier.wait(), barrier.wait()), 1.0)
+        return barrier
+
+    assert asyncio.run(main()).round_sizes == [2]
+
+
+def test_leave_mid_round_releases_waiters():
+    async def main():
+        barrier = LockstepBarrier(3, max_wait=10.0)
+        waiters = asyncio.gather(barrier.wait(), barrier.wait())
+        await asyncio.sleep(0.05)
+        barrier.leave()
+        await asyncio.wait_for(waiters, 1.0)
+        return barrier
+
+    barrier = asyncio.run(main())
+    assert barrier.num_active == 2
+    assert barrier.round_sizes == [2]
+
+
+def test_cancelled_waiter_leaves_round():
+    async def main():
+        barrier = LockstepBarrier(2, max_wait=10.0)
+        waiter = asyncio.create_task(barrier.wait())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert barrier._pending == []
+        assert barrier._timer is None
+        # the cancelled call must not fill the next round
+        second = asyncio.create_task(barrier.wait())
+        await asyncio.sleep(0.05)
+        assert not second.done()
+        await asyncio.wait_for(asyncio.gather(second, barrier.wait()), 1.0)
+        return barrier
+
+    assert asyncio.run(main()).round_sizes == [2]
+
+
+def test_run_queue_refills_finished_members():
+    durations = [0.3, 0.05, 0.05, 0.05, 0.05]
+
+    async def episode(item, env):
+        position, duration = item
+        await asyncio.sleep(duration)
+        return env
+
+    async def main():
+        queue = iter(enumerate(durations))
+        vec_env = VecEnv(["a", "b"], max_wait=0.01)
+        start = asyncio.get_running_loop().time()
+        results = await vec_env.run_queue(queue, episode)
+        return results, asyncio.get_running_loop().time() - start
+
+    results, elapsed = asyncio.run(main())
+    assert sorted(position for (position, _), _ in results) == [0, 1, 2, 3, 4]
+    # the short episodes all ran on the env that was not held by the long one
+    assert {env for (position, _), env in results if position > 0} == {"b"}
+    assert elapsed < 0.45
+
+
+def test_member_outside_barrier_does_not_stall_rounds():
+    async def episode(i, env):
+        if i == 0:
+            # e.g. an agent whose LLM calls run in a worker thread
+            await asyncio.to_thread(time.sleep, 0.5)
+        else:
+            for _ in range(3):
+                await _lockstep.get().wait()
+        return asyncio.get_running_loop().time()
+
+    async def main():
+        vec_env = VecEnv(["a", "b"], max_wait=0.05)
+        start = asyncio.get_running_loop().time()
+        finished = await vec_env.run(episode)
+        return vec_env, [t - start for t in finished]
+
+    vec_env, finished = asyncio.run(main())
+    assert vec_env.round_sizes == [1, 1, 1]
+    # each round waits `max_wait`, not the default 2 seconds
+    assert finished[1] < 0.4
+
+
+@pytest.mark.parametrize(
+    "agent_strategy,user_strategy",
+    [("few-shot", "llm"), ("tool-calling", "verify"), ("tool-calling", "reflection")],
+)
+def test_run_rejects_lockstep_without_async_llm_calls(agent_strategy, user_strategy):
+    config = RunConfig(
+        model_provider="openai",
+        user_model_provider="openai",
+        model="gpt-4o",
+        agent_strategy=agent_strategy,
+        user_strategy=user_strategy,
+        use_async=True,
+        vec_env_size=2,
+    )
+    with pytest.raises(AssertionError, match="--vec-env-size"):
+        run(config)
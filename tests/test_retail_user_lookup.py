@@ -0,0 +1,67 @@
+# Copyright Sierra
+
+from typing import Any, Dict
+
+from tau_bench.envs.dataset import CowDataset, load_base_data
+from tau_bench.envs.retail.data import load_data
+from tau_bench.envs.retail.tools.find_user_id_by_email import FindUserIdByEmail
+from tau_bench.envs.retail.tools.find_user_id_by_name_zip import FindUserIdByNameZip
+
+
+def scan_by_name_zip(data: Dict[str, Any], first_name: str, last_name: str, zip: str) -> str:
+    # find_user_id_by_name_zip before the index
+    for user_id, profile in data["users"].items():
+        if (
+            profile["name"]["first_name"].lower() == first_name.lower()
+            and profile["name"]["last_name"].lower() == last_name.lower()
+            and profile["address"]["zip"] == zip
+        ):
+            return user_id
+    return "Error: user not found"
+
+
+def scan_by_email(data: Dict[str, Any], email: str) -> str:
+    # find_user_id_by_email before the index
+    for user_id, profile in data["users"].items():
+        if profile["email"].lower() == email.lower():
+            return user_id
+    return "Error: user not found"
+
+
+def check_every_user(data: Dict[str, Any]) -> None:
+    for profile in list(data["users"].values()):
+        name, zip = profile["name"], profile["address"]["zip"]
+        for first_name, last_name in [
+            (name["first_name"], name["last_name"]),
+            (name["first_name"].upper(), name["last_name"].lower()),
+        ]:
+            assert FindUserIdByNameZip.invoke(
+                data, first_name, last_name, zip
+            ) == scan_by_name_zip(data, first_name, last_name, zip)
+        for email in [profile["email"], profile["email"].upper()]:
+            assert FindUserIdByEmail.invoke(data, email) == scan_by_email(data, email)
+
+
+def test_lookups_match_the_scans():
+    data = CowDataset(load_base_data(load_data))
+    check_every_user(data)
+    assert FindUserIdByEmail.invoke(data, "nobody@example.com") == "Error: user not found"
+    assert (
+        FindUserIdByNameZip.invoke(data, "No", "Body", "00000") == "Error: user not found"
+    )
+
+
+def test_lookups_see_writes_to_indexed_fields():
+    data = CowDataset(load_base_data(load_data))
+    user_ids = list(data["users"].base_table)
+    first, second = data["users"][user_ids[0]], data["users"][user_ids[1]]
+    email = first["email"]
+    # a user takes over another's email, name and zip, and a new user copies the first
+    second["email"] = email.upper()
+    second["name"] = dict(first["name"])
+    second["address"] = {**second["address"], "zip": first["address"]["zip"]}
+    data["users"]["new_user"] = {**first, "email": "new@example.com"}
+    del data["users"][user_ids[2]]
+    first["email"] = "moved@example.com"
+    check_every_user(data)
+    assert FindUserIdByEmail.invoke(data, email) == scan_by_email(data, email)
@@ -0,0 +1,80 @@
+# Copyright Sierra
+
+from typing import Dict, List, Tuple
+
+import pytest
+
+from tau_bench import llm
+from tau_bench import run as run_module
+from tau_bench.envs.pool import EnvPool
+from tau_bench.run import run
+from tau_bench.types import EnvRunResult, RunConfig
+
+
+def run_config(log_dir: str, **kwargs) -> RunConfig:
+    return RunConfig(
+        model_provider="openai",
+        user_model_provider="openai",
+        model="gpt-4o",
+        env="retail",
+        task_split="test",
+        task_ids=[0, 1, 2, 3, 4],
+        num_trials=2,
+        log_dir=log_dir,
+        **kwargs,
+    )
+
+
+def by_episode(results: List[EnvRunResult]) -> Dict[Tuple[int, int], EnvRunResult]:
+    return {(result.task_id, result.trial): result for result in results}
+
+
+def test_async_run_matches_threaded_run(tmp_path, mock_openai):
+    threaded = by_episode(
+        run(run_config(str(tmp_path / "threaded"), max_concurrency=4))
+    )
+    in_async = by_episode(
+        run(run_config(str(tmp_path / "async"), max_concurrency=4, use_async=True))
+    )
+    assert len(threaded) == 10
+    assert in_async.keys() == threaded.keys()
+    for episode, result in threaded.items():
+        assert "error" not in result.info
+        assert in_async[episode].reward == result.reward
+        assert in_async[episode].traj == result.traj
+        assert in_async[episode].cost == result.cost
+        assert result.cost.total.cost > 0
+        assert set(result.cost.by_component) == {"agent_llm", "user_llm"}
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_run_reuses_envs_across_episodes(tmp_path, mock_openai, monkeypatch, use_async):
+    pools: List[EnvPool] = []
+
+    class RecordedPool(EnvPool):
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            pools.append(self)
+
+    monkeypatch.setattr(run_module, "EnvPool", RecordedPool)
+    results = run(run_config(str(tmp_path), max_concurrency=3, use_async=use_async))
+    assert len(results) == 10
+    assert len(pools) == 1
+    assert pools[0].num_created <= 3
+
+
+def test_run_replays_its_recording_and_unsets_the_cassette(tmp_path, mock_openai):
+    path = str(tmp_path / "calls.jsonl.gz")
+    recorded = by_episode(
+        run(run_config(str(tmp_path / "record"), cassette=path, cassette_mode="record"))
+    )
+    assert llm._cassette is None
+    num_requests = mock_openai.num_requests
+    replayed = by_episode(
+        run(run_config(str(tmp_path / "replay"), cassette=path, cassette_mode="replay"))
+    )
+    assert llm._cassette is None
+    assert mock_openai.num_requests == num_requests
+    assert {episode: result.traj for episode, result in replayed.items()} == {
+        episode: result.traj for episode, result in recorded.items()
+    }
@@ -0,0 +1,120 @@
+# Copyright Sierra
+
+import random
+from typing import Optional
+
+import pytest
+
+from tau_bench.checkpoint import CheckpointWriter
+from tau_bench.schedule import load_task_durations, order_episodes
+from tau_bench.types import EnvRunResult, EpisodeCost, EpisodeTiming, RunConfig, Usage
+
+CONFIG = RunConfig(model_provider="openai", user_model_provider="openai", model="gpt-4o")
+
+# the tasks of each trial, as drawn (the second trial is shuffled)
+TRIAL_TASK_IDS = [[0, 1, 2], [2, 0, 1]]
+
+
+def test_order_by_trial():
+    assert order_episodes(TRIAL_TASK_IDS, "trial") == [
+        (0, 0), (1, 0), (2, 0), (2, 1), (0, 1), (1, 1),
+    ]
+
+
+def test_order_by_task_keeps_first_trial_order():
+    assert order_episodes(TRIAL_TASK_IDS, "task") == [
+        (0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 1),
+    ]
+
+
+def test_random_order_is_a_seeded_permutation():
+    random.seed(0)
+    first = order_episodes(TRIAL_TASK_IDS, "random")
+    random.seed(0)
+    assert order_episodes(TRIAL_TASK_IDS, "random") == first
+    assert sorted(first) == sorted(order_episodes(TRIAL_TASK_IDS, "trial"))
+
+
+def test_longest_first_uses_mean_duration_for_unknown_tasks():
+    # task 1 has no history and gets the mean duration of 2.0
+    assert order_episodes(TRIAL_TASK_IDS, "longest-first", {0: 1.0, 2: 3.0}) == [
+        (2, 0), (2, 1), (1, 0), (1, 1), (0, 0), (0, 1),
+    ]
+    assert order_episodes(TRIAL_TASK_IDS, "longest-first", {}) == order_episodes(
+        TRIAL_TASK_IDS, "trial"
+    )
+
+
+def test_unknown_order():
+    with pytest.raises(ValueError):
+        order_episodes(TRIAL_TASK_IDS, "shortest-first")
+
+
+def make_result(
+    task_id: int,
+    trial: int = 0,
+    num_messages: int = 1,
+    tokens: Optional[int] = None,
+    wall_time: Optional[float] = None,
+    error: bool = False,
+) -> EnvRunResult:
+    return EnvRunResult(
+        task_id=task_id,
+        reward=0.0,
+        info={"error": "boom"} if error else {},
+        traj=[{"role": "user", "content": "x"}] * num_messages,
+        trial=trial,
+        timing=(
+            EpisodeTiming(total=wall_time, by_component={}, spans=[])
+            if wall_time is not None
+            else None
+        ),
+        cost=(
+            EpisodeCost(
+                total=Usage(calls=1, input_tokens=tokens, output_tokens=0), by_component={}
+            )
+            if tokens is not None
+            else None
+        ),
+    )
+
+
+def write_history(tmp_path, *results: EnvRunResult, config: RunConfig = CONFIG) -> None:
+    with CheckpointWriter(str(tmp_path / f"run-{config.env}.jsonl"), config=config) as writer:
+        for result in results:
+            writer.write(result)
+
+
+def test_task_durations_prefer_wall_time(tmp_path):
+    write_history(
+        tmp_path,
+        make_result(0, num_messages=10, tokens=100, wall_time=1.0),
+        make_result(0, trial=1, num_messages=10, tokens=100, wall_time=3.0),
+        make_result(1, num_messages=2, tokens=900, wall_time=5.0),
+    )
+    assert load_task_durations([str(tmp_path)], CONFIG) == {0: 2.0, 1: 5.0}
+
+
+def test_task_durations_fall_back_to_tokens_then_trajectory_length(tmp_path):
+    write_history(
+        tmp_path,
+        make_result(0, num_messages=10, tokens=100, wall_time=1.0),
+        make_result(1, num_messages=2, tokens=900),
+    )
+    assert load_task_durations([str(tmp_path)], CONFIG) == {0: 100.0, 1: 900.0}
+    write_history(tmp_path, make_result(2, num_messages=4))
+    assert load_task_durations([str(tmp_path)], CONFIG) == {0: 10.0, 1: 2.0, 2: 4.0}
+
+
+def test_task_durations_skip_errors_and_other_envs(tmp_path):
+    write_history(
+        tmp_path,
+        make_result(0, num_messages=3),
+        make_result(1, num_messages=50, error=True),
+    )
+    write_history(
+        tmp_path,
+        make_result(2, num_messages=7),
+        config=CONFIG.model_copy(update={"env": "airline"}),
+    )
+    assert load_task_durations([str(tmp_path)], CONFIG) == {0: 3.0}
@@ -0,0 +1,115 @@
+# Copyright Sierra
+
+import asyncio
+import contextvars
+import threading
+import time
+
+from conftest import make_env
+from tau_bench.run import display_timing
+from tau_bench.timing import current_component, record_spans, span
+from tau_bench.types import Action, EnvRunResult, EpisodeTiming, Span
+
+
+def test_nested_spans_count_towards_the_innermost_component():
+    with record_spans() as recorder:
+        with span("reward"):
+            time.sleep(0.02)
+            with span("tool", "update_user"):
+                assert current_component() == "reward"
+                time.sleep(0.1)
+    timing = recorder.timing()
+    assert [(s.component, s.name) for s in timing.spans] == [
+        ("tool", "update_user"),
+        ("reward", None),
+    ]
+    assert timing.by_component["tool"] >= 0.1
+    assert 0.02 <= timing.by_component["reward"] < 0.1
+    assert sum(timing.by_component.values()) <= timing.total
+
+
+def test_spans_in_worker_threads_land_on_their_episode():
+    def work(name):
+        with span("tool", name):
+            time.sleep(0.01)
+
+    with record_spans() as recorder:
+        context = contextvars.copy_context()
+        thread = threading.Thread(target=context.run, args=(work, "in_thread"))
+        thread.start()
+        thread.join()
+
+        async def main():
+            await asyncio.to_thread(work, "to_thread")
+
+        asyncio.run(main())
+    # a thread without the episode's context records nothing
+    thread = threading.Thread(target=work, args=("outside",))
+    thread.start()
+    thread.join()
+    assert [s.name for s in recorder.timing().spans] == ["in_thread", "to_thread"]
+
+
+def test_concurrent_episodes_keep_their_spans_apart():
+    async def episode(name):
+        with record_spans() as recorder:
+            for _ in range(3):
+                with span("agent_llm", name):
+                    await asyncio.sleep(0.01)
+                with span("tool", name):
+                    await asyncio.to_thread(time.sleep, 0.01)
+        return recorder.timing()
+
+    async def main():
+        return await asyncio.gather(episode("a"), episode("b"))
+
+    a, b = asyncio.run(main())
+    assert {s.name for s in a.spans} == {"a"} and len(a.spans) == 6
+    assert {s.name for s in b.spans} == {"b"} and len(b.spans) == 6
+
+
+def test_display_timing_skips_results_without_timing(capsys):
+    def result(task_id, timing=None):
+        return EnvRunResult(
+            task_id=task_id, reward=0.0, info={}, traj=[], trial=0, timing=timing
+        )
+
+    display_timing([result(0), result(1)])
+    assert capsys.readouterr().out == ""
+
+    timing = EpisodeTiming(
+        total=2.0,
+        by_component={"agent_llm": 1.0, "tool": 0.5},
+        spans=[
+            Span(component="agent_llm", start=0.0, duration=1.0),
+            Span(component="tool", name="get_user_details", start=1.0, duration=0.5),
+        ],
+    )
+    display_timing([result(0), result(1, timing), result(2)])
+    out = capsys.readouterr().out
+    assert "over 1 episodes" in out
+    assert "agent_llm: 50.0%" in out
+    assert "other: 25.0%" in out
+    assert "get_user_details: 500.00ms over 1 calls" in out
+
+
+def test_replayed_ground_truth_tools_are_not_agent_tool_calls(capsys):
+    env = make_env(check_outputs=False)
+    user_id = next(iter(env.data["users"]))
+    with record_spans() as recorder:
+        env.step(Action(name="get_user_details", kwargs={"user_id": user_id}))
+        with span("reward"):
+            env.calculate_reward()
+    timing = recorder.timing()
+    assert [s.name for s in timing.spans if s.component == "tool"] == ["get_user_details"]
+    assert [s.name for s in timing.spans if s.component == "gt_replay"] == [
+        action.name
+        for action in env.task.actions
+        if action.name not in env.terminate_tools
+    ]
+    display_timing(
+        [EnvRunResult(task_id=0, reward=0.0, info={}, traj=[], trial=0, timing=timing)]
+    )
+    slowest = capsys.readouterr().out.split("Slowest tools")[1]
+    assert "get_user_details: " in slowest and "over 1 calls" in slowest
+    assert len(slowest.strip().splitlines()) == 2
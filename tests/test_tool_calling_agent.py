@@ -0,0 +1,147 @@
+# Copyright Sierra
+
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import litellm
+
+from conftest import make_env
+from tau_bench.agents.tool_calling_agent import ToolCallingAgent
+from tau_bench.envs.base import Env
+from tau_bench.types import EnvInfo, EnvResetResponse
+
+
+def tool_call_response(*calls: Dict[str, Any]) -> litellm.ModelResponse:
+    res = litellm.ModelResponse(
+        choices=[
+            {
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": f"call_{i}",
+                            "type": "function",
+                            "function": {
+                                "name": call["name"],
+                                "arguments": json.dumps(call["kwargs"]),
+                            },
+                        }
+                        for i, call in enumerate(calls)
+                    ],
+                },
+            }
+        ]
+    )
+    res._hidden_params["response_cost"] = 0.0
+    return res
+
+
+def lookups_then_transfer(env: Env) -> List[litellm.ModelResponse]:
+    """A message looking up two users, then one transferring to a human agent."""
+    user_ids = list(env.data["users"])[:2]
+    return [
+        tool_call_response(
+            *[{"name": "get_user_details", "kwargs": {"user_id": user_id}} for user_id in user_ids]
+        ),
+        tool_call_response({"name": "transfer_to_human_agents", "kwargs": {"summary": "x"}}),
+    ]
+
+
+def run_turns(
+    agent: ToolCallingAgent, env: Env, responses: List[Any]
+) -> List[Dict[str, Any]]:
+    """Drive `agent.turns` with scripted LLM responses, returning the final messages."""
+    turns = agent.turns(env, None, len(responses))
+    scripted = iter(responses)
+    kind, _ = next(turns)
+    assert kind == "reset"
+    request = turns.send(EnvResetResponse(observation="hi", info=EnvInfo(task=env.task)))
+    try:
+        while True:
+            kind, payload = request
+            if kind == "step":
+                request = turns.send(env.step(payload))
+            else:
+                response = next(scripted, None)
+                assert response is not None, "the episode did not end"
+                request = turns.send(response)
+    except StopIteration as stop:
+        return stop.value.messages
+
+
+def test_parallel_tool_calls_run_every_call_of_a_message():
+    env = make_env()
+    agent = ToolCallingAgent(
+        env.tools_info, env.wiki, "gpt-4o", "openai", parallel_tool_calls=True
+    )
+    messages = run_turns(agent, env, lookups_then_transfer(env))
+    assert [action.name for action in env.actions] == [
+        "get_user_details",
+        "get_user_details",
+        "transfer_to_human_agents",
+    ]
+    assert len(messages[2]["tool_calls"]) == 2
+    assert [(m["role"], m["tool_call_id"]) for m in messages[3:5]] == [
+        ("tool", "call_0"),
+        ("tool", "call_1"),
+    ]
+    user_ids = list(env.data["users"])[:2]
+    assert [m["content"] for m in messages[3:5]] == [
+        env.tools_map["get_user_details"].invoke(data=env.data, user_id=user_id)
+        for user_id in user_ids
+    ]
+
+
+def test_only_the_first_tool_call_runs_by_default():
+    env = make_env()
+    agent = ToolCallingAgent(env.tools_info, env.wiki, "gpt-4o", "openai")
+    messages = run_turns(agent, env, lookups_then_transfer(env))
+    assert [action.name for action in env.actions] == [
+        "get_user_details",
+        "transfer_to_human_agents",
+    ]
+    assert len(messages[2]["tool_calls"]) == 1
+    assert messages[4]["role"] == "assistant"
+
+
+def test_asolve_matches_solve(mock_openai):
+    env = make_env()
+    agent = ToolCallingAgent(env.tools_info, env.wiki, "gpt-4o", "openai")
+    num_requests = mock_openai.num_requests
+    solved = agent.solve(env, task_index=3)
+    num_calls = mock_openai.num_requests - num_requests
+    asolved = asyncio.run(agent.asolve(make_env(), task_index=3))
+    assert mock_openai.num_requests - num_requests == 2 * num_calls
+    # the agent made tool calls and the user simulator ended the conversation
+    assert any(m["role"] == "tool" for m in asolved.messages)
+    assert asolved.info["source"] == "user"
+    assert asolved.messages == solved.messages
+    assert asolved.reward == solved.reward
+    assert asolved.total_cost == solved.total_cost > 0
+
+
+def test_parallel_respond_call_is_returned_as_an_error():
+    env = make_env()
+    agent = ToolCallingAgent(
+        env.tools_info, env.wiki, "gpt-4o", "openai", parallel_tool_calls=True
+    )
+    user_id = next(iter(env.data["users"]))
+    responses = [
+        tool_call_response(
+            {"name": "respond", "kwargs": {"content": "hi"}},
+            {"name": "get_user_details", "kwargs": {"user_id": user_id}},
+        ),
+        tool_call_response({"name": "transfer_to_human_agents", "kwargs": {"summary": "x"}}),
+    ]
+    messages = run_turns(agent, env, responses)
+    assert messages[3]["tool_call_id"] == "call_0"
+    assert messages[3]["content"].startswith("Error")
+    assert "first_name" in messages[4]["content"]
+    assert [action.name for action in env.actions] == [
+        "get_user_details",
+        "transfer_to_human_agents",
+    ]